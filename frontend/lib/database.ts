@@ -22,6 +22,15 @@ databaseConnection.prepare(`
     )
   `).run();
 
+// Index the columns the categorizer and similarity lookups filter on
+databaseConnection.prepare(`
+    CREATE INDEX IF NOT EXISTS idx_notes_folderId ON notes (folderId)
+  `).run();
+
+databaseConnection.prepare(`
+    CREATE INDEX IF NOT EXISTS idx_notes_embeddingsId ON notes (embeddingsId)
+  `).run();
+
 // Define the result type explicitly
 interface FolderCount {
   count: number;
@@ -1,22 +1,147 @@
-import auto_categorize_notes
-from fastapi import FastAPI, HTTPException
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from indexer import Indexer
-from retriever import HybridRetrieverPipeline
-from indexer import Indexer
-from embeddings_manager import EmbeddingsManager
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
+from config import (
+    INDEXING_BATCH_SIZE,
+    CATEGORIZATION_PARALLELISM,
+    QDRANT_USE_ASYNC_CLIENT,
+    QDRANT_TOP_K_RESULTS,
+    SERVER_TIMING_ENABLED,
+    PROFILER_ENABLED,
+    FAST_START
+)
+from inference_executor import INFERENCE_EXECUTOR, run_inference
+from instrumentation import start_request_spans, finish_request_spans, record_request, server_timing_header, render_prometheus
+from sampling_profiler import SamplingProfiler
+
+# Built by build_services(). Haystack, Qdrant, FastEmbed and Ollama are only
+# imported there, so importing this module stays cheap and uvicorn binds its
+# port right away.
+EMBEDDING_RETRIEVER = None
+NOTES_INDEXER = None
+EMBEDDINGS_MANAGER = None
+EMBEDDING_UPDATE_QUEUE = None
+CATEGORIZATION_JOBS = None
+FOLDER_CENTROID_INDEX = None
+SAMPLING_PROFILER = SamplingProfiler() if PROFILER_ENABLED else None
+
+# Endpoints answered before the services are built; every other request waits for them
+STARTUP_EXEMPT_PATHS = {'/health', '/ready', '/metrics', '/docs', '/openapi.json'}
+
+_services_task = None
+
+
+def build_services():
+    """
+        Imports the pipeline modules, builds the shared pipelines and workers, and
+        loads and warms up the embedding models.
+    """
+    global EMBEDDING_RETRIEVER, NOTES_INDEXER, EMBEDDINGS_MANAGER, EMBEDDING_UPDATE_QUEUE, \
+        CATEGORIZATION_JOBS, FOLDER_CENTROID_INDEX
+
+    from retriever import HybridRetrieverPipeline
+    from indexer import Indexer
+    from embeddings_manager import EmbeddingsManager
+    from embedding_update_queue import EmbeddingUpdateQueue
+    from folder_centroid_index import get_folder_centroid_index
+    from categorization_jobs import CategorizationJobManager
+    from model_registry import load_models
 
-EMBEDDING_RETRIEVER = HybridRetrieverPipeline()
-NOTES_INDEXER = Indexer()
-EMBEDDINGS_MANAGER = EmbeddingsManager()
+    EMBEDDING_RETRIEVER = HybridRetrieverPipeline()
+    NOTES_INDEXER = Indexer()
+    EMBEDDINGS_MANAGER = EmbeddingsManager()
+    EMBEDDING_UPDATE_QUEUE = EmbeddingUpdateQueue(EMBEDDINGS_MANAGER)
+    CATEGORIZATION_JOBS = CategorizationJobManager(EMBEDDING_RETRIEVER)
+    FOLDER_CENTROID_INDEX = get_folder_centroid_index()
+    load_models()
+
+
+async def start_services():
+    """
+        Builds the services off the event loop, then starts the background worker
+        for queued embedding updates.
+    """
+    await run_inference(build_services)
+    EMBEDDING_UPDATE_QUEUE.start()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+        Builds the pipelines and loads and warms up the embedding models once,
+        instead of lazily inside a user request. With FAST_START this happens in
+        the background while the server already answers /health; requests to
+        other endpoints wait until it is done. Also runs the sampling profiler if
+        it is enabled, and drains the embedding update queue on shutdown.
+    """
+    global _services_task
+
+    if SAMPLING_PROFILER is not None:
+        SAMPLING_PROFILER.start()
+    _services_task = asyncio.create_task(start_services())
+    if not FAST_START:
+        await _services_task
+    yield
+    if SAMPLING_PROFILER is not None:
+        SAMPLING_PROFILER.stop()
+    _services_task.cancel()
+    if EMBEDDING_UPDATE_QUEUE is not None:
+        await run_in_threadpool(EMBEDDING_UPDATE_QUEUE.stop)
+    await run_in_threadpool(INFERENCE_EXECUTOR.shutdown)
+    if QDRANT_USE_ASYNC_CLIENT and EMBEDDING_RETRIEVER is not None:
+        from model_registry import get_document_store
+        await get_document_store().close_async()
 
 app = FastAPI(
     title='Note-a-log AI Services',
     description='Provides GenAI capabilities for the Note-a-log app.',
+    lifespan=lifespan,
 )
 
-# CORS Configuration
+@app.middleware('http')
+async def wait_for_services(request: Request, call_next):
+    """
+        Holds requests until the services are built, or answers 503 if building them
+        failed. CORS preflight requests are answered by CORSMiddleware and never wait.
+    """
+    if request.method != 'OPTIONS' and request.url.path not in STARTUP_EXEMPT_PATHS and _services_task is not None:
+        if _services_task.cancelled():
+            return JSONResponse(status_code=503, content={'detail': 'Service startup was cancelled.'})
+        try:
+            await asyncio.shield(_services_task)
+        except Exception as e:
+            return JSONResponse(status_code=503, content={'detail': f'Service failed to start: {str(e)}'})
+    return await call_next(request)
+
+@app.middleware('http')
+async def record_request_timing(request: Request, call_next):
+    """
+        Times every request for GET /metrics, adds the Server-Timing header if it
+        is enabled and dumps the profiler's samples for slow requests.
+    """
+    started_at = time.perf_counter()
+    token, spans = start_request_spans()
+    try:
+        response = await call_next(request)
+    finally:
+        finish_request_spans(token)
+    finished_at = time.perf_counter()
+
+    route = request.scope.get('route')
+    route_path = route.path if route is not None else 'unmatched'
+    record_request(request.method, route_path, response.status_code, finished_at - started_at)
+    if SERVER_TIMING_ENABLED:
+        response.headers['Server-Timing'] = server_timing_header(spans, finished_at - started_at)
+    if SAMPLING_PROFILER is not None:
+        await run_in_threadpool(SAMPLING_PROFILER.dump_if_slow, f'{request.method} {route_path}', started_at, finished_at)
+    return response
+
+# CORS Configuration. Registered after the middlewares above so it is the outermost
+# one, and adds its headers to their responses (e.g. the 503 while starting up) too.
 origins = [
     'http://localhost:3000',
     'http://localhost:3001',
@@ -35,6 +160,13 @@ app.add_middleware(
 class NoteEmbeddingRequest(BaseModel):
     note_contents: str
 
+class BatchNoteEmbeddingRequest(BaseModel):
+    notes_contents: list[str]
+    batch_size: int = INDEXING_BATCH_SIZE
+
+class CategorizationJobRequest(BaseModel):
+    parallelism: int = CATEGORIZATION_PARALLELISM
+
 class DeleteEmbeddingRequest(BaseModel):
     embeddings_ID: str
 
@@ -42,50 +174,211 @@ class UpdateEmbeddingRequest(BaseModel):
     embeddings_ID: str
     note_contents: str
 
+class SimilarDocumentsRequest(BaseModel):
+    embeddings_IDs: list[str]
+    top_k: int = QDRANT_TOP_K_RESULTS
+
+@app.get('/health')
+async def health():
+    """
+        Answers as soon as the server is up, before the models are loaded.
+    """
+    return {"status": "ok", "message": "Service is running."}
+
+@app.get('/ready')
+async def ready():
+    """
+        Reports whether the pipelines are built and the embedding models are loaded,
+        with their load times.
+    """
+    if _services_task is None or not _services_task.done():
+        raise HTTPException(status_code=503, detail='Embedding models are still loading.')
+    if _services_task.cancelled():
+        raise HTTPException(status_code=503, detail='Service startup was cancelled.')
+    if _services_task.exception() is not None:
+        raise HTTPException(status_code=503, detail=f'Service failed to start: {_services_task.exception()}')
+
+    from model_registry import model_load_times
+    return {"status": "ready", "message": model_load_times()}
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+    """
+        Exports the timing histograms of requests and instrumented operations
+        (Markdown conversion, inference, Qdrant, SQLite, Ollama) for Prometheus.
+    """
+    return PlainTextResponse(render_prometheus(), media_type='text/plain; version=0.0.4')
+
+@app.get('/embedding_cache_stats')
+async def embedding_cache_stats():
+    """
+        Reports hit/miss counters for the embedding cache used by note updates.
+    """
+    return {"status": "success", "message": await run_in_threadpool(EMBEDDINGS_MANAGER.embedding_cache.stats)}
+
+@app.get('/retrieval_cache_stats')
+async def retrieval_cache_stats():
+    """
+        Reports hit/miss counters for the retriever's query embedding and result caches.
+    """
+    return {
+        "status": "success",
+        "message": {
+            "query_embeddings": EMBEDDING_RETRIEVER.query_embedding_cache.stats(),
+            "results": EMBEDDING_RETRIEVER.result_cache.stats()
+        }
+    }
+
+@app.get('/embedding_batcher_stats')
+async def embedding_batcher_stats_endpoint():
+    """
+        Reports queue depth, batch-size histogram and wait times of the embedding batchers.
+    """
+    from model_registry import embedding_batcher_stats
+    return {"status": "success", "message": embedding_batcher_stats()}
+
 @app.get('/auto_categorize_notes')
-def auto_categorize():
+async def auto_categorize():
     """
-        Calls the auto_categorize_notes script and handles exceptions.
+        Runs a categorization job and waits for it to finish.
 
-        Returns a status message indicating success or failure.
+        Returns a status message indicating success or failure. Prefer
+        POST /auto_categorize_notes, which returns immediately with a job ID.
     """
+    from categorization_jobs import JobAlreadyRunningError
     try:
-        auto_categorize_notes.main()
-        return {"status": "success", "message": "Notes categorized successfully."}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f'An error occurred: {str(e)}')
+        job = CATEGORIZATION_JOBS.start()
+    except JobAlreadyRunningError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    await run_in_threadpool(job.finished_event.wait)
+    if job.status == 'completed_with_errors':
+        return {"status": "success", "message": f"Notes categorized, {len(job.errors)} note(s) failed: {job.to_dict()['errors']}"}
+    if job.status != 'completed':
+        raise HTTPException(status_code=500, detail=f'An error occurred: {job.to_dict()["errors"]}')
+    return {"status": "success", "message": "Notes categorized successfully."}
+
+@app.post('/auto_categorize_notes', status_code=202)
+async def start_auto_categorize_job(payload: CategorizationJobRequest = CategorizationJobRequest()):
+    """
+        Starts a background categorization job and returns its ID.
+        Only one job may run per notes database at a time.
+    """
+    from categorization_jobs import JobAlreadyRunningError
+    try:
+        job = CATEGORIZATION_JOBS.start(payload.parallelism)
+        return {"status": "started", "message": job.id}
+    except JobAlreadyRunningError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get('/jobs/{job_id}')
+async def get_job(job_id: str):
+    """
+        Reports progress of a categorization job.
+    """
+    job = CATEGORIZATION_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f'Job {job_id} not found.')
+    return {"status": "success", "message": job.to_dict()}
+
+@app.post('/jobs/{job_id}/cancel')
+async def cancel_job(job_id: str):
+    """
+        Cancels a categorization job once the notes already in flight finish.
+    """
+    job = CATEGORIZATION_JOBS.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f'Job {job_id} not found.')
+    return {"status": "success", "message": job.to_dict()}
 
 @app.post('/create_initial_note_embeddings')
-def create_initial_note_embeddings(payload: NoteEmbeddingRequest):
+async def create_initial_note_embeddings(payload: NoteEmbeddingRequest):
     try: 
-        embeddings_ID = NOTES_INDEXER.embed_note_information(payload.note_contents)
+        embeddings_ID = await run_inference(NOTES_INDEXER.embed_note_information, payload.note_contents)
         return {"status": "success", "message": embeddings_ID}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'An error occurred: {str(e)}')
 
+@app.post('/create_note_embeddings_batch')
+async def create_note_embeddings_batch(payload: BatchNoteEmbeddingRequest):
+    """
+        Embeds many notes in chunks of `batch_size` and returns their embedding IDs
+        in the same order as `notes_contents`.
+    """
+    try:
+        embeddings_IDs = await run_inference(NOTES_INDEXER.embed_notes, payload.notes_contents, payload.batch_size)
+        return {"status": "success", "message": embeddings_IDs}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'An error occurred: {str(e)}')
+
 @app.post('/update_note_embeddings')
-def update_note_embeddings(payload: UpdateEmbeddingRequest):
+async def update_note_embeddings(payload: UpdateEmbeddingRequest):
+    """
+        Queues the new note contents. Rapid updates to the same note are coalesced
+        and embedded in the background once the note has been quiet for the
+        debounce interval.
+    """
     try:
-        EMBEDDINGS_MANAGER.update_embedding(
+        EMBEDDING_UPDATE_QUEUE.submit(
             payload.embeddings_ID,
             payload.note_contents
         )
-        return {"status": "success", "message": payload.embeddings_ID}
+        return {"status": "queued", "message": payload.embeddings_ID}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'An error occurred: {str(e)}')
 
+@app.get('/embedding_updates/status')
+async def embedding_updates_status():
+    """
+        Reports the depth and counters of the embedding update queue.
+    """
+    return {"status": "success", "message": EMBEDDING_UPDATE_QUEUE.status()}
+
+@app.post('/embedding_updates/flush')
+async def flush_embedding_updates(timeout: float = 30.0):
+    """
+        Embeds all queued updates immediately and waits for the queue to drain.
+    """
+    if not await run_in_threadpool(EMBEDDING_UPDATE_QUEUE.flush, timeout):
+        raise HTTPException(status_code=504, detail='Timed out waiting for queued embedding updates.')
+    return {"status": "success", "message": EMBEDDING_UPDATE_QUEUE.status()}
+
 @app.post('/delete_note_embeddings')
-def delete_note_embeddings(payload: DeleteEmbeddingRequest):
+async def delete_note_embeddings(payload: DeleteEmbeddingRequest):
     try: 
-        EMBEDDINGS_MANAGER.delete_embedding(payload.embeddings_ID)
+        EMBEDDING_UPDATE_QUEUE.discard(payload.embeddings_ID)
+        await EMBEDDINGS_MANAGER.delete_embedding_async(payload.embeddings_ID)
         return {"status": "success", "message": payload.embeddings_ID}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'An error occurred: {str(e)}')
 
 @app.get('/retrieve_similar_to_document')
-def retrieve_similar_to_document(embeddings_ID: str):
+async def retrieve_similar_to_document(embeddings_ID: str):
     try: 
-        results = EMBEDDING_RETRIEVER.retrieve_similar_to_document(embeddings_ID) 
+        results = await EMBEDDING_RETRIEVER.retrieve_similar_to_document_async(embeddings_ID)
+        return {"status": "success", "message": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'An error occurred: {str(e)}')
+
+@app.post('/retrieve_similar_to_documents')
+async def retrieve_similar_to_documents(payload: SimilarDocumentsRequest):
+    """
+        Finds similar notes for many notes at once, with one read of the reference
+        vectors and one Qdrant batch query. IDs without embeddings map to an empty list.
+    """
+    try:
+        results = await EMBEDDING_RETRIEVER.retrieve_similar_to_documents_async(payload.embeddings_IDs, payload.top_k)
+        return {"status": "success", "message": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'An error occurred: {str(e)}')
+
+@app.get('/suggest_folder')
+async def suggest_folder(embeddings_ID: str, top_k: int = 3):
+    """
+        Ranks existing folders for a note by similarity to each folder's centroid embedding.
+    """
+    try:
+        results = await run_in_threadpool(FOLDER_CENTROID_INDEX.suggest, embeddings_ID, top_k)
         return {"status": "success", "message": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'An error occurred: {str(e)}')
@@ -1,69 +1,404 @@
+import asyncio
 import ollama
 import os
-from ollama import Client
+import threading
+import time
+from ollama import Client, AsyncClient
 from dotenv import load_dotenv
 from config import (
     DATABASE_TABLE_WITH_NOTES,
     DATABASE_TABLE_WITH_FOLDERS,
     MODEL_NAME,
-    PROMPT_TEMPLATE
+    PROMPT_TEMPLATE,
+    PROMPT_TEMPLATE_WITH_SEMANTIC_SEARCH_RESULTS,
+    CATEGORIZATION_PARALLELISM,
+    CATEGORIZATION_MOVE_BATCH_SIZE,
+    CATEGORIZATION_FAST_PATH_ENABLED,
+    OLLAMA_KEEP_ALIVE,
+    PROMPT_CONTENT_MAX_TOKENS
 )
-from database_utils import fetch_table_data_as_dictionary, move_note_to_folder
-from prompt_builder import PromptBuilder
+from database_utils import iter_rows, move_note_to_folder, move_notes_to_folders
+from prompt_builder import PromptBuilder, count_tokens, truncate_to_tokens
+from instrumentation import span
 
+SEMANTIC_SEARCH_PROMPT_BUILDER = PromptBuilder(PROMPT_TEMPLATE_WITH_SEMANTIC_SEARCH_RESULTS)
 
-def main():
-    # Set value for Ollama API base URL 
+
+class CategorizationStats:
+    """
+    Counts how many notes were categorized by the neighbour vote (fast path)
+    and how many by the LLM, how long the LLM calls took and how large their
+    prompts were.
+    """
+
+    def __init__(self):
+        self.fast_path_notes = 0
+        self.llm_notes = 0
+        self.llm_seconds = 0.0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.prompt_eval_tokens = 0
+
+
+    def record_fast_path(self):
+        self.fast_path_notes += 1
+
+
+    def record_llm(self, seconds: float, prompt_tokens: int = 0, prompt_eval_tokens: int = None):
+        """
+        :param seconds: Duration of the generate call.
+        :param prompt_tokens: Estimated size of the prompt, see `count_tokens`.
+        :param prompt_eval_tokens: Prompt tokens Ollama reported evaluating; fewer
+                                   than the prompt when its cached prefix was reused.
+        """
+        self.llm_notes += 1
+        self.llm_seconds += seconds
+        self.prompt_tokens += prompt_tokens
+        self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+        self.prompt_eval_tokens += prompt_eval_tokens or 0
+
+
+    def to_dict(self) -> dict:
+        """
+        :return: Dictionary with per-path counts, prompt sizes and the LLM time the
+                 fast path saved, estimated from the average LLM call in this run.
+        """
+        average_llm_seconds = self.llm_seconds / self.llm_notes if self.llm_notes else 0.0
+        average_prompt_tokens = self.prompt_tokens / self.llm_notes if self.llm_notes else 0.0
+        return {
+            'fast_path_notes': self.fast_path_notes,
+            'llm_notes': self.llm_notes,
+            'llm_seconds': round(self.llm_seconds, 3),
+            'average_llm_seconds': round(average_llm_seconds, 3),
+            'estimated_seconds_saved': round(self.fast_path_notes * average_llm_seconds, 3),
+            'prompt_tokens': self.prompt_tokens,
+            'average_prompt_tokens': round(average_prompt_tokens, 1),
+            'max_prompt_tokens': self.max_prompt_tokens,
+            'prompt_eval_tokens': self.prompt_eval_tokens
+        }
+
+
+class BufferedFolderMover:
+    """
+    Collects categorized notes and moves them to their folders in batches, so a
+    run writes to SQLite in a few transactions instead of one per note.
+
+    Usable as the `on_categorized` callback of `categorize_notes` and
+    `categorize_notes_concurrently`. Call `flush` once the run is over.
+    """
+
+    def __init__(self, batch_size: int = None):
+        """
+        :param batch_size: Number of moves written per transaction. None buffers
+                           every move until `flush` is called.
+        """
+        self.batch_size = batch_size
+        self.moved = 0
+        self._pending_moves = []
+        self._lock = threading.Lock()
+
+
+    def __call__(self, note: dict, category_name: str):
+        with self._lock:
+            self._pending_moves.append((note['id'], category_name))
+            if self.batch_size is None or len(self._pending_moves) < self.batch_size:
+                return
+        self.flush()
+
+
+    def flush(self):
+        """
+        Moves every buffered note to its folder in one transaction.
+        """
+        with self._lock:
+            moves, self._pending_moves = self._pending_moves, []
+        if moves:
+            move_notes_to_folders(moves)
+            with self._lock:
+                self.moved += len(moves)
+
+
+def main(parallelism: int = CATEGORIZATION_PARALLELISM, retriever=None):
+    """
+    Assigns every unassigned note to a folder chosen by the LLM.
+
+    :param parallelism: Number of notes categorized at the same time. 1 runs the
+                        notes one after another with the blocking client.
+    :param retriever: HybridRetrieverPipeline for the neighbour-vote fast path.
+                      One is created if the fast path is enabled and none is given.
+    """
+    # Set value for Ollama API base URL
     load_dotenv()
-    ollama_client = Client(
-        host=os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
-    )
+    ollama_host = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
 
     # Initialize prompt builder
     prompt_builder = PromptBuilder(PROMPT_TEMPLATE)
 
-    # Fetch all notes
-    notes_data = fetch_table_data_as_dictionary(DATABASE_TABLE_WITH_NOTES)
+    fast_path = create_fast_path_categorizer(retriever)
+    stats = CategorizationStats()
 
-    # Only get notes that do not have an assigned folder.
-    uncategorized_notes = [note for note in notes_data if note.get('folderId') == 'unassigned']
+    uncategorized_notes, note_categories = load_uncategorized_notes()
 
-    # Fetch all folders for holding notes
-    folders_data = fetch_table_data_as_dictionary(DATABASE_TABLE_WITH_FOLDERS)
+    # Write folder moves in small batches, so the fast path sees the folders of
+    # notes categorized earlier in the run and a failure keeps the moves made so far
+    folder_mover = BufferedFolderMover(CATEGORIZATION_MOVE_BATCH_SIZE)
 
-    # Remove the 'unassigned' folder.
-    folders_data = [folder_data for folder_data in folders_data if folder_data['id'] != 'unassigned']
+    try:
+        if parallelism > 1:
+            asyncio.run(categorize_notes_concurrently(
+                uncategorized_notes,
+                note_categories,
+                prompt_builder,
+                AsyncClient(host=ollama_host),
+                parallelism,
+                on_categorized=folder_mover,
+                fast_path=fast_path,
+                stats=stats
+            ))
+        else:
+            categorize_notes(
+                uncategorized_notes,
+                note_categories,
+                prompt_builder,
+                Client(host=ollama_host),
+                on_categorized=folder_mover,
+                fast_path=fast_path,
+                stats=stats
+            )
+    finally:
+        folder_mover.flush()
 
-    # Aggregate folder names into a list, as this will be part of a prompt for 
-    # existing note categories.
-    note_categories = set()
-    [note_categories.add(folder['name']) for folder in folders_data]
+    print(note_categories)
+    print(stats.to_dict())
 
-    for note in uncategorized_notes:
-        # Render the prompt.
-        context = {
-            'title': note['title'],
-            'content': note['content'],
-            'categories' : note_categories
-        }
-        full_prompt = prompt_builder.render(**context)
-
-        # Prompt the LLM for a category name for the current note.
-        response_with_category_name = ollama_client.generate(
-                                        model=MODEL_NAME,
-                                        prompt=full_prompt,
-                                        options={'temperature': 0.2}  
-                                      )
-        category_name = response_with_category_name['response']
-
-        # Add to the list of existing note categories (note folder names)
-        note_categories.add(category_name)
-    
-        # Move the note to the folder
-        note['AI_generated_category'] = category_name
-        move_note_to_folder(note['id'], note['AI_generated_category']) 
 
-    print(note_categories)
+def create_fast_path_categorizer(retriever=None):
+    """
+    Builds the neighbour-vote categorizer if it is enabled in the config.
+
+    :param retriever: HybridRetrieverPipeline to use, or None to create one.
+    :return: A FastPathCategorizer, or None if the fast path is disabled.
+    """
+    if not CATEGORIZATION_FAST_PATH_ENABLED:
+        return None
+
+    from fast_path_categorizer import FastPathCategorizer
+    if retriever is None:
+        from retriever import HybridRetrieverPipeline
+        retriever = HybridRetrieverPipeline()
+    return FastPathCategorizer(retriever)
+
+
+def load_uncategorized_notes() -> tuple:
+    """
+    Fetches the notes that still need a folder and the existing folder names.
+
+    :return: Tuple of (list of unassigned note rows, set of existing category names).
+    """
+    # Only get notes that do not have an assigned folder, and only the columns
+    # categorization needs. The filter runs in SQL on the folderId index.
+    uncategorized_notes = list(iter_rows(
+        DATABASE_TABLE_WITH_NOTES,
+        columns=['id', 'title', 'content', 'embeddingsId'],
+        where='folderId = ?',
+        parameters=('unassigned',)
+    ))
+
+    # Aggregate the names of the folders for holding notes, except the 'unassigned'
+    # folder, as this will be part of a prompt for existing note categories.
+    note_categories = {
+        folder['name'] for folder in iter_rows(
+            DATABASE_TABLE_WITH_FOLDERS,
+            columns=['name'],
+            where='id != ?',
+            parameters=('unassigned',)
+        )
+    }
+
+    return uncategorized_notes, note_categories
+
+
+def build_prompt_context(note: dict, note_categories: set, search_results: list = None) -> dict:
+    """
+    Builds the template variables for categorizing one note.
+
+    The content is cut to PROMPT_CONTENT_MAX_TOKENS, and the categories are
+    sorted so consecutive prompts share the same prefix.
+
+    :param note: The note row, with 'title' and 'content'.
+    :param note_categories: The category names known so far.
+    :param search_results: Optional neighbour Documents with `meta['folder']` set.
+    :return: Dictionary of template variables.
+    """
+    return {
+        'title': note['title'],
+        'content': truncate_to_tokens(note['content'] or '', PROMPT_CONTENT_MAX_TOKENS),
+        'categories' : sorted(note_categories, key=lambda category: (category.casefold(), category)),
+        'search_results': search_results or []
+    }
+
+
+def render_prompt(note: dict, note_categories: set, prompt_builder: PromptBuilder, search_results: list = None) -> str:
+    """
+    Renders the categorization prompt, using the semantic-search template when
+    neighbour results are available.
+
+    :return: The full prompt.
+    """
+    if search_results:
+        prompt_builder = SEMANTIC_SEARCH_PROMPT_BUILDER
+    return prompt_builder.render(**build_prompt_context(note, note_categories, search_results))
+
+
+def assign_category(note: dict, category_name: str, note_categories: set, on_categorized=None):
+    """
+    Records the category chosen for a note and moves the note to that folder.
+
+    :param note: The note row.
+    :param category_name: The category name returned by the LLM.
+    :param note_categories: The set of known category names, updated in place.
+    :param on_categorized: Callback taking (note, category_name); defaults to moving the note in the database.
+    """
+    # Add to the list of existing note categories (note folder names)
+    note_categories.add(category_name)
+
+    # Move the note to the folder
+    note['AI_generated_category'] = category_name
+    if on_categorized is None:
+        move_note_to_folder(note['id'], note['AI_generated_category'])
+    else:
+        on_categorized(note, category_name)
+
+
+def categorize_notes(notes: list, note_categories: set, prompt_builder: PromptBuilder,
+                     ollama_client: Client, on_categorized=None, should_stop=None, on_error=None,
+                     fast_path=None, stats: CategorizationStats = None):
+    """
+    Categorizes notes one at a time with the blocking Ollama client.
+
+    :param notes: Notes to categorize.
+    :param note_categories: The set of known category names, updated in place.
+    :param prompt_builder: Builder for the categorization prompt.
+    :param ollama_client: Blocking Ollama client.
+    :param on_categorized: Optional callback, see `assign_category`.
+    :param should_stop: Optional callable checked before each note; returning True stops the run.
+    :param on_error: Optional callback taking (note, exception). Without it, errors are raised.
+    :param fast_path: Optional FastPathCategorizer tried before the LLM.
+    :param stats: Optional CategorizationStats updated with the path each note took.
+    """
+    stats = stats or CategorizationStats()
+
+    for note in notes:
+        if should_stop is not None and should_stop():
+            return
+
+        try:
+            # Let the note's neighbours decide if they agree on a folder.
+            folder_name, search_results = fast_path.suggest(note) if fast_path else (None, [])
+            if folder_name:
+                stats.record_fast_path()
+                assign_category(note, folder_name, note_categories, on_categorized)
+                continue
+
+            # Render the prompt.
+            full_prompt = render_prompt(note, note_categories, prompt_builder, search_results)
+            prompt_tokens = count_tokens(full_prompt)
+
+            # Prompt the LLM for a category name for the current note.
+            start_time = time.perf_counter()
+            with span('ollama_generate'):
+                response_with_category_name = ollama_client.generate(
+                                                model=MODEL_NAME,
+                                                prompt=full_prompt,
+                                                options={'temperature': 0.2},
+                                                keep_alive=OLLAMA_KEEP_ALIVE
+                                              )
+            stats.record_llm(time.perf_counter() - start_time, prompt_tokens,
+                             response_with_category_name.get('prompt_eval_count'))
+            category_name = response_with_category_name['response'].strip()
+
+            assign_category(note, category_name, note_categories, on_categorized)
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(note, e)
+
+
+async def categorize_notes_concurrently(notes: list, note_categories: set, prompt_builder: PromptBuilder,
+                                        ollama_client: AsyncClient, parallelism: int = CATEGORIZATION_PARALLELISM,
+                                        on_categorized=None, should_stop=None, on_error=None,
+                                        fast_path=None, stats: CategorizationStats = None):
+    """
+    Categorizes notes with up to `parallelism` Ollama requests in flight.
+
+    A fixed pool of workers pulls notes from a queue. Only the neighbour lookup
+    and the generate call are awaited; prompt rendering and `assign_category`
+    run on the event loop thread between awaits, so the shared `note_categories`
+    set and the folder lookups in the database never race. Each prompt sees
+    every category created before it was rendered.
+
+    :param notes: Notes to categorize.
+    :param note_categories: The set of known category names, updated in place.
+    :param prompt_builder: Builder for the categorization prompt.
+    :param ollama_client: Asynchronous Ollama client.
+    :param parallelism: Maximum number of concurrent generate requests.
+    :param on_categorized: Optional callback, see `assign_category`.
+    :param should_stop: Optional callable checked before each note; returning True stops the run.
+                        Requests already in flight are allowed to finish.
+    :param on_error: Optional callback taking (note, exception). Without it, errors are raised.
+    :param fast_path: Optional FastPathCategorizer tried before the LLM.
+    :param stats: Optional CategorizationStats updated with the path each note took.
+    """
+    stats = stats or CategorizationStats()
+    note_queue = asyncio.Queue()
+    for note in notes:
+        note_queue.put_nowait(note)
+
+    async def worker():
+        while True:
+            if should_stop is not None and should_stop():
+                return
+            try:
+                note = note_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            try:
+                # Let the note's neighbours decide if they agree on a folder.
+                # The lookup blocks on Qdrant and SQLite, so run it off the event loop.
+                folder_name, search_results = (
+                    await asyncio.to_thread(fast_path.suggest, note) if fast_path else (None, [])
+                )
+                if folder_name:
+                    stats.record_fast_path()
+                    assign_category(note, folder_name, note_categories, on_categorized)
+                    continue
+
+                # Render the prompt.
+                full_prompt = render_prompt(note, note_categories, prompt_builder, search_results)
+                prompt_tokens = count_tokens(full_prompt)
+
+                # Prompt the LLM for a category name for the current note.
+                start_time = time.perf_counter()
+                with span('ollama_generate'):
+                    response_with_category_name = await ollama_client.generate(
+                                                        model=MODEL_NAME,
+                                                        prompt=full_prompt,
+                                                        options={'temperature': 0.2},
+                                                        keep_alive=OLLAMA_KEEP_ALIVE
+                                                      )
+                stats.record_llm(time.perf_counter() - start_time, prompt_tokens,
+                                 response_with_category_name.get('prompt_eval_count'))
+                category_name = response_with_category_name['response'].strip()
+
+                assign_category(note, category_name, note_categories, on_categorized)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(note, e)
+
+    worker_count = max(1, min(parallelism, len(notes)))
+    await asyncio.gather(*(worker() for _ in range(worker_count)))
 
 
 if __name__ == '__main__':
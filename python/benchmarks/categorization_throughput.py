@@ -0,0 +1,102 @@
+"""
+Measures auto-categorization throughput as parallelism grows.
+
+Runs `categorize_notes_concurrently` against a local stub of Ollama's
+/api/generate endpoint, so no model or notes database is needed. The stub
+sleeps for a fixed generation time and serves at most `--server-slots`
+requests at once, like an Ollama server with OLLAMA_NUM_PARALLEL set.
+
+Usage (from the python/ directory):
+    python -m benchmarks.categorization_throughput --notes 200 --parallelism 1 2 4 8
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ollama import AsyncClient
+from auto_categorize_notes import categorize_notes_concurrently
+from config import PROMPT_TEMPLATE
+from prompt_builder import PromptBuilder
+
+STUB_CATEGORIES = ['Groceries', 'Car Maintenance', 'School', 'Finance', 'Travel']
+
+
+def start_stub_server(generation_seconds: float, server_slots: int) -> ThreadingHTTPServer:
+    """
+    Starts a stub Ollama server on a free local port in a background thread.
+    """
+    slots = threading.BoundedSemaphore(server_slots)
+    request_counter = iter(range(1_000_000_000))
+
+    class StubOllamaHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with slots:
+                time.sleep(generation_seconds)
+            category_name = STUB_CATEGORIES[next(request_counter) % len(STUB_CATEGORIES)]
+            body = json.dumps({'model': 'stub', 'response': category_name, 'done': True}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_once(host: str, note_count: int, parallelism: int) -> float:
+    """
+    Categorizes `note_count` synthetic notes and returns the elapsed seconds.
+    """
+    notes = [
+        {'id': str(index), 'title': f'Note {index}', 'content': f'Synthetic note body number {index}.'}
+        for index in range(note_count)
+    ]
+    note_categories = set()
+
+    start_time = time.perf_counter()
+    asyncio.run(categorize_notes_concurrently(
+        notes,
+        note_categories,
+        PromptBuilder(PROMPT_TEMPLATE),
+        AsyncClient(host=host),
+        parallelism,
+        on_categorized=lambda note, category_name: None
+    ))
+    elapsed = time.perf_counter() - start_time
+
+    assert len(note_categories) == len(STUB_CATEGORIES), 'category names were not deduplicated'
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=200, help='Number of notes to categorize per run.')
+    parser.add_argument('--parallelism', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--generation-ms', type=float, default=50.0, help='Simulated generation time per request.')
+    parser.add_argument('--server-slots', type=int, default=8, help='Requests the stub serves concurrently.')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.generation_ms / 1000, args.server_slots)
+    host = f'http://127.0.0.1:{server.server_address[1]}'
+
+    try:
+        print(f'{"parallelism":>11}  {"seconds":>8}  {"notes/s":>8}  {"speedup":>7}')
+        baseline = None
+        for parallelism in args.parallelism:
+            elapsed = run_once(host, args.notes, parallelism)
+            baseline = baseline or elapsed
+            print(f'{parallelism:>11}  {elapsed:>8.2f}  {args.notes / elapsed:>8.1f}  {baseline / elapsed:>6.1f}x')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Load test reporting p50/p99 latency per endpoint under mixed traffic.
+
+Runs against a live service (e.g. `uvicorn app:app`). Heavy embedding
+requests (/create_note_embeddings_batch) are sent by `--writers` clients
+while `--readers` clients send the cheap calls (/retrieve_similar_to_document,
+/suggest_folder and /ready). The question is whether the cheap calls stay fast
+while inference is busy.
+
+To compare before and after a change, run the service from each revision and
+save both reports:
+    python -m benchmarks.endpoint_latency --url http://127.0.0.1:8000 --json before.json
+    python -m benchmarks.endpoint_latency --url http://127.0.0.1:8000 --json after.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import httpx
+
+SEED_TEXT = 'Synthetic note {index} about {topic}: remember to check the {topic} list before Friday.'
+TOPICS = ['groceries', 'car maintenance', 'school', 'finance', 'travel', 'gardening', 'health', 'work']
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def seed_notes(client: httpx.AsyncClient, count: int) -> list:
+    """
+    Embeds `count` notes and returns their embeddings IDs.
+    """
+    notes_contents = [SEED_TEXT.format(index=index, topic=TOPICS[index % len(TOPICS)]) for index in range(count)]
+    response = await client.post('/create_note_embeddings_batch', json={'notes_contents': notes_contents})
+    response.raise_for_status()
+    return response.json()['message']
+
+
+async def timed_request(client: httpx.AsyncClient, latencies: dict, errors: dict, name: str, method: str, url: str, **kwargs):
+    start_time = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        ok = response.status_code < 500
+    except httpx.HTTPError:
+        ok = False
+    elapsed = time.perf_counter() - start_time
+    if ok:
+        latencies.setdefault(name, []).append(elapsed)
+    else:
+        errors[name] = errors.get(name, 0) + 1
+
+
+async def writer(client, latencies, errors, deadline, notes_per_request):
+    request_index = 0
+    while time.perf_counter() < deadline:
+        notes_contents = [
+            SEED_TEXT.format(index=f'w{request_index}-{index}', topic=random.choice(TOPICS)) * 8
+            for index in range(notes_per_request)
+        ]
+        await timed_request(client, latencies, errors, 'create_note_embeddings_batch', 'POST',
+                            '/create_note_embeddings_batch', json={'notes_contents': notes_contents})
+        request_index += 1
+
+
+async def reader(client, latencies, errors, deadline, embeddings_IDs, think_seconds):
+    while time.perf_counter() < deadline:
+        embeddings_ID = random.choice(embeddings_IDs)
+        choice = random.random()
+        if choice < 0.5:
+            await timed_request(client, latencies, errors, 'retrieve_similar_to_document', 'GET',
+                                '/retrieve_similar_to_document', params={'embeddings_ID': embeddings_ID})
+        elif choice < 0.8:
+            await timed_request(client, latencies, errors, 'suggest_folder', 'GET',
+                                '/suggest_folder', params={'embeddings_ID': embeddings_ID})
+        else:
+            await timed_request(client, latencies, errors, 'ready', 'GET', '/ready')
+        await asyncio.sleep(think_seconds)
+
+
+async def run(args) -> dict:
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        embeddings_IDs = await seed_notes(client, args.seed_notes)
+
+        latencies = {}
+        errors = {}
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            *(writer(client, latencies, errors, deadline, args.notes_per_request) for _ in range(args.writers)),
+            *(reader(client, latencies, errors, deadline, embeddings_IDs, args.think_ms / 1000) for _ in range(args.readers))
+        )
+
+    report = {}
+    for name in sorted(set(latencies) | set(errors)):
+        samples = latencies.get(name, [])
+        report[name] = {
+            'requests': len(samples),
+            'errors': errors.get(name, 0),
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 1) if samples else None,
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 1) if samples else None,
+            'mean_ms': round(statistics.fmean(samples) * 1000, 1) if samples else None
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running service.')
+    parser.add_argument('--seconds', type=float, default=30.0, help='Duration of the mixed traffic phase.')
+    parser.add_argument('--writers', type=int, default=8, help='Concurrent clients sending embedding batches.')
+    parser.add_argument('--readers', type=int, default=16, help='Concurrent clients sending cheap requests.')
+    parser.add_argument('--notes-per-request', type=int, default=16, help='Notes per embedding batch request.')
+    parser.add_argument('--seed-notes', type=int, default=64, help='Notes embedded up front for the readers to query.')
+    parser.add_argument('--think-ms', type=float, default=10.0, help='Pause between a reader\'s requests.')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Per-request timeout in seconds.')
+    parser.add_argument('--json', help='Also write the report to this file.')
+    args = parser.parse_args()
+
+    random.seed(0)
+    report = asyncio.run(run(args))
+
+    print(f'{"endpoint":<30}  {"requests":>8}  {"errors":>6}  {"p50 ms":>8}  {"p99 ms":>8}')
+    for name, row in report.items():
+        print(f'{name:<30}  {row["requests"]:>8}  {row["errors"]:>6}  {row["p50_ms"]!s:>8}  {row["p99_ms"]!s:>8}')
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Measures Markdown to plain-text conversion for many small notes and a few very large ones.
+
+Each workload is converted with:
+
+  * legacy   - a new MarkdownIt parser and RendererPlain per note (how
+               strip_markdown worked before the parser was reused)
+  * reused   - one parser with the streaming renderer, no memoization
+  * cold     - strip_markdown_many with an empty plain-text cache
+  * warm     - strip_markdown_many again (e.g. a re-index of unchanged notes).
+               Every note of up to MARKDOWN_CACHE_MAX_TEXT_LENGTH characters is a
+               cache hit as long as the workload fits the cache; longer notes are
+               never cached, so the large-note workload converts them again.
+
+The warm pass's cache hit rate is reported, and checked whenever the workload fits the cache.
+
+Usage (from the python/ directory):
+    python -m benchmarks.markdown_strip --small-notes 5000 --large-notes 3 --large-words 100000
+"""
+import argparse
+import random
+import time
+from markdown_it import MarkdownIt
+from mdit_plain.renderer import RendererPlain
+import markdown_to_plain
+from config import MARKDOWN_CACHE_MAX_TEXT_LENGTH
+from markdown_to_plain import StreamingRendererPlain, strip_markdown_many, markdown_cache_stats
+
+WORDS = ('note', 'groceries', 'meeting', 'project', 'deadline', 'car', 'oil', 'study', 'exam', 'recipe',
+         'budget', 'travel', 'idea', 'review', 'draft', 'call', 'email', 'invoice', 'garden', 'book')
+
+
+def make_note(rng: random.Random, word_count: int) -> str:
+    """
+    Generates a Markdown note with headings, lists, emphasis, links and code, about `word_count` words long.
+    """
+    blocks = []
+    words_left = word_count
+    while words_left > 0:
+        kind = rng.random()
+        if kind < 0.1:
+            blocks.append(f"## {' '.join(rng.choices(WORDS, k=3)).title()}")
+            words_left -= 3
+        elif kind < 0.3:
+            items = [f"- {' '.join(rng.choices(WORDS, k=5))}" for _ in range(4)]
+            blocks.append('\n'.join(items))
+            words_left -= 20
+        elif kind < 0.35:
+            blocks.append(f"```\n{' '.join(rng.choices(WORDS, k=10))}\n```")
+            words_left -= 10
+        else:
+            sentence = rng.choices(WORDS, k=30)
+            sentence[3] = f'**{sentence[3]}**'
+            sentence[9] = f'[{sentence[9]}](https://example.com/{sentence[9]})'
+            blocks.append(' '.join(sentence) + '.')
+            words_left -= 30
+    return '\n\n'.join(blocks)
+
+
+def legacy_strip_markdown(markdown_text: str) -> str:
+    parser = MarkdownIt(renderer_cls=RendererPlain)
+    return parser.render(markdown_text)
+
+
+def time_call(function, *args) -> tuple:
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+
+def run_workload(name: str, notes: list):
+    total_megabytes = sum(len(note) for note in notes) / 1_000_000
+    reused_parser = MarkdownIt(renderer_cls=StreamingRendererPlain)
+    markdown_to_plain._plain_text_cache.clear()
+
+    legacy, legacy_seconds = time_call(lambda: [legacy_strip_markdown(note) for note in notes])
+    reused, reused_seconds = time_call(lambda: [reused_parser.render(note) for note in notes])
+    cold, cold_seconds = time_call(strip_markdown_many, notes)
+    stats_before_warm = markdown_cache_stats()
+    warm, warm_seconds = time_call(strip_markdown_many, notes)
+    stats_after_warm = markdown_cache_stats()
+    assert legacy == reused == cold == warm, 'Conversions differ between modes'
+
+    warm_hits = stats_after_warm['hits'] - stats_before_warm['hits']
+    warm_lookups = warm_hits + stats_after_warm['misses'] - stats_before_warm['misses']
+    warm_hit_rate = warm_hits / warm_lookups if warm_lookups else 0.0
+    cacheable = {note: plain_text for note, plain_text in zip(notes, cold) if len(note) <= MARKDOWN_CACHE_MAX_TEXT_LENGTH}
+    fits_cache = (len(cacheable) <= stats_after_warm['max_entries']
+                  and sum(len(plain_text) for plain_text in cacheable.values()) <= stats_after_warm['max_total_size'])
+
+    print(f'\n{name}: {len(notes)} notes, {total_megabytes:.2f} MB of Markdown')
+    print(f'warm pass: {warm_hits} cache hits, {warm_lookups - warm_hits} misses, '
+          f'{len(notes) - len(cacheable)} notes too long to cache, hit rate {warm_hit_rate:.3f}')
+    if fits_cache:
+        assert warm_hits == len(cacheable), 'Warm pass missed the cache for notes that fit in it'
+    else:
+        print('workload is larger than the cache; the warm pass re-converts evicted notes')
+    print(f'{"mode":>8}  {"seconds":>8}  {"notes/s":>10}  {"MB/s":>8}  {"speedup":>8}')
+    for mode, seconds in (('legacy', legacy_seconds), ('reused', reused_seconds),
+                          ('cold', cold_seconds), ('warm', warm_seconds)):
+        print(f'{mode:>8}  {seconds:>8.3f}  {len(notes) / seconds:>10.0f}  '
+              f'{total_megabytes / seconds:>8.1f}  {legacy_seconds / seconds:>7.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--small-notes', type=int, default=5000)
+    parser.add_argument('--small-words', type=int, default=80, help='Words per small note.')
+    parser.add_argument('--large-notes', type=int, default=3)
+    parser.add_argument('--large-words', type=int, default=100000, help='Words per large note.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    run_workload('small notes', [make_note(rng, args.small_words) for _ in range(args.small_notes)])
+    run_workload('large notes', [make_note(rng, args.large_words) for _ in range(args.large_notes)])
+
+
+if __name__ == '__main__':
+    main()
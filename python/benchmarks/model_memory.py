@@ -0,0 +1,89 @@
+"""
+Measures startup time and peak memory for building the AI service's pipelines.
+
+Compares the shared model registry against the previous layout, where the
+retriever, indexer and embeddings manager each owned a document store and
+their own copy of the dense and sparse models.
+
+Usage (from the python/ directory):
+    python -m benchmarks.model_memory
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+
+def _reset_registry():
+    """
+    Forgets every shared object so the next class builds its own copies.
+    """
+    import model_registry
+    from fastembed_backends import clear_backends
+
+    model_registry._document_store = None
+    model_registry._dense_backend = None
+    model_registry._sparse_backend = None
+    clear_backends()
+
+
+def measure(isolated: bool) -> dict:
+    """
+    Builds the three service classes and loads their models.
+
+    :param isolated: If True, emulate one document store and model copy per class.
+    :return: Dictionary with the elapsed time and peak resident memory.
+    """
+    start_time = time.perf_counter()
+
+    import model_registry
+    from embeddings_manager import EmbeddingsManager
+    from indexer import Indexer
+    from retriever import HybridRetrieverPipeline
+
+    # Keep references to every backend so isolated copies stay in memory
+    loaded = []
+    for service_class in (HybridRetrieverPipeline, Indexer, EmbeddingsManager):
+        if isolated:
+            _reset_registry()
+        service = service_class()
+        model_registry.load_models()
+        loaded.append((service, model_registry.get_dense_backend(), model_registry.get_sparse_backend()))
+
+    return {
+        'mode': 'isolated' if isolated else 'shared',
+        'startup_seconds': round(time.perf_counter() - start_time, 3),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['shared', 'isolated'],
+                        help='Measure a single mode in this process instead of comparing both.')
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode == 'isolated')))
+        return
+
+    # Each mode runs in a fresh interpreter so peak memory is not shared
+    results = {}
+    for mode in ('isolated', 'shared'):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.model_memory', '--mode', mode],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    for result in results.values():
+        print(f"{result['mode']:>8}: {result['startup_seconds']:>7.2f} s  {result['peak_rss_mb']:>8.1f} MB peak RSS")
+
+    print(f"saved: {results['isolated']['startup_seconds'] - results['shared']['startup_seconds']:.2f} s, "
+          f"{results['isolated']['peak_rss_mb'] - results['shared']['peak_rss_mb']:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
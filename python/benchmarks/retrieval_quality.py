@@ -0,0 +1,271 @@
+"""
+Benchmarks retrieval speed and quality for dense-only, sparse-only and hybrid search.
+
+Builds a labelled corpus from test-notes.json: every seed note gets a topic
+label and `--variants` generated variations. The corpus is indexed through
+Indexer into a local Qdrant, either in memory (the default) or in an
+embedded instance under `--qdrant-path`. Two query sets are evaluated in
+each retrieval mode (dense, sparse, Qdrant's hybrid fusion and the
+client-side fusion of hybrid_fusion.py, without reranking):
+
+  * similar_notes - every note is the query (its stored vectors, as for the
+                    related-notes sidebar); relevant = other notes on its topic
+  * text_queries  - short queries per topic, embedded like
+                    HybridRetrieverPipeline.retrieve_by_query
+
+The report covers indexing throughput, query p50/p99 latency, recall@k and
+MRR. It is written as JSON so runs can be compared across commits:
+
+Usage (from the python/ directory):
+    python -m benchmarks.retrieval_quality --output before.json
+    python -m benchmarks.retrieval_quality --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import time
+import config
+from note_chunks import aggregate_by_parent
+
+SEED_NOTES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test-notes.json')
+
+# Topic label of each seed note in test-notes.json
+SEED_TOPICS = {
+    'Grocery Shopping': 'shopping',
+    'Camping Supplies': 'shopping',
+    'Organic Shopping': 'shopping',
+    'Baking Supplies': 'shopping',
+    'Car Maintenance': 'car',
+    'Insurance Renewal': 'car',
+    'Brake Check': 'car',
+    'Research Paper': 'school',
+    'School Projects': 'school',
+    'Study Session': 'school'
+}
+
+# Extra sentences mixed into generated variants of the seed notes
+TOPIC_SENTENCES = {
+    'shopping': [
+        'Remember to bring the reusable bags.',
+        'The store had a sale on fresh bread and eggs.',
+        'Add milk, rice and olive oil to the list.',
+        'Compare prices at the farmers market next time.',
+        'We are almost out of coffee and pasta.'
+    ],
+    'car': [
+        'The mechanic said the tires are wearing unevenly.',
+        'Check the coolant level and windshield wipers.',
+        'Call the insurance agent about the deductible.',
+        'The dashboard warning light came on again.',
+        'Book the annual inspection at the garage.'
+    ],
+    'school': [
+        'The professor extended the deadline by a week.',
+        'Review the flashcards before the quiz on Monday.',
+        'Meet the lab partners in the library after class.',
+        'Outline the essay and collect citations.',
+        'Finish the homework problems from chapter four.'
+    ]
+}
+
+TEXT_QUERIES = {
+    'shopping': ['buy groceries and food', 'shopping list for the store', 'ingredients for cooking'],
+    'car': ['vehicle repair and service', 'auto insurance policy', 'oil change and tires'],
+    'school': ['exam preparation', 'homework assignment due', 'class project and studying']
+}
+
+
+def build_corpus(variants: int, seed: int) -> list:
+    """
+    :return: List of (title, content, topic) tuples: the seed notes plus their variants.
+    """
+    with open(SEED_NOTES_PATH) as seed_file:
+        seed_notes = json.load(seed_file)
+
+    rng = random.Random(seed)
+    corpus = []
+    for note in seed_notes:
+        topic = SEED_TOPICS[note['title']]
+        corpus.append((note['title'], note['content'], topic))
+        for index in range(variants):
+            extra = ' '.join(rng.sample(TOPIC_SENTENCES[topic], 2))
+            corpus.append((f"{note['title']} {index + 1}", f"{note['content']} {extra}", topic))
+    return corpus
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def score_ranking(ranked_ids: list, relevant_ids: set, top_k: int) -> tuple:
+    """
+    :return: Tuple of (recall@k, reciprocal rank of the first relevant result).
+    """
+    found = sum(1 for doc_id in ranked_ids[:top_k] if doc_id in relevant_ids)
+    recall = found / min(top_k, len(relevant_ids)) if relevant_ids else 0.0
+    reciprocal_rank = next((1 / rank for rank, doc_id in enumerate(ranked_ids, 1) if doc_id in relevant_ids), 0.0)
+    return recall, reciprocal_rank
+
+
+def evaluate(retrievers: dict, queries: list, top_k: int) -> dict:
+    """
+    Runs every query in every mode.
+
+    :param retrievers: Mode name to (retriever, function building its run arguments from a query).
+    :param queries: List of (dense embedding, sparse embedding, ID to exclude, set of relevant IDs).
+    :return: Dictionary of metrics per mode.
+    """
+    results = {}
+    for mode, (retriever, run_arguments) in retrievers.items():
+        latencies, recalls, reciprocal_ranks = [], [], []
+        for dense_embedding, sparse_embedding, excluded_id, relevant_ids in queries:
+            start_time = time.perf_counter()
+            documents = retriever.run(
+                **run_arguments(dense_embedding, sparse_embedding),
+                top_k=(top_k + 1) * config.CHUNK_CANDIDATE_MULTIPLIER
+            )['documents']
+            latencies.append(time.perf_counter() - start_time)
+
+            # Long notes are stored as several chunks; rank each note once
+            ranked_ids = [
+                document.id
+                for document in aggregate_by_parent(documents, top_k + 1)
+                if document.id != excluded_id
+            ][:top_k]
+            recall, reciprocal_rank = score_ranking(ranked_ids, relevant_ids, top_k)
+            recalls.append(recall)
+            reciprocal_ranks.append(reciprocal_rank)
+
+        results[mode] = {
+            'queries': len(queries),
+            f'recall@{top_k}': round(sum(recalls) / len(recalls), 4),
+            'mrr': round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3)
+        }
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"corpus: {report['corpus']['notes']} notes, indexing: {report['indexing']['notes_per_second']} notes/s")
+    for query_set, modes in report['evaluation'].items():
+        print(f'\n{query_set}')
+        for mode, metrics in modes.items():
+            line = '  '.join(f'{name}={value}' for name, value in metrics.items() if name != 'queries')
+            if baseline:
+                previous = baseline.get('evaluation', {}).get(query_set, {}).get(mode, {})
+                deltas = [
+                    f'{name} {value - previous[name]:+.4g}'
+                    for name, value in metrics.items()
+                    if name != 'queries' and isinstance(previous.get(name), (int, float))
+                ]
+                line += f"   (vs baseline: {', '.join(deltas)})"
+            print(f'  {mode:<7} {line}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--variants', type=int, default=20, help='Generated variants per seed note.')
+    parser.add_argument('--top-k', type=int, default=config.QDRANT_TOP_K_RESULTS)
+    parser.add_argument('--qdrant-path', help='Use an embedded Qdrant in this directory instead of memory.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='retrieval_benchmark.json', help='Where to write the JSON report.')
+    parser.add_argument('--compare', help='Earlier JSON report to print deltas against.')
+    args = parser.parse_args()
+
+    # Point the shared document store at a local, throwaway Qdrant before anything creates it
+    for connection_key in ('url', 'host', 'location', 'path'):
+        config.QDRANT_CONFIG.pop(connection_key, None)
+    config.QDRANT_CONFIG['recreate_index'] = True
+    config.VECTOR_STORE_BACKEND = 'qdrant'
+    if args.qdrant_path:
+        config.QDRANT_CONFIG['path'] = args.qdrant_path
+    else:
+        config.QDRANT_CONFIG['location'] = ':memory:'
+
+    from haystack_integrations.components.retrievers.qdrant import (
+        QdrantEmbeddingRetriever,
+        QdrantSparseEmbeddingRetriever,
+        QdrantHybridRetriever
+    )
+    from indexer import Indexer
+    from retriever import HybridRetrieverPipeline
+    from hybrid_fusion import ClientHybridRetriever
+    from model_registry import get_document_store, load_models
+
+    load_models()
+    corpus = build_corpus(args.variants, args.seed)
+
+    indexer = Indexer()
+    start_time = time.perf_counter()
+    document_ids = indexer.embed_notes([f'# {title}\n\n{content}' for title, content, _ in corpus])
+    indexing_seconds = time.perf_counter() - start_time
+
+    document_store = get_document_store()
+    ids_by_topic = {}
+    for document_id, (_, _, topic) in zip(document_ids, corpus):
+        ids_by_topic.setdefault(topic, set()).add(document_id)
+
+    retrievers = {
+        'dense': (QdrantEmbeddingRetriever(document_store=document_store),
+                  lambda dense, sparse: {'query_embedding': dense}),
+        'sparse': (QdrantSparseEmbeddingRetriever(document_store=document_store),
+                   lambda dense, sparse: {'query_sparse_embedding': sparse}),
+        'hybrid': (QdrantHybridRetriever(document_store=document_store),
+                   lambda dense, sparse: {'query_embedding': dense, 'query_sparse_embedding': sparse}),
+        'client': (ClientHybridRetriever(document_store=document_store),
+                   lambda dense, sparse: {'query_embedding': dense, 'query_sparse_embedding': sparse})
+    }
+
+    # Related notes: each note's stored vectors are the query
+    similar_note_queries = [
+        (document.embedding, document.sparse_embedding, document.id, ids_by_topic[topic] - {document.id})
+        for document, (_, _, topic) in zip(document_store.get_documents_by_id(document_ids), corpus)
+    ]
+
+    # Free-text queries, embedded the same way as the retriever embeds user queries
+    query_pipeline = HybridRetrieverPipeline()
+    text_queries = []
+    for topic, query_texts in TEXT_QUERIES.items():
+        for query_text in query_texts:
+            dense_embedding, sparse_embedding = query_pipeline.embed_query(query_text)
+            text_queries.append((dense_embedding, sparse_embedding, None, ids_by_topic[topic]))
+
+    report = {
+        'revision': git_revision(),
+        'models': {'dense': config.FASTEMBED_DENSE_MODEL, 'sparse': config.FASTEMBED_SPARSE_MODEL},
+        'top_k': args.top_k,
+        'corpus': {'notes': len(corpus), 'topics': {topic: len(ids) for topic, ids in ids_by_topic.items()}},
+        'indexing': {
+            'seconds': round(indexing_seconds, 3),
+            'notes_per_second': round(len(corpus) / indexing_seconds, 1)
+        },
+        'evaluation': {
+            'similar_notes': evaluate(retrievers, similar_note_queries, args.top_k),
+            'text_queries': evaluate(retrievers, text_queries, args.top_k)
+        }
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print_report(report, baseline)
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f'\nWrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Measures how fast categorized notes can be moved to folders in SQLite.
+
+Builds a throwaway notes database with `--notes` notes (all unassigned) and
+`--folders` folders, then moves `--moves` notes with:
+
+  * legacy   - a new connection and two commits per note, default journal mode
+               (how move_note_to_folder worked before the pooled connection)
+  * pooled   - move_note_to_folder on the thread's long-lived WAL connection
+  * bulk     - move_notes_to_folders, one transaction for every move
+
+Every mode starts from a fresh copy of the database. Half of the target folder
+names already exist and half are created by the moves.
+
+Usage (from the python/ directory):
+    python -m benchmarks.sqlite_moves --notes 50000 --moves 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+import database_utils
+from config import DATABASE_TABLE_WITH_NOTES, DATABASE_TABLE_WITH_FOLDERS
+
+
+def build_database(path: str, note_count: int, folder_count: int) -> list:
+    """
+    Creates a notes database shaped like the frontend's and returns the note IDs.
+    """
+    database_connection = sqlite3.connect(path)
+    cursor = database_connection.cursor()
+    cursor.execute(f'CREATE TABLE {DATABASE_TABLE_WITH_FOLDERS} (id TEXT PRIMARY KEY, name TEXT UNIQUE)')
+    cursor.execute(
+        f'CREATE TABLE {DATABASE_TABLE_WITH_NOTES} '
+        '(id TEXT PRIMARY KEY, title TEXT, content TEXT, folderId TEXT, embeddingsId TEXT)'
+    )
+    cursor.execute(f"INSERT INTO {DATABASE_TABLE_WITH_FOLDERS} VALUES ('unassigned', 'Unassigned')")
+    cursor.executemany(
+        f'INSERT INTO {DATABASE_TABLE_WITH_FOLDERS} VALUES (?, ?)',
+        [(str(uuid.uuid4()), f'Folder {index}') for index in range(folder_count)]
+    )
+
+    note_IDs = [str(uuid.uuid4()) for _ in range(note_count)]
+    cursor.executemany(
+        f"INSERT INTO {DATABASE_TABLE_WITH_NOTES} VALUES (?, ?, ?, 'unassigned', ?)",
+        [(note_ID, f'Note {index}', f'Synthetic note body number {index}. ' * 20, str(uuid.uuid4()))
+         for index, note_ID in enumerate(note_IDs)]
+    )
+    database_connection.commit()
+    database_connection.close()
+    return note_IDs
+
+
+def legacy_move_note_to_folder(path: str, note_ID: str, folder_name: str):
+    """
+    Copy of the original per-note implementation: connect, look up or create
+    the folder, commit, update the note, commit, close.
+    """
+    database_connection = sqlite3.connect(path)
+    cursor = database_connection.cursor()
+    cursor.execute(f'SELECT id FROM {DATABASE_TABLE_WITH_FOLDERS} WHERE name = ?', (folder_name,))
+    row = cursor.fetchone()
+    if row:
+        folder_id = row[0]
+    else:
+        folder_id = str(uuid.uuid4())
+        cursor.execute(f'INSERT INTO {DATABASE_TABLE_WITH_FOLDERS} (id, name) VALUES (?, ?)', (folder_id, folder_name))
+        database_connection.commit()
+    cursor.execute(f'UPDATE {DATABASE_TABLE_WITH_NOTES} SET folderId = ? WHERE id = ?', (folder_id, note_ID))
+    database_connection.commit()
+    cursor.close()
+    database_connection.close()
+
+
+def run_mode(mode: str, template_path: str, moves: list) -> float:
+    """
+    Applies the moves to a fresh copy of the template database and returns the elapsed seconds.
+    """
+    working_directory = tempfile.mkdtemp(prefix='sqlite-moves-')
+    path = os.path.join(working_directory, 'notes.db')
+    shutil.copyfile(template_path, path)
+    database_utils.DATABASE_PATH = path
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            if mode == 'legacy':
+                for note_ID, folder_name in moves:
+                    legacy_move_note_to_folder(path, note_ID, folder_name)
+            elif mode == 'pooled':
+                for note_ID, folder_name in moves:
+                    database_utils.move_note_to_folder(note_ID, folder_name)
+            else:
+                database_utils.move_notes_to_folders(moves)
+            elapsed = time.perf_counter() - start_time
+
+        # Check every move landed
+        cursor = database_utils.get_connection().cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {DATABASE_TABLE_WITH_NOTES} WHERE folderId != 'unassigned'")
+        assert cursor.fetchone()[0] == len(moves), f'{mode}: not every note was moved'
+        cursor.close()
+        return elapsed
+    finally:
+        database_utils.get_connection().close()
+        database_utils._thread_connections.by_path.pop(path, None)
+        shutil.rmtree(working_directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=50000, help='Notes in the database.')
+    parser.add_argument('--folders', type=int, default=50, help='Existing folders in the database.')
+    parser.add_argument('--moves', type=int, default=2000, help='Notes moved per mode.')
+    parser.add_argument('--modes', nargs='+', default=['legacy', 'pooled', 'bulk'], choices=['legacy', 'pooled', 'bulk'])
+    args = parser.parse_args()
+
+    template_directory = tempfile.mkdtemp(prefix='sqlite-moves-template-')
+    template_path = os.path.join(template_directory, 'notes.db')
+
+    try:
+        note_IDs = build_database(template_path, args.notes, args.folders)
+        random.seed(0)
+        folder_names = [f'Folder {index}' for index in range(args.folders * 2)]
+        moves = [(note_ID, random.choice(folder_names)) for note_ID in random.sample(note_IDs, args.moves)]
+
+        print(f'{args.notes} notes, {args.folders} folders, {args.moves} moves')
+        print(f'{"mode":>7}  {"seconds":>8}  {"moves/s":>10}  {"speedup":>8}')
+        baseline = None
+        for mode in args.modes:
+            elapsed = run_mode(mode, template_path, moves)
+            baseline = baseline or elapsed
+            print(f'{mode:>7}  {elapsed:>8.3f}  {args.moves / elapsed:>10.0f}  {baseline / elapsed:>7.1f}x')
+    finally:
+        shutil.rmtree(template_directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
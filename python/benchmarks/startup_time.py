@@ -0,0 +1,150 @@
+"""
+Measures how fast the AI service starts, and fails if importing app.py exceeds a budget.
+
+Each run imports app.py in a fresh interpreter under `python -X importtime`
+and records the cumulative import time, split by top-level package. With
+`--serve`, the service is also started under uvicorn and timed until
+/health answers (the port is bound and the app is serving) and until /ready
+answers (pipelines built and models loaded). /ready needs the models and
+Qdrant to be reachable, so it is skipped if it doesn't answer within
+`--ready-timeout`.
+
+The exit status is 1 when the median import time is above `--budget-ms`,
+so the check can run in CI.
+
+Usage (from the python/ directory):
+    python -m benchmarks.startup_time --runs 5 --budget-ms 1000
+    python -m benchmarks.startup_time --serve --output startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SERVICE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile() -> tuple:
+    """
+    Imports app.py in a new interpreter with `-X importtime`.
+
+    :return: Tuple of (cumulative import time of app in ms, dictionary of self time in ms per top-level package).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=SERVICE_DIRECTORY, capture_output=True, text=True, check=True
+    )
+
+    total_ms = None
+    package_ms = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = (field.strip() for field in line[len('import time:'):].split('|'))
+        package = module.split('.')[0]
+        package_ms[package] = package_ms.get(package, 0.0) + int(self_us) / 1000
+        if module == 'app':
+            total_ms = int(cumulative_us) / 1000
+    return total_ms, package_ms
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float) -> float:
+    """
+    Polls a URL until it answers 200.
+
+    :return: Seconds until it did, or None on timeout.
+    """
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start_time
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def serve_profile(ready_timeout: float) -> dict:
+    """
+    Starts the service under uvicorn and times /health and /ready from process start.
+    """
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    start_time = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app:app', '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=SERVICE_DIRECTORY, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        health_seconds = wait_for(f'{base_url}/health', 60)
+        ready_seconds = wait_for(f'{base_url}/ready', ready_timeout) if health_seconds is not None else None
+        return {
+            'health_seconds': round(health_seconds, 3) if health_seconds is not None else None,
+            'ready_seconds': round(time.perf_counter() - start_time, 3) if ready_seconds is not None else None
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Import measurements; the median is reported.')
+    parser.add_argument('--budget-ms', type=float, default=1000, help='Maximum median import time of app.py.')
+    parser.add_argument('--top', type=int, default=10, help='Packages listed by import time.')
+    parser.add_argument('--serve', action='store_true', help='Also time /health and /ready under uvicorn.')
+    parser.add_argument('--ready-timeout', type=float, default=120)
+    parser.add_argument('--output', help='Where to write the JSON report.')
+    args = parser.parse_args()
+
+    totals = []
+    package_runs = []
+    for _ in range(args.runs):
+        total_ms, package_ms = import_profile()
+        totals.append(total_ms)
+        package_runs.append(package_ms)
+
+    packages = {
+        package: round(statistics.median(run.get(package, 0.0) for run in package_runs), 1)
+        for package in package_runs[0]
+    }
+    report = {
+        'import_ms': round(statistics.median(totals), 1),
+        'import_ms_runs': [round(total, 1) for total in totals],
+        'budget_ms': args.budget_ms,
+        'packages_ms': dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top])
+    }
+    if args.serve:
+        report['serve'] = serve_profile(args.ready_timeout)
+
+    print(f"import app: {report['import_ms']} ms (median of {args.runs}, budget {args.budget_ms} ms)")
+    for package, package_ms in report['packages_ms'].items():
+        print(f'  {package:<28} {package_ms:>8.1f} ms')
+    if args.serve:
+        print(f"/health after {report['serve']['health_seconds']} s, /ready after {report['serve']['ready_seconds']} s")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if report['import_ms'] > args.budget_ms:
+        print(f"Import time is over budget by {report['import_ms'] - args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
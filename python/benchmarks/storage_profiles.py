@@ -0,0 +1,138 @@
+"""
+Measures recall@k against query latency for each Qdrant storage profile.
+
+For every profile in config.QDRANT_STORAGE_PROFILES, a scratch collection is
+created with the profile's on-disk, HNSW and quantization settings and
+filled with the same synthetic, clustered 768-dimensional vectors (shaped
+like BGE note embeddings). Queries then run with the profile's search
+parameters. Recall@k is measured against exact brute-force cosine search
+in NumPy.
+
+Quantization and HNSW only take effect on a Qdrant server. The local
+':memory:' mode searches exhaustively, so its numbers are only useful as a
+smoke test.
+
+Usage (from the python/ directory):
+    python -m benchmarks.storage_profiles --url http://localhost:6333 --vectors 50000 --queries 200 --top-k 10
+"""
+import argparse
+import time
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+from haystack_integrations.document_stores.qdrant.converters import DENSE_VECTORS_NAME
+from config import QDRANT_CONFIG, QDRANT_STORAGE_PROFILES
+from qdrant_storage import build_hnsw_config, build_quantization_config, build_search_params
+
+UPLOAD_BATCH_SIZE = 512
+
+
+def make_vectors(count: int, dimension: int, clusters: int, seed: int) -> np.ndarray:
+    """
+    Generates unit-length vectors grouped around random cluster centres.
+    """
+    generator = np.random.default_rng(seed)
+    centres = generator.standard_normal((clusters, dimension)).astype(np.float32)
+    assignments = generator.integers(0, clusters, count)
+    vectors = centres[assignments] + 0.6 * generator.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, top_k: int) -> np.ndarray:
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+def wait_until_indexed(client: QdrantClient, collection_name: str, timeout: float = 600.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get_collection(collection_name).status == rest.CollectionStatus.GREEN:
+            return
+        time.sleep(0.5)
+
+
+def run_profile(client: QdrantClient, name: str, profile: dict, vectors: np.ndarray, queries: np.ndarray,
+                truth: np.ndarray, top_k: int, keep: bool) -> dict:
+    collection_name = f'storage_profile_bench_{name}'
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config={DENSE_VECTORS_NAME: rest.VectorParams(
+            size=vectors.shape[1], distance=rest.Distance.COSINE, on_disk=profile.get('on_disk', False)
+        )},
+        on_disk_payload=profile.get('on_disk_payload'),
+        hnsw_config=build_hnsw_config(profile),
+        quantization_config=build_quantization_config(profile)
+    )
+
+    start_time = time.perf_counter()
+    for start in range(0, len(vectors), UPLOAD_BATCH_SIZE):
+        batch = vectors[start:start + UPLOAD_BATCH_SIZE]
+        client.upsert(collection_name=collection_name, points=rest.Batch(
+            ids=list(range(start, start + len(batch))),
+            vectors={DENSE_VECTORS_NAME: batch.tolist()}
+        ))
+    wait_until_indexed(client, collection_name)
+    index_seconds = time.perf_counter() - start_time
+
+    search_params = build_search_params(profile)
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start_time = time.perf_counter()
+        points = client.query_points(
+            collection_name=collection_name,
+            query=query.tolist(),
+            using=DENSE_VECTORS_NAME,
+            limit=top_k,
+            search_params=search_params
+        ).points
+        latencies.append(time.perf_counter() - start_time)
+        hits += len({point.id for point in points} & set(expected.tolist()))
+
+    if not keep:
+        client.delete_collection(collection_name)
+
+    latencies.sort()
+    return {
+        'profile': name,
+        'recall': hits / (len(queries) * top_k),
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000,
+        'index_seconds': index_seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=QDRANT_CONFIG.get('url'), help='Qdrant server URL.')
+    parser.add_argument('--location', help="Use ':memory:' instead of a server (smoke test only).")
+    parser.add_argument('--profiles', nargs='+', default=list(QDRANT_STORAGE_PROFILES), choices=list(QDRANT_STORAGE_PROFILES))
+    parser.add_argument('--vectors', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--dimension', type=int, default=QDRANT_CONFIG['embedding_dim'])
+    parser.add_argument('--clusters', type=int, default=100, help='Number of synthetic topics.')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch collections for inspection.')
+    args = parser.parse_args()
+
+    client = QdrantClient(location=args.location) if args.location else QdrantClient(url=args.url, timeout=120)
+
+    vectors = make_vectors(args.vectors, args.dimension, args.clusters, seed=0)
+    queries = make_vectors(args.queries, args.dimension, args.clusters, seed=0)[:args.queries]
+    queries = queries + 0.05 * np.random.default_rng(1).standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_neighbours(vectors, queries, args.top_k)
+
+    print(f'{args.vectors} vectors x {args.dimension} dims, {args.queries} queries, recall@{args.top_k}')
+    print(f'{"profile":>8}  {"recall":>7}  {"p50 ms":>7}  {"p99 ms":>7}  {"index s":>8}')
+    for name in args.profiles:
+        result = run_profile(client, name, QDRANT_STORAGE_PROFILES[name], vectors, queries, truth, args.top_k, args.keep)
+        print(f'{name:>8}  {result["recall"]:>7.3f}  {result["p50_ms"]:>7.2f}  {result["p99_ms"]:>7.2f}  {result["index_seconds"]:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Compares write and query latency of the vector store backends (see VECTOR_STORE_BACKEND).
+
+Every backend gets the same synthetic collection in Haystack's layout: a
+clustered 768-dimensional dense vector (shaped like BGE note embeddings), a
+SPLADE-like sparse vector with Zipf-distributed terms and a payload with a
+parent note ID. The benchmark then times the dense, sparse and hybrid (RRF)
+queries the retriever sends, plus the parent-note scroll of note_chunks.py.
+For the embedded backend, reopening the collection from disk is timed too.
+
+Qdrant's local mode gets slow past ~20k points, so pass a smaller
+`--points` when including 'qdrant_local'.
+
+Usage (from the python/ directory):
+    python -m benchmarks.vector_backends --backends embedded --points 100000
+    python -m benchmarks.vector_backends --backends embedded qdrant_local --points 20000
+    python -m benchmarks.vector_backends --backends embedded qdrant --url http://localhost:6333
+"""
+import argparse
+import shutil
+import tempfile
+import time
+import uuid
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+from haystack_integrations.document_stores.qdrant.converters import DENSE_VECTORS_NAME, SPARSE_VECTORS_NAME
+from config import QDRANT_CONFIG
+from embedded_vector_store import EmbeddedVectorClient
+from note_chunks import parent_filter
+
+COLLECTION_NAME = 'vector_backend_bench'
+UPLOAD_BATCH_SIZE = 256
+PAYLOAD_INDEX = [{'field_name': 'meta.parent_id', 'field_schema': 'keyword'}]
+
+
+def make_dense(count: int, dimension: int, clusters: int, generator) -> np.ndarray:
+    centres = generator.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centres[generator.integers(0, clusters, count)] + 0.6 * generator.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_sparse(vocabulary: int, terms: int, generator) -> rest.SparseVector:
+    indices = np.unique(np.minimum(generator.zipf(1.3, terms), vocabulary) - 1)
+    return rest.SparseVector(indices=indices.tolist(), values=generator.random(len(indices)).astype(np.float32).tolist())
+
+
+def open_client(backend: str, args, directory: str):
+    if backend == 'embedded':
+        return EmbeddedVectorClient(directory, dimension=args.dimension, payload_fields_to_index=PAYLOAD_INDEX)
+    client = QdrantClient(path=directory) if backend == 'qdrant_local' else QdrantClient(url=args.url, timeout=120)
+    if client.collection_exists(COLLECTION_NAME):
+        client.delete_collection(COLLECTION_NAME)
+    client.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config={DENSE_VECTORS_NAME: rest.VectorParams(size=args.dimension, distance=rest.Distance.COSINE)},
+        sparse_vectors_config={SPARSE_VECTORS_NAME: rest.SparseVectorParams()}
+    )
+    client.create_payload_index(COLLECTION_NAME, 'meta.parent_id', rest.PayloadSchemaType.KEYWORD)
+    return client
+
+
+def percentiles(latencies: list) -> tuple:
+    latencies = sorted(latencies)
+    return latencies[len(latencies) // 2] * 1000, latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000
+
+
+def time_queries(client, queries: list, top_k: int) -> dict:
+    """
+    :return: Dictionary mapping query kind to (p50 ms, p99 ms).
+    """
+    latencies = {'dense': [], 'sparse': [], 'hybrid': []}
+    for dense, sparse in queries:
+        start_time = time.perf_counter()
+        client.query_points(COLLECTION_NAME, query=dense, using=DENSE_VECTORS_NAME, limit=top_k, with_payload=True)
+        latencies['dense'].append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        client.query_points(COLLECTION_NAME, query=sparse, using=SPARSE_VECTORS_NAME, limit=top_k, with_payload=True)
+        latencies['sparse'].append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        client.query_batch_points(COLLECTION_NAME, requests=[rest.QueryRequest(
+            prefetch=[
+                rest.Prefetch(query=sparse, using=SPARSE_VECTORS_NAME, limit=top_k),
+                rest.Prefetch(query=dense, using=DENSE_VECTORS_NAME, limit=top_k)
+            ],
+            query=rest.FusionQuery(fusion=rest.Fusion.RRF),
+            limit=top_k,
+            with_payload=True
+        )])
+        latencies['hybrid'].append(time.perf_counter() - start_time)
+    return {kind: percentiles(values) for kind, values in latencies.items()}
+
+
+def run_backend(backend: str, args, dense: np.ndarray, sparse: list, queries: list) -> dict:
+    directory = tempfile.mkdtemp(prefix=f'{backend}-')
+    try:
+        client = open_client(backend, args, directory)
+        point_ids = [str(uuid.UUID(int=index)) for index in range(len(dense))]
+
+        start_time = time.perf_counter()
+        for start in range(0, len(dense), UPLOAD_BATCH_SIZE):
+            client.upsert(COLLECTION_NAME, points=[
+                rest.PointStruct(
+                    id=point_ids[index],
+                    vector={DENSE_VECTORS_NAME: dense[index].tolist(), SPARSE_VECTORS_NAME: sparse[index]},
+                    payload={'id': f'note-{index}', 'content': f'Note {index}', 'meta': {'parent_id': f'note-{index // 2}'}}
+                )
+                for index in range(start, min(start + UPLOAD_BATCH_SIZE, len(dense)))
+            ])
+        result = {'backend': backend, 'upsert_seconds': time.perf_counter() - start_time}
+
+        if backend == 'embedded':
+            client.close()
+            start_time = time.perf_counter()
+            client = open_client(backend, args, directory)
+            client.count(COLLECTION_NAME)
+            result['open_seconds'] = time.perf_counter() - start_time
+
+        result.update(time_queries(client, queries, args.top_k))
+
+        scroll_latencies = []
+        for query_index in range(len(queries)):
+            start_time = time.perf_counter()
+            client.scroll(COLLECTION_NAME, scroll_filter=parent_filter([f'note-{query_index * 7}']), limit=100, with_vectors=True)
+            scroll_latencies.append(time.perf_counter() - start_time)
+        result['parent_scroll'] = percentiles(scroll_latencies)
+
+        if backend == 'qdrant':
+            client.delete_collection(COLLECTION_NAME)
+        client.close()
+        return result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['embedded'], choices=['embedded', 'qdrant_local', 'qdrant'])
+    parser.add_argument('--url', default=QDRANT_CONFIG.get('url'), help='Qdrant server URL for the qdrant backend.')
+    parser.add_argument('--points', type=int, default=100000, help='Chunks in the collection.')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--dimension', type=int, default=QDRANT_CONFIG['embedding_dim'])
+    parser.add_argument('--clusters', type=int, default=100, help='Number of synthetic topics.')
+    parser.add_argument('--vocabulary', type=int, default=30000, help='Sparse vocabulary size.')
+    parser.add_argument('--sparse-terms', type=int, default=120, help='Terms drawn per sparse vector, before deduplication.')
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(0)
+    dense = make_dense(args.points, args.dimension, args.clusters, generator)
+    sparse = [make_sparse(args.vocabulary, args.sparse_terms, generator) for _ in range(args.points)]
+    queries = [
+        (vector.tolist(), make_sparse(args.vocabulary, args.sparse_terms // 4, generator))
+        for vector in make_dense(args.queries, args.dimension, args.clusters, generator)
+    ]
+
+    print(f'{args.points} points x {args.dimension} dims, {args.queries} queries, top {args.top_k}; p50 / p99 in ms')
+    print(f'{"backend":>12}  {"upsert s":>9}  {"open s":>7}  {"dense":>15}  {"sparse":>15}  {"hybrid":>15}  {"parent scroll":>15}')
+    for backend in args.backends:
+        result = run_backend(backend, args, dense, sparse, queries)
+        open_seconds = f'{result["open_seconds"]:.2f}' if 'open_seconds' in result else '-'
+        latencies = '  '.join(f'{result[kind][0]:>7.2f} {result[kind][1]:>7.2f}' for kind in ('dense', 'sparse', 'hybrid', 'parent_scroll'))
+        print(f'{backend:>12}  {result["upsert_seconds"]:>9.1f}  {open_seconds:>7}  {latencies}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from ollama import Client, AsyncClient
+from dotenv import load_dotenv
+from config import (
+    DATABASE_PATH,
+    PROMPT_TEMPLATE,
+    CATEGORIZATION_PARALLELISM,
+    CATEGORIZATION_MOVE_BATCH_SIZE,
+    CATEGORIZATION_JOBS_KEPT
+)
+from auto_categorize_notes import (
+    BufferedFolderMover,
+    CategorizationStats,
+    create_fast_path_categorizer,
+    load_uncategorized_notes,
+    categorize_notes,
+    categorize_notes_concurrently
+)
+from prompt_builder import PromptBuilder
+
+
+class JobAlreadyRunningError(Exception):
+    """
+    Raised when a categorization job is started while another one is still
+    running against the same database.
+    """
+
+    def __init__(self, job_id: str):
+        super().__init__(f'Categorization job {job_id} is already running for this database.')
+        self.job_id = job_id
+
+
+class CategorizationJob:
+    """
+    Tracks one background auto-categorization run.
+
+    A job finishes as 'completed', 'completed_with_errors' (some notes failed),
+    'failed' (every note failed, or the run itself did) or 'cancelled'.
+    """
+
+    def __init__(self, database_path: str, parallelism: int):
+        """
+        :param database_path: Absolute path of the notes database the job works on.
+        :param parallelism: Number of notes categorized at the same time.
+        """
+        self.id = str(uuid.uuid4())
+        self.database_path = database_path
+        self.parallelism = parallelism
+        self.status = 'pending'
+        self.total = 0
+        self.categorized = 0
+        self.errors = []
+        self.stats = CategorizationStats()
+        self.folder_mover = BufferedFolderMover(CATEGORIZATION_MOVE_BATCH_SIZE)
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.finished_event = threading.Event()
+        self._lock = threading.Lock()
+
+
+    @property
+    def processed(self) -> int:
+        return self.categorized + len(self.errors)
+
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ('completed', 'completed_with_errors', 'cancelled', 'failed')
+
+
+    def record_categorized(self, note: dict, category_name: str):
+        self.folder_mover(note, category_name)
+        with self._lock:
+            self.categorized += 1
+
+
+    def record_error(self, note: dict, error: Exception):
+        with self._lock:
+            self.errors.append({'note_id': note.get('id'), 'error': str(error)})
+
+
+    def final_status(self) -> str:
+        """
+        :return: The status of a run that ended without raising, from its note counts.
+        """
+        if self.cancel_event.is_set():
+            return 'cancelled'
+        with self._lock:
+            if self.errors and self.categorized == 0:
+                return 'failed'
+            return 'completed_with_errors' if self.errors else 'completed'
+
+
+    def to_dict(self) -> dict:
+        """
+        Summarizes the job's progress.
+
+        :return: Dictionary with status, counts, throughput and errors.
+        """
+        with self._lock:
+            end_time = self.finished_at or time.time()
+            elapsed = end_time - self.started_at if self.started_at else 0.0
+            processed = self.processed
+            return {
+                'id': self.id,
+                'status': self.status,
+                'parallelism': self.parallelism,
+                'notes_total': self.total,
+                'notes_processed': processed,
+                'notes_categorized': self.categorized,
+                'notes_remaining': max(0, self.total - processed),
+                'elapsed_seconds': round(elapsed, 3),
+                'notes_per_second': round(processed / elapsed, 3) if elapsed else 0.0,
+                'paths': self.stats.to_dict(),
+                'errors': list(self.errors)
+            }
+
+
+class CategorizationJobManager:
+    """
+    Runs auto-categorization jobs on background threads, allowing at most one
+    running job per database. Only the last CATEGORIZATION_JOBS_KEPT finished
+    jobs are kept.
+    """
+
+    def __init__(self, retriever=None):
+        """
+        :param retriever: HybridRetrieverPipeline shared with the neighbour-vote fast path.
+        """
+        self.retriever = retriever
+        self._jobs = {}
+        self._running_job_by_database = {}
+        self._lock = threading.Lock()
+
+
+    def start(self, parallelism: int = CATEGORIZATION_PARALLELISM) -> CategorizationJob:
+        """
+        Starts a categorization job in the background.
+
+        :param parallelism: Number of notes categorized at the same time.
+        :return: The new job.
+        :raises JobAlreadyRunningError: If a job is already running for the database.
+        """
+        database_key = os.path.abspath(DATABASE_PATH)
+
+        with self._lock:
+            running_job = self._running_job_by_database.get(database_key)
+            if running_job is not None and not running_job.is_finished:
+                raise JobAlreadyRunningError(running_job.id)
+
+            job = CategorizationJob(database_key, parallelism)
+            self._jobs[job.id] = job
+            self._running_job_by_database[database_key] = job
+            self._forget_old_jobs()
+
+        threading.Thread(target=self._run, args=(job,), name=f'categorization-{job.id}', daemon=True).start()
+        return job
+
+
+    def _forget_old_jobs(self):
+        """
+        Drops the oldest finished jobs beyond CATEGORIZATION_JOBS_KEPT. Must be called with the lock held.
+        """
+        finished_job_ids = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        for job_id in finished_job_ids[:max(0, len(finished_job_ids) - CATEGORIZATION_JOBS_KEPT)]:
+            del self._jobs[job_id]
+
+
+    def get(self, job_id: str):
+        """
+        :return: The job with the given ID, or None if it is unknown.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+    def cancel(self, job_id: str):
+        """
+        Asks a job to stop after the notes already in flight.
+
+        :return: The job, or None if it is unknown.
+        """
+        job = self.get(job_id)
+        if job is not None and not job.is_finished:
+            job.cancel_event.set()
+        return job
+
+
+    def _run(self, job: CategorizationJob):
+        """
+        Body of the job thread.
+        """
+        load_dotenv()
+        ollama_host = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+        prompt_builder = PromptBuilder(PROMPT_TEMPLATE)
+
+        job.started_at = time.time()
+        job.status = 'running'
+        final_status = 'failed'
+
+        try:
+            fast_path = create_fast_path_categorizer(self.retriever)
+            uncategorized_notes, note_categories = load_uncategorized_notes()
+            job.total = len(uncategorized_notes)
+
+            if job.parallelism > 1:
+                asyncio.run(categorize_notes_concurrently(
+                    uncategorized_notes,
+                    note_categories,
+                    prompt_builder,
+                    AsyncClient(host=ollama_host),
+                    job.parallelism,
+                    on_categorized=job.record_categorized,
+                    should_stop=job.cancel_event.is_set,
+                    on_error=job.record_error,
+                    fast_path=fast_path,
+                    stats=job.stats
+                ))
+            else:
+                categorize_notes(
+                    uncategorized_notes,
+                    note_categories,
+                    prompt_builder,
+                    Client(host=ollama_host),
+                    on_categorized=job.record_categorized,
+                    should_stop=job.cancel_event.is_set,
+                    on_error=job.record_error,
+                    fast_path=fast_path,
+                    stats=job.stats
+                )
+
+            final_status = job.final_status()
+        except Exception as e:
+            job.record_error({}, e)
+            final_status = 'failed'
+        finally:
+            # The job stays 'running' until the buffered moves are written, so no
+            # second job (or poller) sees notes categorized but not yet moved
+            try:
+                # Write the moves still buffered, also when the job was cancelled or failed
+                job.folder_mover.flush()
+            except Exception as e:
+                job.record_error({}, e)
+                final_status = 'failed'
+            job.finished_at = time.time()
+            job.status = final_status
+            job.finished_event.set()
@@ -8,23 +8,150 @@ load_dotenv()
 DATABASE_PATH = '../data/notesApp.db'
 DATABASE_TABLE_WITH_NOTES = 'notes'
 DATABASE_TABLE_WITH_FOLDERS = 'folders' 
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers don't block the writer (and vice versa)
+    'synchronous': 'NORMAL',  # Safe with WAL, avoids an fsync per commit
+    'cache_size': -64000,  # 64 MB page cache per connection
+    'mmap_size': 268435456,  # Memory-map up to 256 MB of the database file
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000  # Wait up to 5 s for the frontend's writes instead of failing
+}
+SQLITE_FETCH_BATCH_SIZE = 500  # Rows read per fetchmany call when streaming query results
 
 # Embeddings Database
+# Where the vectors live:
+#   'qdrant'       - a Qdrant server at QDRANT_CONFIG['url']
+#   'qdrant_local' - qdrant-client's local mode, files in QDRANT_LOCAL_PATH; no server, but slow past ~20k chunks
+#   'embedded'     - in-process NumPy store in EMBEDDED_VECTOR_STORE_PATH (see embedded_vector_store.py);
+#                    exact search, no server, sized for ~100k notes on one machine
+# Switching backends starts from an empty collection; re-index with `python note_sync.py`.
+VECTOR_STORE_BACKEND = os.getenv('VECTOR_STORE_BACKEND', 'qdrant')
+QDRANT_LOCAL_PATH = './qdrant_local'
+EMBEDDED_VECTOR_STORE_PATH = './vector_store'
 QDRANT_CONFIG = {
     'url': os.getenv('QDRANT_URL_BASE', 'https://localhost:6333'),
     'index': 'Test',
     'recreate_index': False,  # Prevent overwriting existing data
     'use_sparse_embeddings': True,  # Enable sparse embeddings
-    'embedding_dim': 768  # Set embedding dimension
+    'embedding_dim': 768,  # Set embedding dimension
+    # Chunk lookups and deletes filter on the parent note ID (see note_chunks.py)
+    'payload_fields_to_index': [{'field_name': 'meta.parent_id', 'field_schema': 'keyword'}]
 }
 QDRANT_TOP_K_RESULTS = 3
+# Storage profiles trade memory on the Qdrant node for recall and latency. Applied
+# when the collection is created; migrate an existing one with `python qdrant_storage.py`.
+# Compare profiles with `python -m benchmarks.storage_profiles`.
+QDRANT_STORAGE_PROFILES = {
+    # Full float32 vectors and payload in RAM (Qdrant defaults)
+    'default': {},
+    # int8 vectors in RAM (~4x smaller), float32 originals on disk for rescoring
+    'scalar': {
+        'on_disk': True,
+        'on_disk_payload': True,
+        'hnsw': {'m': 16, 'ef_construct': 100},
+        'quantization': {'type': 'scalar', 'quantile': 0.99, 'always_ram': True},
+        'search': {'hnsw_ef': 128, 'rescore': True, 'oversampling': 2.0}
+    },
+    # 1 bit per dimension in RAM (~32x smaller); needs more oversampling to keep recall
+    'binary': {
+        'on_disk': True,
+        'on_disk_payload': True,
+        'hnsw': {'m': 16, 'ef_construct': 100},
+        'quantization': {'type': 'binary', 'always_ram': True},
+        'search': {'hnsw_ef': 128, 'rescore': True, 'oversampling': 3.0}
+    },
+    # Scalar quantization with a sparser HNSW graph for the smallest index
+    'compact': {
+        'on_disk': True,
+        'on_disk_payload': True,
+        'hnsw': {'m': 8, 'ef_construct': 64, 'on_disk': True},
+        'quantization': {'type': 'scalar', 'quantile': 0.99, 'always_ram': True},
+        'search': {'hnsw_ef': 96, 'rescore': True, 'oversampling': 2.0}
+    }
+}
+QDRANT_STORAGE_PROFILE = os.getenv('QDRANT_STORAGE_PROFILE', 'default')
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = 1024  # Query texts whose dense and sparse embeddings are kept in memory
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = 3600
+RETRIEVAL_RESULT_CACHE_MAX_ENTRIES = 2048  # Retrieval results kept in memory, invalidated when the collection changes
+RETRIEVAL_RESULT_CACHE_TTL_SECONDS = 300  # Also bounds staleness from writers outside this process
 FASTEMBED_SPARSE_MODEL = 'prithvida/Splade_PP_en_v1'
 FASTEMBED_DENSE_MODEL = 'BAAI/bge-base-en-v1.5'
 FASTEMBED_CACHE_DIRECTORY = './models'
 METADATA_FIELDS_TO_EMBED = ['folder', 'title']
+# Sized so re-indexing a whole vault reuses every conversion; an LRU pass over more notes than fit evicts each one before reuse
+MARKDOWN_CACHE_MAX_ENTRIES = 20000  # Notes whose plain-text conversion is kept in memory
+MARKDOWN_CACHE_MAX_TOTAL_CHARS = 20000000  # Plain-text characters kept in the cache across all notes
+MARKDOWN_CACHE_TTL_SECONDS = 86400
+MARKDOWN_CACHE_MAX_TEXT_LENGTH = 20000  # Characters; longer notes are converted without caching
+INDEXING_BATCH_SIZE = 64  # Notes embedded per pipeline run during bulk indexing
+# Long notes are embedded as several chunks; the models only read the first 512 tokens of a text
+CHUNK_MAX_WORDS = 300  # Words of Markdown per chunk, leaving headroom below 512 tokens
+CHUNK_OVERLAP_WORDS = 40  # Words repeated from the end of the previous chunk
+CHUNK_SCORE_AGGREGATION = 'max'  # How a note's chunk hits combine into one score: 'max' or 'sum'
+CHUNK_CANDIDATE_MULTIPLIER = 3  # Chunks retrieved per requested note, so one note's chunks don't crowd out the others
+# Hybrid fusion: 'server' lets Qdrant fuse the dense and sparse results with RRF;
+# 'client' runs both searches in parallel and fuses them in hybrid_fusion.py with the settings below.
+RETRIEVAL_FUSION_MODE = 'server'
+RETRIEVAL_DENSE_CANDIDATES = 40  # Chunks fetched by the dense search in client mode
+RETRIEVAL_SPARSE_CANDIDATES = 40  # Chunks fetched by the sparse search in client mode
+RETRIEVAL_FUSION_METHOD = 'rrf'  # 'rrf' (ranks only) or 'weighted' (weighted sum of min-max normalized scores)
+RETRIEVAL_RRF_K = 60  # Larger values flatten the gap between ranks
+RETRIEVAL_DENSE_WEIGHT = 1.0
+RETRIEVAL_SPARSE_WEIGHT = 1.0
+RETRIEVAL_DEDUPLICATE_BY_PARENT = True  # Keep each note's best chunk only, so the reranker sees distinct notes
+RETRIEVAL_RERANKER_MODEL = None  # FastEmbed cross-encoder for text queries, e.g. 'Xenova/ms-marco-MiniLM-L-6-v2'
+RETRIEVAL_RERANK_TOP_N = 20  # Fused candidates passed to the reranker; the rest are dropped
+INFERENCE_WORKERS = 16  # Threads waiting on the embedding batchers, shared by requests and queued updates
+INFERENCE_ONNX_THREADS = max(1, (os.cpu_count() or 1) // 2)  # ONNX intra-op threads; the dense and sparse batchers may run at once
+EMBEDDING_BATCH_MAX_SIZE = 32  # Maximum texts per model call when batching concurrent requests
+EMBEDDING_BATCH_MAX_WAIT_MS = 5  # How long the first request of a batch waits for others to join
+QDRANT_USE_ASYNC_CLIENT = VECTOR_STORE_BACKEND == 'qdrant'  # The local backends have no async client sharing their data
+EMBEDDING_CACHE_PATH = './embedding_cache.db'
+EMBEDDING_CACHE_MAX_ENTRIES = 10000
+EMBEDDING_UPDATE_DEBOUNCE_SECONDS = 2.0  # Quiet time before a queued note update is embedded
+EMBEDDING_UPDATE_BATCH_SIZE = 32  # Maximum queued note updates embedded together
+NOTE_SYNC_STATE_TABLE = 'note_sync_state'  # Checkpoint of what each note was last embedded from, kept in the notes database
+NOTE_SYNC_BATCH_SIZE = 64  # Notes embedded, verified or deleted per step of `python note_sync.py`
+FOLDER_CENTROID_RECONCILE_SECONDS = 30  # Minimum time between folder membership checks against the notes database
+
+# Startup
+# Build the pipelines and load the models in the background after the server starts,
+# so /health answers right away; other requests wait until the models are loaded.
+# Disable to finish loading before the server accepts connections.
+FAST_START = True
+
+# Diagnostics
+METRICS_ENABLED = True  # Record timing spans for GET /metrics
+METRICS_HISTOGRAM_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]  # Upper bounds in seconds
+SERVER_TIMING_ENABLED = False  # Add a Server-Timing header with each request's spans to the response
+# Sample every thread's stack while serving and write folded stacks (flame-graph data)
+# for requests slower than PROFILER_SLOW_REQUEST_SECONDS. Adds overhead; enable to diagnose.
+PROFILER_ENABLED = False
+PROFILER_INTERVAL_MS = 10  # Time between two stack samples
+PROFILER_MAX_SAMPLES = 200000  # Recent stack samples kept in memory, across all threads
+PROFILER_SLOW_REQUEST_SECONDS = 1.0
+PROFILER_OUTPUT_DIRECTORY = './profiles'
 
 # Language model
 MODEL_NAME = 'llama3.1:8b-instruct-q3_K_S'
+# Concurrent categorization requests; the Ollama server only runs them in parallel
+# up to its OLLAMA_NUM_PARALLEL setting and queues the rest.
+CATEGORIZATION_PARALLELISM = 4
+CATEGORIZATION_JOBS_KEPT = 20  # Finished categorization jobs kept for GET /jobs/{job_id}; older ones are forgotten
+# Folder moves written to SQLite per transaction. Notes in a batch that isn't written
+# yet are invisible to the fast path's neighbour lookup, so keep this small.
+CATEGORIZATION_MOVE_BATCH_SIZE = 20
+# Skip the LLM when a note's nearest neighbours already agree on a folder
+CATEGORIZATION_FAST_PATH_ENABLED = True
+CATEGORIZATION_FAST_PATH_TOP_K = 5  # Neighbours retrieved per note
+CATEGORIZATION_FAST_PATH_MIN_NEIGHBOURS = 3  # Neighbours that must already be in a folder
+CATEGORIZATION_FAST_PATH_MIN_AGREEMENT = 0.8  # Share of neighbour score the winning folder needs
+OLLAMA_KEEP_ALIVE = '30m'  # How long Ollama keeps the model, and the cached prompt prefix, loaded between requests
+PROMPT_CONTENT_MAX_TOKENS = 1024  # Note content beyond this many tokens is cut from the prompt; None keeps it all
+PROMPT_CHARS_PER_TOKEN = 4  # Characters per token used to estimate prompt sizes
+PROMPT_TEMPLATE_CACHE_DIRECTORY = None  # Where compiled prompt templates are cached; None uses the system temp directory
+# The templates start with the parts shared by every note (instructions and the
+# sorted category list), so Ollama can reuse its cache for that prefix.
 PROMPT_TEMPLATE = """
 You are a note categorizer. Help me organize my notes by selecting a category based on the title and content.
 
@@ -33,15 +160,22 @@ Use these guidelines:
 Choose an existing category from the list if it fits.
 If none of the existing categories fit, generate a new one. Make sure the new category is brief and clear.
 Provide only the category name — no explanation.
+Existing Categories: [{{ categories | join(', ') }}]
 Title: {{ title }}
 Content: {{ content }}
-Existing Categories: [{{ categories | join(', ') }}]
 
 Category:
 """
 PROMPT_TEMPLATE_WITH_SEMANTIC_SEARCH_RESULTS = """
 You are a content categorizer. Help me organize content by selecting the most appropriate category.
 
+Instructions:
+1. Choose an existing category if it fits well
+2. Create a new category only if necessary (keep it brief)
+3. Return ONLY the category name without explanation
+
+Existing Categories: [{{ categories | join(', ') }}]
+
 Content to categorize:
 Title: {{ title }}
 Content: {{ content }}
@@ -51,12 +185,5 @@ Most similar existing content:
 - Similar item ({{ result.score|round(2) }}): Category "{{ result.meta.folder }}", Content: "{{ result.content|truncate(80) }}"
 {% endfor %}
 
-Existing Categories: [{{ categories | join(', ') }}]
-
-Instructions:
-1. Choose an existing category if it fits well
-2. Create a new category only if necessary (keep it brief)
-3. Return ONLY the category name without explanation
-
 Category:
 """
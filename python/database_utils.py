@@ -1,10 +1,154 @@
 import sqlite3
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 from config import (
     DATABASE_PATH,
     DATABASE_TABLE_WITH_NOTES,
-    DATABASE_TABLE_WITH_FOLDERS
+    DATABASE_TABLE_WITH_FOLDERS,
+    SQLITE_PRAGMAS,
+    SQLITE_FETCH_BATCH_SIZE
 ) 
+from instrumentation import span
+
+# Callables taking (note_ID, folder_id), invoked after a note is moved by move_note_to_folder
+NOTE_MOVE_LISTENERS = []
+
+# One long-lived connection per thread and database file
+_thread_connections = threading.local()
+
+# Database files whose indexes were already created by this process, and when the
+# others were last tried
+_indexed_database_paths = set()
+_index_attempted_at = {}
+_indexed_database_paths_lock = threading.Lock()
+INDEX_RETRY_SECONDS = 30  # Minimum time between attempts while the frontend hasn't created the tables
+
+# (index name, table, column) created if missing, to support the filtered reads below
+DATABASE_INDEXES = [
+    ('idx_notes_folderId', DATABASE_TABLE_WITH_NOTES, 'folderId'),
+    ('idx_notes_embeddingsId', DATABASE_TABLE_WITH_NOTES, 'embeddingsId')
+]
+
+
+# Statements that only control transactions; they are not timed as queries
+TRANSACTION_CONTROL_STATEMENTS = ('BEGIN', 'COMMIT', 'END', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+def is_transaction_control(sql: str) -> bool:
+    words = sql.split(None, 1)
+    return bool(words) and words[0].rstrip(';').upper() in TRANSACTION_CONTROL_STATEMENTS
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor recording each execute/executemany call as the 'sqlite_query' span,
+    except transaction control statements. Rows fetched afterwards are not included.
+    """
+
+    def execute(self, sql, parameters=()):
+        if is_transaction_control(sql):
+            return super().execute(sql, parameters)
+        with span('sqlite_query'):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        with span('sqlite_query'):
+            return super().executemany(sql, seq_of_parameters)
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors are TimedCursors. The execute shortcuts are routed
+    through a TimedCursor too, since sqlite3's own bypass the cursor's methods.
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Returns this thread's long-lived connection to the notes database, opening
+    and tuning it (WAL journal, synchronous, cache_size, mmap_size, ...) on first use.
+
+    Connections run in autocommit mode; use `transaction()` to group writes.
+
+    Returns:
+        sqlite3.Connection: The connection for the current thread.
+    """
+    connections = getattr(_thread_connections, 'by_path', None)
+    if connections is None:
+        connections = _thread_connections.by_path = {}
+
+    database_connection = connections.get(DATABASE_PATH)
+    if database_connection is None:
+        database_connection = sqlite3.connect(DATABASE_PATH, isolation_level=None, factory=TimedConnection)
+        for pragma, value in SQLITE_PRAGMAS.items():
+            database_connection.execute(f'PRAGMA {pragma} = {value}')
+        connections[DATABASE_PATH] = database_connection
+    ensure_indexes(database_connection)
+    return database_connection
+
+
+def ensure_indexes(database_connection: sqlite3.Connection):
+    """
+    Creates the indexes in DATABASE_INDEXES if they don't exist, once per database
+    file and process. Tables the frontend hasn't created yet are skipped, and their
+    indexes are tried again at most every INDEX_RETRY_SECONDS until all exist.
+
+    Args:
+        database_connection (sqlite3.Connection): Connection to the notes database.
+    """
+    with _indexed_database_paths_lock:
+        if DATABASE_PATH in _indexed_database_paths:
+            return
+        attempted_at = _index_attempted_at.get(DATABASE_PATH)
+        if attempted_at is not None and time.monotonic() - attempted_at < INDEX_RETRY_SECONDS:
+            return
+        _index_attempted_at[DATABASE_PATH] = time.monotonic()
+
+    created_every_index = True
+    for index_name, table_name, column in DATABASE_INDEXES:
+        try:
+            database_connection.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({column})')
+        except sqlite3.OperationalError as e:
+            created_every_index = False
+            print(f'Skipped index {index_name}: {e}')
+
+    if created_every_index:
+        with _indexed_database_paths_lock:
+            _indexed_database_paths.add(DATABASE_PATH)
+
+
+@contextmanager
+def transaction():
+    """
+    Runs the enclosed statements in one write transaction on this thread's
+    connection, committing on success and rolling back on error.
+
+    Yields:
+        sqlite3.Cursor: Cursor to run statements with.
+    """
+    database_connection = get_connection()
+    cursor = database_connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        yield cursor
+        cursor.execute('COMMIT')
+    except BaseException:
+        cursor.execute('ROLLBACK')
+        raise
+    finally:
+        cursor.close()
+
 
 def main():
     """
@@ -14,6 +158,56 @@ def main():
     # e77458de-b24c-463b-a993-1c9af7205544 Pediatrist
 
 
+def iter_rows(table_name: str, columns: list = None, where: str = None, parameters: tuple = (),
+              batch_size: int = SQLITE_FETCH_BATCH_SIZE):
+    """
+    Lazily yields rows of a table as dictionaries, reading `batch_size` rows at a time.
+
+    The column list and filter run in SQL, so only the requested columns of
+    matching rows are ever loaded.
+
+    Args:
+        table_name (str): Name of the table to query.
+        columns (list): Columns to select. Selects every column if None.
+        where (str): Optional SQL condition, with ? placeholders for `parameters`.
+        parameters (tuple): Values bound to the placeholders in `where`.
+        batch_size (int): Number of rows fetched from SQLite per round trip.
+
+    Yields:
+        dict: One row, keyed by column name.
+    """
+    cursor = get_connection().cursor()
+
+    try:
+        query = f'SELECT {", ".join(columns) if columns else "*"} FROM {table_name}'
+        if where:
+            query += f' WHERE {where}'
+        cursor.execute(query, parameters)
+
+        # Get column names
+        column_names = [description[0] for description in cursor.description]
+
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(column_names, row))
+
+    finally:
+        cursor.close()
+
+
+def fetch_rows(table_name: str, columns: list = None, where: str = None, parameters: tuple = ()) -> list:
+    """
+    Retrieves the rows of a table matching a filter, see `iter_rows`.
+
+    Returns:
+        list: Rows as dictionaries keyed by column name.
+    """
+    return list(iter_rows(table_name, columns, where, parameters))
+
+
 def fetch_table_data_as_dictionary(table_name: str) -> dict:
     """
     Connects to an SQLite database, retrieves all rows from a specified table,
@@ -26,26 +220,112 @@ def fetch_table_data_as_dictionary(table_name: str) -> dict:
     Returns:
         dict: dictionary containing the table data.
     """
-    database_connection = sqlite3.connect(DATABASE_PATH)
+    return fetch_rows(table_name)
+
+
+def fetch_folder_names_by_embeddings_ids(embeddings_ids: list) -> dict:
+    """
+    Looks up the folder of each note identified by its embeddings ID, skipping
+    notes that are still in the 'unassigned' folder.
+
+    Args:
+        embeddings_ids (list): Embeddings IDs of the notes to look up.
+
+    Returns:
+        dict: Mapping of embeddings ID to folder name.
+    """
+    if not embeddings_ids:
+        return {}
+
+    cursor = get_connection().cursor()
 
     try:
-        cursor = database_connection.cursor()
+        placeholders = ', '.join('?' for _ in embeddings_ids)
+        query = (
+            f'SELECT {DATABASE_TABLE_WITH_NOTES}.embeddingsId, {DATABASE_TABLE_WITH_FOLDERS}.name '
+            f'FROM {DATABASE_TABLE_WITH_NOTES} '
+            f'JOIN {DATABASE_TABLE_WITH_FOLDERS} ON {DATABASE_TABLE_WITH_FOLDERS}.id = {DATABASE_TABLE_WITH_NOTES}.folderId '
+            f"WHERE {DATABASE_TABLE_WITH_NOTES}.folderId != 'unassigned' "
+            f'AND {DATABASE_TABLE_WITH_NOTES}.embeddingsId IN ({placeholders})'
+        )
+        cursor.execute(query, list(embeddings_ids))
+        return dict(cursor.fetchall())
+
+    finally:
+        cursor.close()
+
+
+def fetch_note_folder_memberships() -> list:
+    """
+    Retrieves the folder of every note that has embeddings, without loading note contents.
+
+    Returns:
+        list: (embeddingsId, folderId) tuples.
+    """
+    cursor = get_connection().cursor()
 
-        # Fetch all rows from the table
-        query = f'SELECT * FROM {table_name}'
+    try:
+        query = (
+            f'SELECT embeddingsId, folderId FROM {DATABASE_TABLE_WITH_NOTES} '
+            "WHERE embeddingsId IS NOT NULL AND embeddingsId != ''"
+        )
         cursor.execute(query)
-        rows = cursor.fetchall()
+        return cursor.fetchall()
+
+    finally:
+        cursor.close()
 
-        # Get column names
-        columns = [description[0] for description in cursor.description]
 
-        # Return the mapped rows to dictionaries using column names as keys
-        table_data_as_dict = [dict(zip(columns, row)) for row in rows]
-        return table_data_as_dict
+def fetch_embeddings_id(note_ID: str):
+    """
+    Looks up the embeddings ID of a note.
+
+    Args:
+        note_ID (str): ID of the note.
+
+    Returns:
+        str: The note's embeddings ID, or None if the note has none.
+    """
+    cursor = get_connection().cursor()
+
+    try:
+        query = f'SELECT embeddingsId FROM {DATABASE_TABLE_WITH_NOTES} WHERE id = ?'
+        cursor.execute(query, (note_ID,))
+        row = cursor.fetchone()
+        return row[0] if row and row[0] else None
 
     finally:
         cursor.close()
-        database_connection.close()
+
+
+def update_embeddings_ids(embeddings_ids_by_note: dict, cursor: sqlite3.Cursor = None):
+    """
+    Stores the embeddings ID of many notes.
+
+    Args:
+        embeddings_ids_by_note (dict): Mapping of note ID to its new embeddings ID.
+        cursor (sqlite3.Cursor): Cursor of an open `transaction()` to write with.
+            A transaction of its own is used if None.
+    """
+    if not embeddings_ids_by_note:
+        return
+
+    query = f'UPDATE {DATABASE_TABLE_WITH_NOTES} SET embeddingsId = ? WHERE id = ?'
+    parameters = [(embeddings_id, note_ID) for note_ID, embeddings_id in embeddings_ids_by_note.items()]
+    if cursor is not None:
+        cursor.executemany(query, parameters)
+        return
+
+    with transaction() as cursor:
+        cursor.executemany(query, parameters)
+
+
+def add_note_move_listener(listener):
+    """
+    Registers a callable taking (note_ID, folder_id) that is invoked after
+    move_note_to_folder or move_notes_to_folders moves a note.
+    """
+    NOTE_MOVE_LISTENERS.append(listener)
 
 
 def move_note_to_folder(note_ID: str, folder_name: str):
@@ -56,41 +336,59 @@ def move_note_to_folder(note_ID: str, folder_name: str):
         note_ID (str): ID of the note to move.
         folder_name (str): Name of the folder to move the note to.
     """
+    try:
+        move_notes_to_folders([(note_ID, folder_name)])
+    except sqlite3.Error as e:
+        print(f'Database error: {e}')
+    except Exception as e:
+        print(f'Error: {e}')
 
-    database_connection = sqlite3.connect(DATABASE_PATH)
 
-    try:
-        cursor = database_connection.cursor()
-
-        # Check if the folder exists
-        select_query = f'SELECT id FROM {DATABASE_TABLE_WITH_FOLDERS} WHERE name = ?'
-        cursor.execute(select_query, (folder_name,))
-        matching_id_as_list = cursor.fetchone()
-
-        # If the folder exists, get its ID; otherwise, create the folder
-        if matching_id_as_list:
-            folder_id = matching_id_as_list[0]
-            print(f"Folder '{folder_name}' exists with ID {folder_id}.")
-        else:
-            folder_id = str(uuid.uuid4())
-            insert_query = f'INSERT INTO {DATABASE_TABLE_WITH_FOLDERS} (id, name) VALUES (?, ?)'
-            cursor.execute(insert_query, (folder_id, folder_name))
-            database_connection.commit()
+def move_notes_to_folders(moves: list) -> dict:
+    """
+    Moves many notes to folders in a single transaction, creating missing folders.
+
+    The folder name to ID map is read once up front, new folders are inserted
+    once each, and all note updates are applied with one executemany.
+
+    Parameters:
+        moves (list): (note_ID, folder_name) tuples.
+
+    Returns:
+        dict: Mapping of note ID to the ID of the folder it was moved to.
+    """
+    if not moves:
+        return {}
+
+    with transaction() as cursor:
+        # Resolve every existing folder name to its ID once
+        cursor.execute(f'SELECT name, id FROM {DATABASE_TABLE_WITH_FOLDERS}')
+        folder_ids_by_name = dict(cursor.fetchall())
+
+        # Create the folders that don't exist yet
+        new_folders = []
+        for _, folder_name in moves:
+            if folder_name not in folder_ids_by_name:
+                folder_ids_by_name[folder_name] = str(uuid.uuid4())
+                new_folders.append((folder_ids_by_name[folder_name], folder_name))
+
+        insert_query = f'INSERT INTO {DATABASE_TABLE_WITH_FOLDERS} (id, name) VALUES (?, ?)'
+        cursor.executemany(insert_query, new_folders)
+        for folder_id, folder_name in new_folders:
             print(f'Folder "{folder_name}" created with ID {folder_id}.')
 
-        # Update the note's folderId
+        # Update every note's folderId
+        folder_id_by_note = {note_ID: folder_ids_by_name[folder_name] for note_ID, folder_name in moves}
         update_query = f'UPDATE {DATABASE_TABLE_WITH_NOTES} SET folderId = ? WHERE id = ?'
-        cursor.execute(update_query, (folder_id, note_ID))
-        database_connection.commit()
-        print(f'Note {note_ID} has been moved to folder with ID {folder_id}.')
+        cursor.executemany(update_query, [(folder_id, note_ID) for note_ID, folder_id in folder_id_by_note.items()])
 
-    except sqlite3.Error as e:
-        print(f'Database error: {e}')
-    except Exception as e:
-        print(f'Error: {e}')
-    finally:
-        cursor.close()
-        database_connection.close()
+    print(f'Moved {len(folder_id_by_note)} note(s) into {len(set(folder_id_by_note.values()))} folder(s).')
+
+    for note_ID, folder_id in folder_id_by_note.items():
+        for listener in NOTE_MOVE_LISTENERS:
+            listener(note_ID, folder_id)
+
+    return folder_id_by_note
 
 
 if __name__ == '__main__':
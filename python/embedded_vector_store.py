@@ -0,0 +1,887 @@
+"""
+In-process vector store for running the AI service without a Qdrant server.
+
+EmbeddedVectorClient implements the part of QdrantClient's API that
+QdrantDocumentStore and this service use (upsert, retrieve, scroll, count,
+delete, query_points, query_batch_points, create_payload_index), so the
+document store, the Haystack retrievers and the direct client calls in
+retriever.py, note_chunks.py and note_sync.py work unchanged.
+
+Each collection is stored in a directory as:
+
+  * <collection>.npy[.<generation>] - memory-mapped float32 matrix of the dense
+                          vectors, normalized for cosine similarity, one row per point
+  * <collection>.sqlite - point IDs, their matrix rows, payloads (JSON), sparse
+                          vectors and the generation of the current matrix file
+
+Search is exact. Dense scores are one matrix-vector product over the
+memory-mapped matrix; sparse scores are summed from an in-memory inverted
+index (term -> rows and weights). Hybrid queries fuse their prefetch results
+with Reciprocal Rank Fusion the same way Qdrant does. Payload fields listed
+in `payload_fields_to_index` get an in-memory keyword index, so the
+parent-note filters of note_chunks.py never read payloads; filters on other
+fields are checked against the payloads stored in SQLite.
+
+Rows of deleted or overwritten points are reclaimed by compacting the matrix
+once they make up COMPACT_DEAD_FRACTION of it. A grown or compacted matrix is
+written to a file of the next generation, and only becomes current when that
+generation is committed to SQLite together with the new rows of the points,
+so a crash at any point leaves a matrix that matches the stored rows.
+"""
+import bisect
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+import numpy as np
+from numpy.lib.format import open_memmap
+from qdrant_client.http import models as rest
+from qdrant_client.local.payload_filters import check_filter
+from haystack_integrations.document_stores.qdrant.converters import DENSE_VECTORS_NAME, SPARSE_VECTORS_NAME
+
+MIN_CAPACITY = 1024  # Rows allocated for a new matrix; it doubles when full
+COMPACT_DEAD_FRACTION = 0.25  # Share of dead rows that triggers a compaction
+COMPACT_MIN_DEAD_ROWS = 1024
+SPARSE_MERGE_MIN_ENTRIES = 65536  # Pending postings merged into the sorted index at once
+DEFAULT_PREFETCH_LIMIT = 10  # Qdrant's default for a prefetch without a limit
+DEFAULT_RRF_K = 2  # Qdrant's ranking constant for Reciprocal Rank Fusion
+COPY_BATCH_ROWS = 8192  # Rows copied at a time when the matrix is grown or compacted
+SQLITE_BATCH_SIZE = 500  # Point IDs per SQLite IN (...) lookup
+
+
+def _point_key(point_id):
+    """
+    :return: The point ID as Qdrant reports it: an int, or a UUID string with dashes.
+    """
+    if isinstance(point_id, int):
+        return point_id
+    return str(uuid.UUID(str(point_id)))
+
+
+def _stored_key(point_id: str):
+    return int(point_id) if point_id.isdigit() else point_id
+
+
+def _scroll_key(point_id) -> tuple:
+    """
+    :return: Sort key of a point ID in Qdrant's scroll order: integer IDs first, then UUIDs.
+    """
+    if isinstance(point_id, int):
+        return '', point_id
+    return point_id, 0
+
+
+def _matrix_files(directory: str, name: str) -> dict:
+    """
+    :return: Dictionary mapping the generation of every matrix file of a collection on disk to its path.
+    """
+    pattern = re.compile(re.escape(name) + r'\.npy(?:\.(\d+))?')
+    matrix_files = {}
+    for file_name in os.listdir(directory):
+        match = pattern.fullmatch(file_name)
+        if match:
+            matrix_files[int(match.group(1) or 0)] = os.path.join(directory, file_name)
+    return matrix_files
+
+
+def _as_list(conditions) -> list:
+    if conditions is None:
+        return []
+    return conditions if isinstance(conditions, list) else [conditions]
+
+
+def _select_payload(payload: dict, with_payload):
+    """
+    Applies a Qdrant payload selector (True, False, a list of keys or an include/exclude selector).
+    """
+    if with_payload is None or with_payload is False:
+        return None
+    if with_payload is True:
+        return payload
+    if isinstance(with_payload, rest.PayloadSelectorExclude):
+        return {key: value for key, value in payload.items() if key not in with_payload.exclude}
+    keys = with_payload.include if isinstance(with_payload, rest.PayloadSelectorInclude) else with_payload
+
+    selected = {}
+    for key in keys:
+        source, target = payload, selected
+        parts = key.split('.')
+        for part in parts[:-1]:
+            if not isinstance(source, dict) or part not in source:
+                break
+            source = source[part]
+            target = target.setdefault(part, {})
+        else:
+            if isinstance(source, dict) and parts[-1] in source:
+                target[parts[-1]] = source[parts[-1]]
+    return selected
+
+
+class SparseIndex:
+    """
+    Inverted index of the sparse vectors: for each term, the rows containing it and their weights.
+
+    Postings are kept in flat arrays sorted by term. New postings collect in a
+    small dictionary and are merged into the arrays in bulk, so indexing stays
+    linear while queries only touch the postings of their own terms.
+    """
+
+    def __init__(self):
+        self._terms = np.empty(0, dtype=np.int64)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._rows = np.empty(0, dtype=np.int64)
+        self._weights = np.empty(0, dtype=np.float32)
+        self._pending = {}
+        self._pending_entries = 0
+
+
+    def build(self, rows: np.ndarray, terms: np.ndarray, weights: np.ndarray):
+        """
+        Replaces the index with the given postings.
+        """
+        order = np.argsort(terms, kind='stable')
+        terms = terms[order]
+        self._rows = rows[order].astype(np.int64)
+        self._weights = weights[order].astype(np.float32)
+        self._terms, starts = np.unique(terms, return_index=True)
+        self._offsets = np.append(starts, len(terms)).astype(np.int64)
+        self._pending = {}
+        self._pending_entries = 0
+
+
+    def postings(self) -> tuple:
+        """
+        :return: Tuple of (rows, terms, weights) arrays of every posting, merged and pending.
+        """
+        pending_rows, pending_terms, pending_weights = [], [], []
+        for term, (rows, weights) in self._pending.items():
+            pending_rows.extend(rows)
+            pending_terms.extend([term] * len(rows))
+            pending_weights.extend(weights)
+        term_counts = np.diff(self._offsets)
+        return (
+            np.concatenate([self._rows, np.array(pending_rows, dtype=np.int64)]),
+            np.concatenate([np.repeat(self._terms, term_counts), np.array(pending_terms, dtype=np.int64)]),
+            np.concatenate([self._weights, np.array(pending_weights, dtype=np.float32)])
+        )
+
+
+    def add(self, row: int, indices: list, values: list):
+        for term, weight in zip(indices, values):
+            entry = self._pending.get(term)
+            if entry is None:
+                entry = self._pending[term] = ([], [])
+            entry[0].append(row)
+            entry[1].append(weight)
+        self._pending_entries += len(indices)
+
+
+    def needs_merge(self) -> bool:
+        return self._pending_entries > max(SPARSE_MERGE_MIN_ENTRIES, len(self._rows) // 4)
+
+
+    def merge(self, row_map: np.ndarray = None):
+        """
+        Merges the pending postings into the sorted arrays.
+
+        :param row_map: Optional array mapping old rows to new rows, -1 for rows to drop.
+        """
+        rows, terms, weights = self.postings()
+        if row_map is not None:
+            rows = row_map[rows]
+            keep = rows >= 0
+            rows, terms, weights = rows[keep], terms[keep], weights[keep]
+        self.build(rows, terms, weights)
+
+
+    def scores(self, indices: list, values: list, row_count: int) -> tuple:
+        """
+        :return: Tuple of (dot-product score per row, boolean mask of rows sharing a term with the query).
+        """
+        row_parts, weight_parts = [], []
+        for term, query_weight in zip(indices, values):
+            position = np.searchsorted(self._terms, term)
+            if position < len(self._terms) and self._terms[position] == term:
+                start, end = self._offsets[position], self._offsets[position + 1]
+                row_parts.append(self._rows[start:end])
+                weight_parts.append(self._weights[start:end] * query_weight)
+            pending = self._pending.get(term)
+            if pending is not None:
+                row_parts.append(np.array(pending[0], dtype=np.int64))
+                weight_parts.append(np.array(pending[1], dtype=np.float32) * query_weight)
+
+        if not row_parts:
+            return np.zeros(row_count, dtype=np.float32), np.zeros(row_count, dtype=bool)
+        rows = np.concatenate(row_parts)
+        scores = np.bincount(rows, weights=np.concatenate(weight_parts), minlength=row_count)
+        matched = np.bincount(rows, minlength=row_count) > 0
+        return scores, matched
+
+
+class EmbeddedCollection:
+    """
+    One collection of points, see the module docstring. Safe to use from many threads;
+    every operation holds the collection's lock.
+    """
+
+    def __init__(self, directory: str, name: str, dimension: int, distance: str = 'cosine',
+                 named_vectors: bool = True, indexed_fields: list = None):
+        """
+        :param directory: Directory holding the collection's files.
+        :param name: Collection name.
+        :param dimension: Size of the dense vectors.
+        :param distance: 'cosine' or 'dot_product'.
+        :param named_vectors: Whether points carry named dense and sparse vectors (Haystack's
+                              layout with sparse embeddings) or one unnamed dense vector.
+        :param indexed_fields: Payload keys, e.g. 'meta.parent_id', to keep a keyword index for.
+        """
+        if distance not in ('cosine', 'dot_product'):
+            raise ValueError(f"The embedded vector store supports 'cosine' and 'dot_product' similarity, not '{distance}'.")
+
+        self.name = name
+        self.dimension = dimension
+        self.normalize = distance == 'cosine'
+        self.named_vectors = named_vectors
+        self.directory = directory
+        self._lock = threading.RLock()
+
+        self._database = sqlite3.connect(os.path.join(directory, f'{name}.sqlite'), check_same_thread=False)
+        self._database.execute('PRAGMA journal_mode = WAL')
+        self._database.execute('PRAGMA synchronous = NORMAL')
+        self._database.execute(
+            'CREATE TABLE IF NOT EXISTS points ('
+            'point_id TEXT PRIMARY KEY, row INTEGER NOT NULL, has_dense INTEGER NOT NULL, '
+            'payload TEXT, sparse_indices BLOB, sparse_values BLOB)'
+        )
+        self._database.execute('CREATE TABLE IF NOT EXISTS collection_state (key TEXT PRIMARY KEY, value)')
+
+        self._keyword_indexes = {field: {} for field in indexed_fields or []}
+        self._field_values = {field: {} for field in indexed_fields or []}
+        self._sparse = SparseIndex()
+        self._load()
+
+
+    def _load(self):
+        """
+        Opens the matrix of the committed generation, removes the files of other
+        generations left by an interrupted resize, and rebuilds the in-memory
+        indexes from SQLite.
+        """
+        stored_generation = self._database.execute(
+            "SELECT value FROM collection_state WHERE key = 'matrix_generation'"
+        ).fetchone()
+        self._generation = stored_generation[0] if stored_generation else 0
+        self._matrix_path = self._matrix_file(self._generation)
+        if os.path.exists(self._matrix_path):
+            self._matrix = np.load(self._matrix_path, mmap_mode='r+')
+        else:
+            self._matrix = open_memmap(self._matrix_path, mode='w+', dtype=np.float32, shape=(MIN_CAPACITY, self.dimension))
+        for generation, file_path in _matrix_files(self.directory, self.name).items():
+            if generation != self._generation:
+                os.remove(file_path)
+
+        records = self._database.execute('SELECT point_id, row, has_dense, sparse_indices, sparse_values FROM points').fetchall()
+        self._row_count = max((row for _, row, _, _, _ in records), default=-1) + 1
+        capacity = len(self._matrix)
+        self._point_ids = [None] * capacity
+        self._row_by_id = {}
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._has_dense = np.zeros(capacity, dtype=bool)
+        self._scroll_order = None
+
+        sparse_rows, sparse_terms, sparse_weights = [], [], []
+        for point_id, row, has_dense, sparse_indices, sparse_values in records:
+            key = _stored_key(point_id)
+            self._point_ids[row] = key
+            self._row_by_id[key] = row
+            self._alive[row] = True
+            self._has_dense[row] = bool(has_dense)
+            if sparse_indices:
+                terms = np.frombuffer(sparse_indices, dtype=np.int64)
+                sparse_terms.append(terms)
+                sparse_weights.append(np.frombuffer(sparse_values, dtype=np.float32))
+                sparse_rows.append(np.full(len(terms), row, dtype=np.int64))
+        if sparse_rows:
+            self._sparse.build(np.concatenate(sparse_rows), np.concatenate(sparse_terms), np.concatenate(sparse_weights))
+
+        for field in self._keyword_indexes:
+            self._index_field(field)
+        self._compact_if_needed(force=self._row_count > len(records))
+
+
+    def _index_field(self, field: str):
+        json_path = '$.' + field
+        for point_id, value in self._database.execute('SELECT point_id, json_extract(payload, ?) FROM points', (json_path,)):
+            if value is not None:
+                self._add_keyword(field, self._row_by_id[_stored_key(point_id)], value)
+
+
+    def _add_keyword(self, field: str, row: int, value):
+        self._keyword_indexes[field].setdefault(value, set()).add(row)
+        self._field_values[field][row] = value
+
+
+    def _matrix_file(self, generation: int) -> str:
+        matrix_path = os.path.join(self.directory, f'{self.name}.npy')
+        return matrix_path if generation == 0 else f'{matrix_path}.{generation}'
+
+
+    def _remove_row(self, row: int):
+        self._scroll_order = None
+        self._alive[row] = False
+        self._row_by_id.pop(self._point_ids[row], None)
+        self._point_ids[row] = None
+        for field, values in self._field_values.items():
+            value = values.pop(row, None)
+            if value is not None:
+                rows = self._keyword_indexes[field][value]
+                rows.discard(row)
+                if not rows:
+                    del self._keyword_indexes[field][value]
+
+
+    def _ensure_capacity(self, row_count: int):
+        capacity = len(self._matrix)
+        if row_count <= capacity:
+            return
+
+        capacity = max(row_count, capacity * 2)
+        generation = self._write_matrix(capacity, np.arange(self._row_count))
+        with self._database:
+            self._commit_generation(generation)
+        self._switch_matrix(generation)
+
+        grown = capacity - len(self._point_ids)
+        self._point_ids.extend([None] * grown)
+        self._alive = np.concatenate([self._alive, np.zeros(grown, dtype=bool)])
+        self._has_dense = np.concatenate([self._has_dense, np.zeros(grown, dtype=bool)])
+
+
+    def _write_matrix(self, capacity: int, rows: np.ndarray) -> int:
+        """
+        Writes the given rows, in order, to the matrix file of the next generation, with
+        room for `capacity` rows. The current matrix stays in use until `_switch_matrix`.
+
+        :return: The new generation.
+        """
+        generation = self._generation + 1
+        matrix = open_memmap(self._matrix_file(generation), mode='w+', dtype=np.float32, shape=(capacity, self.dimension))
+        for start in range(0, len(rows), COPY_BATCH_ROWS):
+            batch = rows[start:start + COPY_BATCH_ROWS]
+            matrix[start:start + len(batch)] = self._matrix[batch]
+        matrix.flush()
+        del matrix
+        return generation
+
+
+    def _commit_generation(self, generation: int):
+        """
+        Records the current matrix generation; call inside the transaction that makes it current.
+        """
+        self._database.execute(
+            "INSERT OR REPLACE INTO collection_state (key, value) VALUES ('matrix_generation', ?)", (generation,)
+        )
+
+
+    def _switch_matrix(self, generation: int):
+        """
+        Opens the matrix of a committed generation and removes the previous one.
+        """
+        previous_path = self._matrix_path
+        self._matrix._mmap.close()
+        self._generation = generation
+        self._matrix_path = self._matrix_file(generation)
+        self._matrix = np.load(self._matrix_path, mmap_mode='r+')
+        os.remove(previous_path)
+
+
+    def _compact_if_needed(self, force: bool = False):
+        """
+        Moves the live rows to the front of the matrix once enough rows are dead.
+        """
+        dead_rows = self._row_count - len(self._row_by_id)
+        if not force and (dead_rows < COMPACT_MIN_DEAD_ROWS or dead_rows < COMPACT_DEAD_FRACTION * self._row_count):
+            if self._sparse.needs_merge():
+                self._sparse.merge()
+            return
+
+        live_rows = np.flatnonzero(self._alive[:self._row_count])
+        row_map = np.full(max(self._row_count, 1), -1, dtype=np.int64)
+        row_map[live_rows] = np.arange(len(live_rows))
+        capacity = max(MIN_CAPACITY, int(len(live_rows) * 1.5))
+        point_ids = [self._point_ids[row] for row in live_rows]
+        has_dense = self._has_dense[live_rows]
+
+        # The new rows and the matrix holding them become current in one transaction
+        generation = self._write_matrix(capacity, live_rows)
+        with self._database:
+            self._database.executemany(
+                'UPDATE points SET row = ? WHERE point_id = ?',
+                [(row, str(point_id)) for row, point_id in enumerate(point_ids)]
+            )
+            self._commit_generation(generation)
+        self._switch_matrix(generation)
+
+        self._point_ids = point_ids + [None] * (capacity - len(point_ids))
+        self._row_by_id = {point_id: row for row, point_id in enumerate(point_ids)}
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:len(live_rows)] = True
+        self._has_dense = np.zeros(capacity, dtype=bool)
+        self._has_dense[:len(live_rows)] = has_dense
+        self._row_count = len(live_rows)
+        self._scroll_order = None
+        self._sparse.merge(row_map)
+        for field, values in self._field_values.items():
+            self._field_values[field] = {int(row_map[row]): value for row, value in values.items()}
+            self._keyword_indexes[field] = {
+                value: {int(row_map[row]) for row in rows} for value, rows in self._keyword_indexes[field].items()
+            }
+
+
+    def add_index(self, field: str):
+        with self._lock:
+            if field not in self._keyword_indexes:
+                self._keyword_indexes[field] = {}
+                self._field_values[field] = {}
+                self._index_field(field)
+
+
+    def upsert(self, points: list):
+        with self._lock:
+            records = []
+            for point in points:
+                key = _point_key(point.id)
+                dense, sparse = self._split_vector(point.vector)
+
+                existing_row = self._row_by_id.get(key)
+                if existing_row is not None:
+                    self._remove_row(existing_row)
+
+                row = self._row_count
+                self._ensure_capacity(row + 1)
+                self._row_count += 1
+                self._scroll_order = None
+                self._point_ids[row] = key
+                self._row_by_id[key] = row
+                self._alive[row] = True
+                self._has_dense[row] = dense is not None
+                if dense is not None:
+                    vector = np.asarray(dense, dtype=np.float32)
+                    if self.normalize:
+                        norm = np.linalg.norm(vector)
+                        vector = vector / norm if norm > 0 else vector
+                    self._matrix[row] = vector
+
+                sparse_indices = sparse_values = None
+                if sparse is not None:
+                    self._sparse.add(row, sparse.indices, sparse.values)
+                    sparse_indices = np.asarray(sparse.indices, dtype=np.int64).tobytes()
+                    sparse_values = np.asarray(sparse.values, dtype=np.float32).tobytes()
+
+                payload = point.payload or {}
+                for field in self._keyword_indexes:
+                    value = self._payload_value(payload, field)
+                    if value is not None:
+                        self._add_keyword(field, row, value)
+                records.append((str(key), row, dense is not None, json.dumps(payload), sparse_indices, sparse_values))
+
+            self._matrix.flush()
+            with self._database:
+                self._database.executemany(
+                    'INSERT OR REPLACE INTO points (point_id, row, has_dense, payload, sparse_indices, sparse_values) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    records
+                )
+            self._compact_if_needed()
+
+
+    def _split_vector(self, vector) -> tuple:
+        """
+        :return: Tuple of (dense vector or None, rest.SparseVector or None).
+        """
+        if vector is None:
+            return None, None
+        if not isinstance(vector, dict):
+            return vector, None
+        dense = vector.get(DENSE_VECTORS_NAME, vector.get(''))
+        sparse = vector.get(SPARSE_VECTORS_NAME)
+        if isinstance(sparse, dict):
+            sparse = rest.SparseVector(**sparse)
+        return dense, sparse
+
+
+    @staticmethod
+    def _payload_value(payload: dict, field: str):
+        value = payload
+        for part in field.split('.'):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value if isinstance(value, (str, int, bool)) else None
+
+
+    def delete(self, points_selector):
+        with self._lock:
+            if isinstance(points_selector, rest.FilterSelector):
+                rows = np.flatnonzero(self._filter_mask(points_selector.filter))
+            elif isinstance(points_selector, rest.Filter):
+                rows = np.flatnonzero(self._filter_mask(points_selector))
+            else:
+                point_ids = points_selector.points if isinstance(points_selector, rest.PointIdsList) else points_selector
+                rows = [self._row_by_id[key] for key in map(_point_key, point_ids) if key in self._row_by_id]
+
+            deleted_ids = [str(self._point_ids[row]) for row in rows]
+            for row in rows:
+                self._remove_row(int(row))
+            with self._database:
+                self._database.executemany('DELETE FROM points WHERE point_id = ?', [(point_id,) for point_id in deleted_ids])
+            self._compact_if_needed()
+
+
+    def count(self, count_filter=None) -> int:
+        with self._lock:
+            if count_filter is None:
+                return len(self._row_by_id)
+            return int(self._filter_mask(count_filter).sum())
+
+
+    def _filter_mask(self, query_filter) -> np.ndarray:
+        """
+        :return: Boolean mask over the rows of the live points matching the filter.
+        """
+        alive = self._alive[:self._row_count]
+        if query_filter is None:
+            return alive.copy()
+        mask = self._indexed_mask(query_filter)
+        if mask is None:
+            mask = self._payload_mask(query_filter)
+        return mask & alive
+
+
+    def _indexed_mask(self, condition):
+        """
+        Evaluates a filter from the keyword indexes and point IDs alone.
+
+        :return: Boolean row mask, or None if the filter needs the payloads.
+        """
+        if isinstance(condition, rest.Filter):
+            if condition.min_should is not None:
+                return None
+            must = [self._indexed_mask(part) for part in _as_list(condition.must)]
+            should = [self._indexed_mask(part) for part in _as_list(condition.should)]
+            must_not = [self._indexed_mask(part) for part in _as_list(condition.must_not)]
+            if any(mask is None for mask in must + should + must_not):
+                return None
+
+            mask = np.ones(self._row_count, dtype=bool)
+            for part in must:
+                mask &= part
+            if should:
+                mask &= np.logical_or.reduce(should)
+            for part in must_not:
+                mask &= ~part
+            return mask
+
+        rows = None
+        if isinstance(condition, rest.HasIdCondition):
+            rows = [self._row_by_id[key] for key in map(_point_key, condition.has_id) if key in self._row_by_id]
+        elif isinstance(condition, rest.FieldCondition) and condition.key in self._keyword_indexes:
+            index = self._keyword_indexes[condition.key]
+            if isinstance(condition.match, rest.MatchValue):
+                rows = list(index.get(condition.match.value, ()))
+            elif isinstance(condition.match, rest.MatchAny):
+                rows = [row for value in condition.match.any for row in index.get(value, ())]
+        if rows is None:
+            return None
+
+        mask = np.zeros(self._row_count, dtype=bool)
+        mask[rows] = True
+        return mask
+
+
+    def _payload_mask(self, query_filter) -> np.ndarray:
+        mask = np.zeros(self._row_count, dtype=bool)
+        for point_id, payload, _, _ in self._read_points(list(self._row_by_id)):
+            row = self._row_by_id[point_id]
+            has_vector = {DENSE_VECTORS_NAME: bool(self._has_dense[row])}
+            mask[row] = check_filter(query_filter, payload, point_id, has_vector)
+        return mask
+
+
+    def _read_points(self, point_ids: list):
+        """
+        Yields (point ID, payload, sparse indices, sparse values) for the given points, read from SQLite.
+        """
+        for start in range(0, len(point_ids), SQLITE_BATCH_SIZE):
+            batch = [str(point_id) for point_id in point_ids[start:start + SQLITE_BATCH_SIZE]]
+            placeholders = ', '.join('?' * len(batch))
+            for point_id, payload, sparse_indices, sparse_values in self._database.execute(
+                f'SELECT point_id, payload, sparse_indices, sparse_values FROM points WHERE point_id IN ({placeholders})',
+                batch
+            ):
+                yield _stored_key(point_id), json.loads(payload), sparse_indices, sparse_values
+
+
+    def _records(self, rows: list, scores: list = None, with_payload=True, with_vectors=False) -> list:
+        """
+        Builds Records (or ScoredPoints when scores are given) for rows, in order.
+        """
+        point_ids = [self._point_ids[row] for row in rows]
+        stored = {}
+        if with_payload or with_vectors:
+            stored = {point_id: rest_of for point_id, *rest_of in self._read_points(point_ids)}
+
+        results = []
+        for position, (row, point_id) in enumerate(zip(rows, point_ids)):
+            payload, sparse_indices, sparse_values = stored.get(point_id, ({}, None, None))
+            vector = self._vector(row, sparse_indices, sparse_values, with_vectors) if with_vectors else None
+            selected_payload = _select_payload(payload, with_payload)
+            if scores is None:
+                results.append(rest.Record(id=point_id, payload=selected_payload, vector=vector))
+            else:
+                results.append(rest.ScoredPoint(id=point_id, version=0, score=float(scores[position]),
+                                                payload=selected_payload, vector=vector))
+        return results
+
+
+    def _vector(self, row: int, sparse_indices: bytes, sparse_values: bytes, with_vectors):
+        dense = self._matrix[row].tolist() if self._has_dense[row] else None
+        if not self.named_vectors:
+            return dense
+
+        vector = {}
+        if dense is not None:
+            vector[DENSE_VECTORS_NAME] = dense
+        if sparse_indices:
+            vector[SPARSE_VECTORS_NAME] = rest.SparseVector(
+                indices=np.frombuffer(sparse_indices, dtype=np.int64).tolist(),
+                values=np.frombuffer(sparse_values, dtype=np.float32).tolist()
+            )
+        if isinstance(with_vectors, list):
+            vector = {name: value for name, value in vector.items() if name in with_vectors}
+        return vector
+
+
+    def retrieve(self, ids: list, with_payload=True, with_vectors=False) -> list:
+        with self._lock:
+            rows = [self._row_by_id[key] for key in map(_point_key, ids) if key in self._row_by_id]
+            return self._records(rows, with_payload=with_payload, with_vectors=with_vectors)
+
+
+    def _sorted_rows(self) -> tuple:
+        """
+        :return: Tuple of (scroll keys of the live points in scroll order, array of their rows).
+                 Cached until the next write.
+        """
+        if self._scroll_order is None:
+            ordered = sorted((_scroll_key(point_id), row) for point_id, row in self._row_by_id.items())
+            self._scroll_order = (
+                [key for key, _ in ordered],
+                np.array([row for _, row in ordered], dtype=np.int64)
+            )
+        return self._scroll_order
+
+
+    def scroll(self, scroll_filter=None, limit: int = 10, offset=None, with_payload=True, with_vectors=False) -> tuple:
+        """
+        Pages through the points in ID order. Like Qdrant, the next offset is the ID
+        of the first point of the next page, and a page starts at the first point
+        with an ID of at least the offset, even if the offset point was deleted since.
+        """
+        with self._lock:
+            keys, rows = self._sorted_rows()
+            start = bisect.bisect_left(keys, _scroll_key(_point_key(offset))) if offset is not None else 0
+            mask = self._filter_mask(scroll_filter)
+            rows = rows[start:]
+            rows = rows[mask[rows]][:limit + 1].tolist()
+            next_offset = self._point_ids[rows[limit]] if len(rows) > limit else None
+            return self._records(rows[:limit], with_payload=with_payload, with_vectors=with_vectors), next_offset
+
+
+    def query(self, query=None, using=None, prefetch=None, query_filter=None, limit: int = 10, offset: int = 0,
+              score_threshold: float = None, with_payload=True, with_vectors=False) -> list:
+        """
+        Runs a dense, sparse or fused (prefetch + RRF) query.
+
+        :return: List of ScoredPoints, best first.
+        """
+        with self._lock:
+            mask = self._filter_mask(query_filter)
+            rows, scores = self._search(query, using, prefetch, mask, (limit or 10) + (offset or 0), score_threshold)
+            rows, scores = rows[offset or 0:], scores[offset or 0:]
+            return self._records(rows, scores, with_payload=with_payload, with_vectors=with_vectors)
+
+
+    def _search(self, query, using, prefetch, mask: np.ndarray, limit: int, score_threshold: float = None) -> tuple:
+        """
+        :return: Tuple of (list of rows, list of scores), best first.
+        """
+        if prefetch:
+            fused = {}
+            weights = None
+            rrf_k = DEFAULT_RRF_K
+            if isinstance(query, rest.RrfQuery):
+                weights = query.rrf.weights
+                rrf_k = query.rrf.k if query.rrf.k is not None else DEFAULT_RRF_K
+            elif not (isinstance(query, rest.FusionQuery) and query.fusion == rest.Fusion.RRF):
+                raise NotImplementedError('The embedded vector store only fuses prefetches with RRF.')
+
+            for position, part in enumerate(_as_list(prefetch)):
+                part_mask = mask if part.filter is None else mask & self._filter_mask(part.filter)
+                part_rows, _ = self._search(part.query, part.using, part.prefetch, part_mask,
+                                            part.limit or DEFAULT_PREFETCH_LIMIT, part.score_threshold)
+                weight = weights[position] if weights is not None else 1.0
+                for rank, row in enumerate(part_rows):
+                    # Same formula as Qdrant's reciprocal rank fusion
+                    score = 1 / ((rank + 1.0) / weight + rrf_k - 1.0) if weight > 0 else 0.0
+                    fused[row] = fused.get(row, 0.0) + score
+
+            ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+            if score_threshold is not None:
+                ranked = [(row, score) for row, score in ranked if score >= score_threshold]
+            ranked = ranked[:limit]
+            return [row for row, _ in ranked], [score for _, score in ranked]
+
+        if isinstance(query, rest.SparseVector) or using == SPARSE_VECTORS_NAME:
+            scores, matched = self._sparse.scores(query.indices, query.values, self._row_count)
+            candidates = mask & matched
+        elif isinstance(query, (list, np.ndarray)):
+            vector = np.asarray(query, dtype=np.float32)
+            if self.normalize:
+                norm = np.linalg.norm(vector)
+                vector = vector / norm if norm > 0 else vector
+            scores = self._matrix[:self._row_count] @ vector
+            candidates = mask & self._has_dense[:self._row_count]
+        else:
+            raise NotImplementedError(f'The embedded vector store does not support {type(query).__name__} queries.')
+
+        rows = np.flatnonzero(candidates)
+        if score_threshold is not None:
+            rows = rows[scores[rows] >= score_threshold]
+        if len(rows) > limit:
+            rows = rows[np.argpartition(-scores[rows], limit - 1)[:limit]]
+        rows = rows[np.argsort(-scores[rows], kind='stable')]
+        return rows.tolist(), scores[rows].tolist()
+
+
+    def close(self):
+        with self._lock:
+            self._matrix.flush()
+            self._database.close()
+
+
+class EmbeddedVectorClient:
+    """
+    Drop-in replacement for the QdrantClient methods used by QdrantDocumentStore and
+    this service, backed by EmbeddedCollections in one directory.
+    """
+
+    def __init__(self, path: str, dimension: int, distance: str = 'cosine', named_vectors: bool = True,
+                 payload_fields_to_index: list = None):
+        """
+        :param path: Directory holding the collections; created if missing.
+        :param dimension: Size of the dense vectors.
+        :param distance: 'cosine' or 'dot_product'.
+        :param named_vectors: See EmbeddedCollection.
+        :param payload_fields_to_index: Haystack-style list of {'field_name': ...} dictionaries.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dimension = dimension
+        self.distance = distance
+        self.named_vectors = named_vectors
+        self.indexed_fields = [field['field_name'] for field in payload_fields_to_index or []]
+        self._collections = {}
+        self._lock = threading.Lock()
+
+
+    def _collection(self, collection_name: str) -> EmbeddedCollection:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                collection = self._collections[collection_name] = EmbeddedCollection(
+                    self.path, collection_name, self.dimension, self.distance, self.named_vectors, self.indexed_fields
+                )
+            return collection
+
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return os.path.exists(os.path.join(self.path, f'{collection_name}.sqlite'))
+
+
+    def delete_collection(self, collection_name: str, **kwargs) -> bool:
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+            if collection is not None:
+                collection.close()
+            for file_path in _matrix_files(self.path, collection_name).values():
+                os.remove(file_path)
+            for suffix in ('.sqlite', '.sqlite-wal', '.sqlite-shm'):
+                file_path = os.path.join(self.path, collection_name + suffix)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+        return True
+
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema=None, **kwargs):
+        self._collection(collection_name).add_index(field_name)
+        return rest.UpdateResult(operation_id=0, status=rest.UpdateStatus.COMPLETED)
+
+
+    def upsert(self, collection_name: str, points: list, wait: bool = True, **kwargs):
+        if isinstance(points, rest.Batch):
+            raise NotImplementedError('The embedded vector store takes a list of PointStructs.')
+        self._collection(collection_name).upsert(points)
+        return rest.UpdateResult(operation_id=0, status=rest.UpdateStatus.COMPLETED)
+
+
+    def delete(self, collection_name: str, points_selector, wait: bool = True, **kwargs):
+        self._collection(collection_name).delete(points_selector)
+        return rest.UpdateResult(operation_id=0, status=rest.UpdateStatus.COMPLETED)
+
+
+    def count(self, collection_name: str, count_filter=None, exact: bool = True, **kwargs) -> rest.CountResult:
+        return rest.CountResult(count=self._collection(collection_name).count(count_filter))
+
+
+    def retrieve(self, collection_name: str, ids: list, with_payload=True, with_vectors=False, **kwargs) -> list:
+        return self._collection(collection_name).retrieve(ids, with_payload, with_vectors)
+
+
+    def scroll(self, collection_name: str, scroll_filter=None, limit: int = 10, offset=None,
+               with_payload=True, with_vectors=False, **kwargs) -> tuple:
+        return self._collection(collection_name).scroll(scroll_filter, limit, offset, with_payload, with_vectors)
+
+
+    def query_points(self, collection_name: str, query=None, using: str = None, prefetch=None, query_filter=None,
+                     limit: int = 10, offset: int = 0, score_threshold: float = None, with_payload=True,
+                     with_vectors=False, **kwargs) -> rest.QueryResponse:
+        points = self._collection(collection_name).query(
+            query, using, prefetch, query_filter, limit, offset, score_threshold, with_payload, with_vectors
+        )
+        return rest.QueryResponse(points=points)
+
+
+    def query_batch_points(self, collection_name: str, requests: list, **kwargs) -> list:
+        collection = self._collection(collection_name)
+        return [
+            rest.QueryResponse(points=collection.query(
+                request.query, request.using, request.prefetch, request.filter, request.limit, request.offset,
+                request.score_threshold, request.with_payload if request.with_payload is not None else False,
+                request.with_vector or False
+            ))
+            for request in requests
+        ]
+
+
+    def query_points_groups(self, *args, **kwargs):
+        raise NotImplementedError('The embedded vector store does not support grouped queries.')
+
+
+    def close(self, **kwargs):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
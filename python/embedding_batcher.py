@@ -0,0 +1,177 @@
+import bisect
+import threading
+import time
+from collections import deque
+from config import (
+    EMBEDDING_BATCH_MAX_SIZE,
+    EMBEDDING_BATCH_MAX_WAIT_MS
+)
+from instrumentation import span
+
+# Upper bounds of the batch-size histogram buckets; larger batches land in the last bucket
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+WAIT_TIME_SAMPLES = 1000  # Recent per-request wait times kept for the percentiles
+
+
+class _EmbeddingRequest:
+    def __init__(self, texts: list):
+        self.texts = texts
+        self.enqueued_at = time.perf_counter()
+        self.embeddings = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class EmbeddingBatcher:
+    """
+    Dynamic batcher in front of a FastEmbed embedding backend.
+
+    Callers use it like the backend itself: `embed(texts)` blocks until that
+    caller's vectors are ready. Behind the scenes a worker thread gathers the
+    requests that arrive within `max_wait_ms` of the first one, up to
+    `max_batch_size` texts, runs them through the model as one batch and hands
+    each caller its own slice of the results. Requests are never split, so a
+    single request larger than `max_batch_size` runs as its own batch.
+    """
+
+    def __init__(self, backend, name: str, max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+                 max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS):
+        """
+        :param backend: The FastEmbed backend that runs the model.
+        :param name: Name used in the metrics, e.g. 'dense' or 'sparse'.
+        :param max_batch_size: Maximum number of texts per model call.
+        :param max_wait_ms: How long to wait for more requests after the first one arrives.
+        """
+        self.backend = backend
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._worker = None
+
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.inference_seconds = 0.0
+        self._batch_size_counts = [0] * len(BATCH_SIZE_BUCKETS)
+        self._wait_times = deque(maxlen=WAIT_TIME_SAMPLES)
+
+
+    def embed(self, data: list, **kwargs) -> list:
+        """
+        Embeds the texts as part of the next batch.
+
+        :param data: Texts to embed.
+        :param kwargs: Ignored; accepted for compatibility with the backend's `embed`.
+        :return: One embedding per text, in the same order.
+        """
+        if not data:
+            return []
+
+        request = _EmbeddingRequest(list(data))
+        with self._condition:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f'embedding-batcher-{self.name}', daemon=True)
+                self._worker.start()
+            self._pending.append(request)
+            self._condition.notify_all()
+
+        # Timed on the caller's side, so the span includes the wait for the batch
+        with span(f'{self.name}_inference'):
+            request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.embeddings
+
+
+    def _take_batch(self) -> list:
+        """
+        Waits for a first request, then for more until the batch is full or the
+        wait window closes.
+        """
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+
+            deadline = self._pending[0].enqueued_at + self.max_wait_seconds
+            while sum(len(request.texts) for request in self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = [self._pending.popleft()]
+            batch_size = len(batch[0].texts)
+            while self._pending and batch_size + len(self._pending[0].texts) <= self.max_batch_size:
+                request = self._pending.popleft()
+                batch.append(request)
+                batch_size += len(request.texts)
+            return batch
+
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            started_at = time.perf_counter()
+            texts = [text for request in batch for text in request.texts]
+
+            try:
+                embeddings = self.backend.embed(texts, batch_size=len(texts), progress_bar=False)
+                error = None
+            except Exception as e:
+                embeddings = None
+                error = e
+            inference_seconds = time.perf_counter() - started_at
+
+            with self._condition:
+                self.requests += len(batch)
+                self.texts += len(texts)
+                self.batches += 1
+                self.inference_seconds += inference_seconds
+                bucket = min(bisect.bisect_left(BATCH_SIZE_BUCKETS, len(texts)), len(BATCH_SIZE_BUCKETS) - 1)
+                self._batch_size_counts[bucket] += 1
+                self._wait_times.extend(started_at - request.enqueued_at for request in batch)
+
+            # Hand each caller its own slice of the results
+            offset = 0
+            for request in batch:
+                if error is None:
+                    request.embeddings = embeddings[offset:offset + len(request.texts)]
+                else:
+                    request.error = error
+                offset += len(request.texts)
+                request.done.set()
+
+
+    def stats(self) -> dict:
+        """
+        :return: Dictionary with queue depth, batch-size histogram and wait times.
+        """
+        with self._condition:
+            wait_times = sorted(self._wait_times)
+            histogram = {
+                (f'<={bound}' if index < len(BATCH_SIZE_BUCKETS) - 1 else f'>{BATCH_SIZE_BUCKETS[-2]}'): count
+                for index, (bound, count) in enumerate(zip(BATCH_SIZE_BUCKETS, self._batch_size_counts))
+            }
+
+            def wait_percentile(fraction: float) -> float:
+                if not wait_times:
+                    return 0.0
+                return round(wait_times[min(len(wait_times) - 1, int(fraction * len(wait_times)))] * 1000, 3)
+
+            return {
+                'queue_depth': len(self._pending),
+                'queued_texts': sum(len(request.texts) for request in self._pending),
+                'requests': self.requests,
+                'texts': self.texts,
+                'batches': self.batches,
+                'average_batch_size': round(self.texts / self.batches, 3) if self.batches else 0.0,
+                'batch_size_histogram': histogram,
+                'wait_ms_p50': wait_percentile(0.50),
+                'wait_ms_p99': wait_percentile(0.99),
+                'wait_ms_max': round(wait_times[-1] * 1000, 3) if wait_times else 0.0,
+                'inference_seconds': round(self.inference_seconds, 3),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_seconds * 1000
+            }
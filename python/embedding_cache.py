@@ -0,0 +1,160 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from haystack.dataclasses.sparse_embedding import SparseEmbedding
+from config import (
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES
+)
+
+
+class EmbeddingCache:
+    """
+    Persistent least-recently-used cache of dense and sparse embeddings.
+
+    Entries are keyed by a hash of the model name and the plain text that was
+    embedded, so unchanged note content never has to go through the models again.
+    Vectors are stored as packed float32/int32 blobs in a small SQLite database.
+    """
+
+    def __init__(self, database_path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        """
+        Opens (or creates) the cache database.
+
+        :param database_path: Path to the SQLite file holding the cache.
+        :param max_entries: Maximum number of embeddings to keep before evicting the least recently used.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS embedding_cache ('
+            'key TEXT PRIMARY KEY, values_blob BLOB NOT NULL, indices_blob BLOB, last_used REAL NOT NULL)'
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS embedding_cache_last_used ON embedding_cache (last_used)'
+        )
+        self._connection.commit()
+
+
+    @staticmethod
+    def _make_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f'{model_name}\0{text}'.encode('utf-8')).hexdigest()
+
+
+    def _get(self, model_name: str, text: str):
+        key = self._make_key(model_name, text)
+
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT values_blob, indices_blob FROM embedding_cache WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._connection.execute(
+                'UPDATE embedding_cache SET last_used = ? WHERE key = ?', (time.time(), key)
+            )
+            self._connection.commit()
+            return row
+
+
+    def _put(self, model_name: str, text: str, values_blob: bytes, indices_blob: bytes = None):
+        key = self._make_key(model_name, text)
+
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO embedding_cache (key, values_blob, indices_blob, last_used) VALUES (?, ?, ?, ?)',
+                (key, values_blob, indices_blob, time.time())
+            )
+
+            # Evict the least recently used entries once the size cap is exceeded
+            entry_count = self._connection.execute('SELECT COUNT(*) FROM embedding_cache').fetchone()[0]
+            if entry_count > self.max_entries:
+                self._connection.execute(
+                    'DELETE FROM embedding_cache WHERE key IN '
+                    '(SELECT key FROM embedding_cache ORDER BY last_used ASC LIMIT ?)',
+                    (entry_count - self.max_entries,)
+                )
+            self._connection.commit()
+
+
+    def get_dense(self, model_name: str, text: str):
+        """
+        Looks up a cached dense embedding.
+
+        :param model_name: Name of the dense model that produced the embedding.
+        :param text: The exact text that was embedded.
+        :return: The embedding as a list of floats, or None on a cache miss.
+        """
+        row = self._get(model_name, text)
+        if row is None:
+            return None
+        return array('f', row[0]).tolist()
+
+
+    def put_dense(self, model_name: str, text: str, embedding: list):
+        """
+        Stores a dense embedding.
+
+        :param model_name: Name of the dense model that produced the embedding.
+        :param text: The exact text that was embedded.
+        :param embedding: The embedding as a list of floats.
+        """
+        self._put(model_name, text, array('f', embedding).tobytes())
+
+
+    def get_sparse(self, model_name: str, text: str):
+        """
+        Looks up a cached sparse embedding.
+
+        :param model_name: Name of the sparse model that produced the embedding.
+        :param text: The exact text that was embedded.
+        :return: The SparseEmbedding, or None on a cache miss.
+        """
+        row = self._get(model_name, text)
+        if row is None:
+            return None
+        return SparseEmbedding(indices=array('i', row[1]).tolist(), values=array('f', row[0]).tolist())
+
+
+    def put_sparse(self, model_name: str, text: str, sparse_embedding: SparseEmbedding):
+        """
+        Stores a sparse embedding.
+
+        :param model_name: Name of the sparse model that produced the embedding.
+        :param text: The exact text that was embedded.
+        :param sparse_embedding: The SparseEmbedding to store.
+        """
+        self._put(
+            model_name,
+            text,
+            array('f', sparse_embedding.values).tobytes(),
+            array('i', sparse_embedding.indices).tobytes()
+        )
+
+
+    def stats(self) -> dict:
+        """
+        Reports cache effectiveness.
+
+        :return: Dictionary with hit and miss counters, hit rate and current size.
+        """
+        with self._lock:
+            entry_count = self._connection.execute('SELECT COUNT(*) FROM embedding_cache').fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entry_count,
+            'max_entries': self.max_entries
+        }
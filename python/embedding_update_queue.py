@@ -0,0 +1,257 @@
+import threading
+import time
+from config import (
+    EMBEDDING_UPDATE_DEBOUNCE_SECONDS,
+    EMBEDDING_UPDATE_BATCH_SIZE
+)
+from inference_executor import run_inference_blocking
+
+
+class EmbeddingUpdateQueue:
+    """
+    Write-behind queue in front of `EmbeddingsManager.update_embeddings`.
+
+    Updates are coalesced per embeddings ID so only the latest content of a note
+    is embedded. A background thread flushes a note once it has gone
+    `debounce_seconds` without a newer update, batching ready notes together.
+
+    Notes discarded while their batch is being embedded are tombstoned; once the
+    batch is written, the worker deletes them again so a deleted note never
+    comes back in the store.
+
+    Updates for embeddings IDs that are not in the store are counted as
+    `not_found` rather than processed, with the last such ID in the status.
+    """
+
+    def __init__(self, embeddings_manager, debounce_seconds: float = EMBEDDING_UPDATE_DEBOUNCE_SECONDS,
+                 max_batch_size: int = EMBEDDING_UPDATE_BATCH_SIZE):
+        """
+        :param embeddings_manager: The EmbeddingsManager that performs the updates.
+        :param debounce_seconds: How long a note must be left untouched before it is embedded.
+        :param max_batch_size: Maximum number of notes embedded per flush.
+        """
+        self.embeddings_manager = embeddings_manager
+        self.debounce_seconds = debounce_seconds
+        self.max_batch_size = max_batch_size
+
+        self._pending = {}  # embeddings ID -> (latest content, time of latest update)
+        self._in_flight_ids = set()  # embeddings IDs of the batch being embedded
+        self._discarded_in_flight_ids = set()  # of those, the ones discarded since the batch started
+        self._flush_waiters = 0
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._worker = None
+
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.not_found = 0
+        self.last_error = None
+        self.last_not_found_id = None
+
+
+    def start(self):
+        """
+        Starts the background worker thread.
+        """
+        with self._condition:
+            if self._worker is not None:
+                return
+            self._stopping = False
+            self._worker = threading.Thread(target=self._run, name='embedding-update-queue', daemon=True)
+            self._worker.start()
+
+
+    def stop(self):
+        """
+        Embeds everything still queued, then stops the background worker.
+        """
+        with self._condition:
+            if self._worker is None:
+                return
+            self._stopping = True
+            self._condition.notify_all()
+            worker = self._worker
+
+        worker.join()
+
+        with self._condition:
+            self._worker = None
+
+
+    def submit(self, document_id: str, new_content: str):
+        """
+        Queues an update, replacing any queued content for the same document.
+
+        :param document_id: The embeddings ID of the note.
+        :param new_content: The latest Markdown content of the note.
+        """
+        with self._condition:
+            self._pending[document_id] = (new_content, time.monotonic())
+            self.submitted += 1
+            self._condition.notify_all()
+
+
+    def discard(self, document_id: str):
+        """
+        Drops a queued update, e.g. because the note is being deleted.
+
+        If the note is in the batch being embedded right now, its write can no
+        longer be stopped, so it is tombstoned and deleted again after the batch.
+
+        :param document_id: The embeddings ID of the note.
+        """
+        with self._condition:
+            self._pending.pop(document_id, None)
+            if document_id in self._in_flight_ids:
+                self._discarded_in_flight_ids.add(document_id)
+            self._condition.notify_all()
+
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Embeds every queued update without waiting for the debounce interval and
+        blocks until the queue has drained.
+
+        :param timeout: Maximum number of seconds to wait, or None to wait indefinitely.
+        :return: True if the queue drained, False on timeout.
+        """
+        with self._condition:
+            worker_running = self._worker is not None
+
+        # Without a worker thread, drain the queue on the calling thread
+        if not worker_running:
+            while True:
+                with self._condition:
+                    self._flush_waiters += 1
+                    batch = self._take_ready_batch()
+                    self._flush_waiters -= 1
+                    if not batch:
+                        return True
+                    self._in_flight_ids = set(batch)
+                self._process_batch(batch)
+
+        with self._condition:
+            self._flush_waiters += 1
+            self._condition.notify_all()
+            drained = self._condition.wait_for(
+                lambda: not self._pending and not self._in_flight_ids, timeout
+            )
+            self._flush_waiters -= 1
+            return drained
+
+
+    def status(self) -> dict:
+        """
+        Reports the state of the queue.
+
+        :return: Dictionary with queue depth and counters.
+        """
+        with self._condition:
+            return {
+                'pending': len(self._pending),
+                'in_flight': len(self._in_flight_ids),
+                'submitted': self.submitted,
+                'processed': self.processed,
+                'failed': self.failed,
+                'not_found': self.not_found,
+                'last_error': self.last_error,
+                'last_not_found_id': self.last_not_found_id,
+                'debounce_seconds': self.debounce_seconds,
+                'running': self._worker is not None
+            }
+
+
+    def _take_ready_batch(self) -> dict:
+        """
+        Removes and returns up to `max_batch_size` updates that are due. Must be
+        called with the condition held.
+        """
+        flush_everything = self._flush_waiters > 0 or self._stopping
+        now = time.monotonic()
+
+        batch = {}
+        for document_id, (new_content, updated_at) in self._pending.items():
+            if flush_everything or now - updated_at >= self.debounce_seconds:
+                batch[document_id] = new_content
+                if len(batch) == self.max_batch_size:
+                    break
+
+        for document_id in batch:
+            del self._pending[document_id]
+        return batch
+
+
+    def _seconds_until_next_due(self):
+        """
+        Returns how long until the oldest queued update is due, or None if the
+        queue is empty. Must be called with the condition held.
+        """
+        if not self._pending:
+            return None
+        oldest_update = min(updated_at for _, updated_at in self._pending.values())
+        return max(0.0, oldest_update + self.debounce_seconds - time.monotonic())
+
+
+    def _run(self):
+        """
+        Worker loop: wait for due updates and hand them to the embeddings manager in batches.
+        """
+        while True:
+            with self._condition:
+                batch = self._take_ready_batch()
+                while not batch:
+                    if self._stopping and not self._pending:
+                        return
+                    self._condition.wait(timeout=self._seconds_until_next_due())
+                    batch = self._take_ready_batch()
+                self._in_flight_ids = set(batch)
+
+            self._process_batch(batch)
+
+
+    def _process_batch(self, batch: dict):
+        """
+        Embeds one batch of updates, deletes the notes discarded meanwhile and
+        records the outcome.
+        """
+        try:
+            # Inference runs on the shared, bounded executor rather than this thread
+            updated_documents = run_inference_blocking(self.embeddings_manager.update_embeddings, batch)
+            # update_embeddings leaves out IDs that are not in the store
+            missing_ids = [document_id for document_id in batch if document_id not in updated_documents]
+            with self._condition:
+                self.processed += len(batch) - len(missing_ids)
+                self.not_found += len(missing_ids)
+                if missing_ids:
+                    self.last_not_found_id = missing_ids[-1]
+        except Exception as e:
+            with self._condition:
+                self.failed += len(batch)
+                self.last_error = str(e)
+        finally:
+            self._delete_discarded_in_flight()
+            with self._condition:
+                self._in_flight_ids = set()
+                self._condition.notify_all()
+
+
+    def _delete_discarded_in_flight(self):
+        """
+        Deletes the notes of the current batch that were discarded while it was
+        being embedded, undoing the batch's write for them.
+        """
+        while True:
+            with self._condition:
+                discarded_ids, self._discarded_in_flight_ids = self._discarded_in_flight_ids, set()
+                if not discarded_ids:
+                    # Later discards of these IDs no longer race with this batch
+                    self._in_flight_ids = set()
+                    return
+
+            for document_id in discarded_ids:
+                try:
+                    self.embeddings_manager.delete_embedding(document_id)
+                except Exception as e:
+                    with self._condition:
+                        self.last_error = str(e)
@@ -1,17 +1,23 @@
+import asyncio
+from dataclasses import replace
 from haystack.components.writers import DocumentWriter
-from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
 from haystack.document_stores.types import DuplicatePolicy
-from haystack_integrations.components.embedders.fastembed import (
-    FastembedTextEmbedder,
-    FastembedSparseTextEmbedder
+from model_registry import (
+    get_document_store,
+    dense_document_embedder,
+    sparse_document_embedder
 )
-from config import (
-    QDRANT_CONFIG,
-    FASTEMBED_DENSE_MODEL,
-    FASTEMBED_SPARSE_MODEL,
-    FASTEMBED_CACHE_DIRECTORY
+from config import QDRANT_USE_ASYNC_CLIENT
+from note_chunks import (
+    chunk_hash_of,
+    chunk_notes,
+    delete_note_chunks,
+    delete_note_chunks_async,
+    fetch_note_chunks
 )
-from markdown_to_plain import strip_markdown
+from embedding_cache import EmbeddingCache
+from folder_centroid_index import get_folder_centroid_index
+from retrieval_cache import bump_collection_version
 
 
 class EmbeddingsManager:
@@ -24,16 +30,14 @@ class EmbeddingsManager:
         """
             Initializes the embeddings manager with document store and embedding models.
         """
-        self.qdrant_document_store = QdrantDocumentStore(**QDRANT_CONFIG)
-        self.sparse_text_embedder = FastembedSparseTextEmbedder(
-            model=FASTEMBED_SPARSE_MODEL, cache_dir=FASTEMBED_CACHE_DIRECTORY
-        )
-        self.dense_text_embedder = FastembedTextEmbedder(
-            model=FASTEMBED_DENSE_MODEL, cache_dir=FASTEMBED_CACHE_DIRECTORY
-        )
+        self.qdrant_document_store = get_document_store()
+        self.sparse_document_embedder = sparse_document_embedder(progress_bar=False)
+        self.dense_document_embedder = dense_document_embedder(progress_bar=False)
         self.document_writer = DocumentWriter(
             document_store=self.qdrant_document_store, policy=DuplicatePolicy.OVERWRITE
         )
+        self.embedding_cache = EmbeddingCache()
+        self.folder_centroid_index = get_folder_centroid_index()
     
 
     def update_embedding(self, document_id: str, new_content: str):
@@ -46,34 +50,142 @@ class EmbeddingsManager:
 
         :return: The updated document.
         """
-        # Retrieve the document
-        documents = self.qdrant_document_store.get_documents_by_id([document_id])
-        if not documents:
+        updated_documents = self.update_embeddings({document_id: new_content})
+        if document_id not in updated_documents:
             raise ValueError(f"Document with ID {document_id} not found.")
-        
-        document = documents[0]
-        document.content = strip_markdown(new_content)
-        
-        # Compute new embeddings
-        self.dense_text_embedder.warm_up()
-        document.embedding = self.dense_text_embedder.run(document.content)['embedding']
-        
-        self.sparse_text_embedder.warm_up()
-        document.sparse_embedding = self.sparse_text_embedder.run(document.content)['sparse_embedding']
-        
-        # Write updated document back to the store
-        self.document_writer.run([document])
-        
-        return document
+
+        return updated_documents[document_id]
+
+
+    def update_embeddings(self, new_contents_by_id: dict, reuse_unchanged_chunks: bool = True) -> dict:
+        """
+            Updates the embeddings for many documents with one Qdrant read, one batch
+            of inference per model and one Qdrant write.
+
+            Each note is split into chunks (see note_chunks.py). Only chunks whose text
+            changed go through the models; unchanged chunks keep their stored vectors,
+            and chunks the note no longer has are deleted.
+
+        :param new_contents_by_id: Dictionary mapping document IDs to their new text content.
+        :param reuse_unchanged_chunks: Whether stored vectors of unchanged chunks may be kept.
+                                       Disable after changing the embedding models.
+
+        :return: Dictionary mapping each document ID found in the store to its updated first chunk.
+                 IDs that are not in the store are left out.
+        """
+        # Retrieve the stored chunks of every note
+        stored_chunks_by_id = fetch_note_chunks(self.qdrant_document_store, list(new_contents_by_id))
+
+        chunks_by_id = dict(zip(stored_chunks_by_id, chunk_notes([
+            (document_id, new_contents_by_id[document_id], None) for document_id in stored_chunks_by_id
+        ])))
+
+        chunks_to_embed = []
+        chunks_to_write = []
+        stale_chunk_ids = []
+        updated_documents = {}
+        for document_id, stored_chunks in stored_chunks_by_id.items():
+            chunks = chunks_by_id[document_id]
+            stored_by_id = {chunk.id: chunk for chunk in stored_chunks}
+            stored_by_hash = {
+                chunk_hash_of(chunk): chunk
+                for chunk in stored_chunks
+                if chunk.embedding is not None and chunk.sparse_embedding is not None
+            } if reuse_unchanged_chunks else {}
+
+            for chunk_index, chunk in enumerate(chunks):
+                stored_chunk = stored_by_hash.get(chunk.meta['chunk_hash'])
+                if stored_chunk is None:
+                    chunks_to_embed.append(chunk)
+                    chunks_to_write.append(chunk)
+                    continue
+
+                chunk = chunks[chunk_index] = replace(
+                    chunk, embedding=stored_chunk.embedding, sparse_embedding=stored_chunk.sparse_embedding
+                )
+                # Nothing to write if the same chunk is already stored in the same place
+                if stored_by_id.get(chunk.id) is not stored_chunk or stored_chunk.meta != chunk.meta:
+                    chunks_to_write.append(chunk)
+
+            chunk_ids = {chunk.id for chunk in chunks}
+            stale_chunk_ids.extend(chunk.id for chunk in stored_chunks if chunk.id not in chunk_ids)
+            updated_documents[document_id] = chunks[0]
+
+        if chunks_to_embed:
+            # Compute new embeddings (models are loaded once at startup, see model_registry.load_models)
+            self._embed_documents(chunks_to_embed)
+
+        if chunks_to_write or stale_chunk_ids:
+            # Write updated chunks back to the store and drop the ones the notes no longer have
+            if chunks_to_write:
+                self.document_writer.run(chunks_to_write)
+            if stale_chunk_ids:
+                self.qdrant_document_store.delete_documents(stale_chunk_ids)
+            bump_collection_version()
+
+            for chunk in chunks_to_write:
+                if chunk.meta['chunk_index'] == 0:
+                    self.folder_centroid_index.note_embedded(chunk.id, chunk.embedding)
+
+        return updated_documents
+
+
+    def _embed_documents(self, documents: list):
+        """
+            Fills in dense and sparse embeddings, reusing cached vectors for text seen
+            before and running each model once over the remaining documents.
+        """
+        dense_model_name = self.dense_document_embedder.model_name
+        sparse_model_name = self.sparse_document_embedder.model_name
+
+        dense_misses = []
+        sparse_misses = []
+        for document in documents:
+            document.embedding = self.embedding_cache.get_dense(dense_model_name, document.content)
+            if document.embedding is None:
+                dense_misses.append(document)
+
+            document.sparse_embedding = self.embedding_cache.get_sparse(sparse_model_name, document.content)
+            if document.sparse_embedding is None:
+                sparse_misses.append(document)
+
+        if dense_misses:
+            embedded_documents = self.dense_document_embedder.run(dense_misses)['documents']
+            for document, embedded_document in zip(dense_misses, embedded_documents):
+                document.embedding = embedded_document.embedding
+                self.embedding_cache.put_dense(dense_model_name, document.content, document.embedding)
+
+        if sparse_misses:
+            embedded_documents = self.sparse_document_embedder.run(sparse_misses)['documents']
+            for document, embedded_document in zip(sparse_misses, embedded_documents):
+                document.sparse_embedding = embedded_document.sparse_embedding
+                self.embedding_cache.put_sparse(sparse_model_name, document.content, document.sparse_embedding)
 
 
     def delete_embedding(self, document_id: str):
         """
-            Deletes the embedding of a given document ID from the document store.
+            Deletes the embedding of a given document ID, with all of its chunks, from the document store.
         
         :param document_id: The unique identifier of the document to be deleted.
         """
-        self.qdrant_document_store.delete_documents([document_id])
+        delete_note_chunks(self.qdrant_document_store, [document_id])
+        bump_collection_version()
+        self.folder_centroid_index.note_deleted(document_id)
+        print(f"Deleted document with ID: {document_id}")
+
+
+    async def delete_embedding_async(self, document_id: str):
+        """
+            Deletes the embedding of a given document ID with the asynchronous Qdrant client.
+
+        :param document_id: The unique identifier of the document to be deleted.
+        """
+        if not QDRANT_USE_ASYNC_CLIENT:
+            return await asyncio.to_thread(self.delete_embedding, document_id)
+
+        await delete_note_chunks_async(self.qdrant_document_store, [document_id])
+        bump_collection_version()
+        self.folder_centroid_index.note_deleted(document_id)
         print(f"Deleted document with ID: {document_id}")
 
 
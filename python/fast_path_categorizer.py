@@ -0,0 +1,92 @@
+from collections import defaultdict
+from config import (
+    CATEGORIZATION_FAST_PATH_TOP_K,
+    CATEGORIZATION_FAST_PATH_MIN_NEIGHBOURS,
+    CATEGORIZATION_FAST_PATH_MIN_AGREEMENT
+)
+from database_utils import fetch_folder_names_by_embeddings_ids
+
+
+class FastPathCategorizer:
+    """
+    Suggests a folder for a note from the folders of its nearest neighbours in Qdrant.
+
+    If enough of the neighbours agree on one folder, the note can be moved
+    there without asking the LLM. Otherwise the neighbours are returned as
+    search results for the semantic-search prompt.
+    """
+
+    def __init__(self, retriever, top_k: int = CATEGORIZATION_FAST_PATH_TOP_K,
+                 min_neighbours: int = CATEGORIZATION_FAST_PATH_MIN_NEIGHBOURS,
+                 min_agreement: float = CATEGORIZATION_FAST_PATH_MIN_AGREEMENT):
+        """
+        :param retriever: HybridRetrieverPipeline used to look up neighbours.
+        :param top_k: Number of neighbours to retrieve per note.
+        :param min_neighbours: Minimum number of neighbours already in a folder before voting.
+        :param min_agreement: Minimum share of the neighbours' total score the winning folder must hold.
+        """
+        self.retriever = retriever
+        self.top_k = top_k
+        self.min_neighbours = min_neighbours
+        self.min_agreement = min_agreement
+
+
+    def find_neighbours(self, note: dict) -> list:
+        """
+        Retrieves the note's nearest neighbours that already sit in a folder.
+
+        :param note: The note row, with its 'embeddingsId'.
+        :return: List of neighbour Documents with `meta['folder']` set, best match first.
+        """
+        embeddings_id = note.get('embeddingsId')
+        if not embeddings_id:
+            return []
+
+        try:
+            neighbours = self.retriever.retrieve_similar_documents(embeddings_id, top_k=self.top_k)
+        except ValueError:
+            return []
+
+        folder_names = fetch_folder_names_by_embeddings_ids([neighbour.id for neighbour in neighbours])
+
+        assigned_neighbours = []
+        for neighbour in neighbours:
+            if neighbour.id in folder_names:
+                neighbour.meta['folder'] = folder_names[neighbour.id]
+                assigned_neighbours.append(neighbour)
+        return assigned_neighbours
+
+
+    def vote(self, neighbours: list):
+        """
+        Picks the folder holding the largest share of the neighbours' scores.
+
+        :param neighbours: Neighbour Documents with `meta['folder']` set.
+        :return: The winning folder name if it passes the thresholds, otherwise None.
+        """
+        if len(neighbours) < self.min_neighbours:
+            return None
+
+        score_by_folder = defaultdict(float)
+        for neighbour in neighbours:
+            score_by_folder[neighbour.meta['folder']] += neighbour.score or 0.0
+
+        total_score = sum(score_by_folder.values())
+        if total_score <= 0:
+            return None
+
+        folder_name, folder_score = max(score_by_folder.items(), key=lambda item: item[1])
+        if folder_score / total_score < self.min_agreement:
+            return None
+        return folder_name
+
+
+    def suggest(self, note: dict) -> tuple:
+        """
+        Looks up the note's neighbours and votes on a folder.
+
+        :param note: The note row, with its 'embeddingsId'.
+        :return: Tuple of (folder name or None, neighbour Documents for the prompt).
+        """
+        neighbours = self.find_neighbours(note)
+        return self.vote(neighbours), neighbours
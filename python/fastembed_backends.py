@@ -0,0 +1,40 @@
+"""
+Loads FastEmbed embedding backends through fastembed-haystack's backend factories.
+
+The factories are private to fastembed-haystack, so this is the only module
+that imports them; an upstream rename only needs a fix here.
+"""
+from haystack_integrations.components.embedders.fastembed.embedding_backend.fastembed_backend import (
+    _FastembedEmbeddingBackendFactory,
+    _FastembedSparseEmbeddingBackendFactory
+)
+
+
+def load_dense_backend(model_name: str, cache_dir: str = None, threads: int = None):
+    """
+    :return: The dense backend for the model, shared with every FastEmbed component using the same settings.
+    """
+    return _FastembedEmbeddingBackendFactory.get_embedding_backend(
+        model_name=model_name,
+        cache_dir=cache_dir,
+        threads=threads
+    )
+
+
+def load_sparse_backend(model_name: str, cache_dir: str = None, threads: int = None):
+    """
+    :return: The sparse backend for the model, shared with every FastEmbed component using the same settings.
+    """
+    return _FastembedSparseEmbeddingBackendFactory.get_embedding_backend(
+        model_name=model_name,
+        cache_dir=cache_dir,
+        threads=threads
+    )
+
+
+def clear_backends():
+    """
+    Forgets every loaded backend, so the next load builds a new copy of its model.
+    """
+    _FastembedEmbeddingBackendFactory._instances.clear()
+    _FastembedSparseEmbeddingBackendFactory._instances.clear()
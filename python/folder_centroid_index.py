@@ -0,0 +1,287 @@
+import threading
+import time
+import numpy as np
+from config import (
+    DATABASE_TABLE_WITH_FOLDERS,
+    FOLDER_CENTROID_RECONCILE_SECONDS
+)
+from database_utils import (
+    add_note_move_listener,
+    fetch_embeddings_id,
+    fetch_note_folder_memberships,
+    iter_rows
+)
+from model_registry import get_document_store
+
+UNASSIGNED_FOLDER_ID = 'unassigned'
+VECTOR_FETCH_BATCH_SIZE = 256  # Documents read from Qdrant per request while building the index
+
+
+class FolderCentroidIndex:
+    """
+    In-memory index of one dense centroid vector per folder.
+
+    Each folder's centroid is the normalized mean of its notes' dense embeddings,
+    kept as one row of a matrix so ranking every folder for a note is a single
+    matrix-vector product. The index keeps each note's unit-length vector so it
+    can be updated incrementally when a note is re-embedded, deleted or moved,
+    and periodically reconciles folder membership with the notes database for
+    changes made outside this service (e.g. the frontend moving a note).
+    """
+
+    def __init__(self, document_store, reconcile_seconds: float = FOLDER_CENTROID_RECONCILE_SECONDS):
+        """
+        :param document_store: The Qdrant document store holding the note embeddings.
+        :param reconcile_seconds: Minimum time between membership checks against the notes database.
+        """
+        self.document_store = document_store
+        self.reconcile_seconds = reconcile_seconds
+        self._lock = threading.RLock()
+        self._built = False
+        self._last_reconciled = 0.0
+
+        self._note_vectors = {}  # embeddings ID -> unit-length float32 vector
+        self._note_folders = {}  # embeddings ID -> folder ID, None when unassigned
+        self._folder_names = {}  # folder ID -> folder name
+        self._folder_ids = []  # matrix row -> folder ID
+        self._folder_rows = {}  # folder ID -> matrix row
+        self._sums = None  # folders x dim, float64 running sums of note vectors
+        self._counts = None  # notes per folder
+        self._centroids = None  # folders x dim, float32 unit-length centroids
+
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+    def _fetch_vectors(self, embeddings_ids: list) -> dict:
+        """
+        Reads dense embeddings from Qdrant in batches.
+
+        :return: Dictionary mapping embeddings ID to unit-length vector.
+        """
+        vectors = {}
+        for start in range(0, len(embeddings_ids), VECTOR_FETCH_BATCH_SIZE):
+            documents = self.document_store.get_documents_by_id(embeddings_ids[start:start + VECTOR_FETCH_BATCH_SIZE])
+            for document in documents:
+                if document.embedding is not None:
+                    vectors[document.id] = self._normalize(document.embedding)
+        return vectors
+
+
+    def _row_for_folder(self, folder_id: str) -> int:
+        """
+        Returns the matrix row of a folder, appending a row for a new folder.
+        """
+        row = self._folder_rows.get(folder_id)
+        if row is not None:
+            return row
+
+        dimension = self._sums.shape[1]
+        row = len(self._folder_ids)
+        self._folder_ids.append(folder_id)
+        self._folder_rows[folder_id] = row
+        self._sums = np.vstack([self._sums, np.zeros((1, dimension), dtype=np.float64)])
+        self._counts = np.append(self._counts, 0)
+        self._centroids = np.vstack([self._centroids, np.zeros((1, dimension), dtype=np.float32)])
+        return row
+
+
+    def _refresh_row(self, row: int):
+        if self._counts[row] > 0:
+            self._centroids[row] = self._normalize(self._sums[row] / self._counts[row])
+        else:
+            self._centroids[row] = 0.0
+
+
+    def _set_note(self, embeddings_id: str, folder_id, vector):
+        """
+        Records a note's folder and vector, moving its contribution between centroids.
+        """
+        if folder_id == UNASSIGNED_FOLDER_ID:
+            folder_id = None
+
+        if self._sums is None:
+            if vector is None:
+                return
+            dimension = len(vector)
+            self._sums = np.zeros((0, dimension), dtype=np.float64)
+            self._counts = np.zeros(0, dtype=np.int64)
+            self._centroids = np.zeros((0, dimension), dtype=np.float32)
+
+        old_folder_id = self._note_folders.get(embeddings_id)
+        old_vector = self._note_vectors.get(embeddings_id)
+
+        if old_folder_id is not None and old_vector is not None:
+            row = self._folder_rows[old_folder_id]
+            self._sums[row] -= old_vector
+            self._counts[row] -= 1
+            self._refresh_row(row)
+
+        if vector is not None:
+            self._note_vectors[embeddings_id] = vector
+        self._note_folders[embeddings_id] = folder_id
+        new_vector = self._note_vectors.get(embeddings_id)
+
+        if folder_id is not None and new_vector is not None:
+            row = self._row_for_folder(folder_id)
+            self._sums[row] += new_vector
+            self._counts[row] += 1
+            self._refresh_row(row)
+
+
+    def _remove_note(self, embeddings_id: str):
+        self._set_note(embeddings_id, None, None)
+        self._note_vectors.pop(embeddings_id, None)
+        self._note_folders.pop(embeddings_id, None)
+
+
+    def _refresh_folder_names(self):
+        folders = iter_rows(DATABASE_TABLE_WITH_FOLDERS, columns=['id', 'name'])
+        self._folder_names = {folder['id']: folder['name'] for folder in folders}
+
+
+    def reconcile(self):
+        """
+        Brings folder membership in line with the notes database, fetching vectors
+        only for notes the index has not seen. The first call builds the index.
+        """
+        memberships = dict(fetch_note_folder_memberships())
+
+        with self._lock:
+            self._refresh_folder_names()
+
+            removed_ids = [embeddings_id for embeddings_id in self._note_folders if embeddings_id not in memberships]
+            for embeddings_id in removed_ids:
+                self._remove_note(embeddings_id)
+
+            unseen_ids = [embeddings_id for embeddings_id in memberships if embeddings_id not in self._note_vectors]
+
+        # Read missing vectors without holding the lock
+        vectors = self._fetch_vectors(unseen_ids)
+
+        with self._lock:
+            for embeddings_id, folder_id in memberships.items():
+                if embeddings_id in vectors:
+                    self._set_note(embeddings_id, folder_id, vectors[embeddings_id])
+                elif embeddings_id in self._note_vectors:
+                    current_folder_id = self._note_folders.get(embeddings_id)
+                    if current_folder_id != (None if folder_id == UNASSIGNED_FOLDER_ID else folder_id):
+                        self._set_note(embeddings_id, folder_id, None)
+
+            self._built = True
+            self._last_reconciled = time.monotonic()
+
+
+    def _reconcile_if_stale(self):
+        if not self._built or time.monotonic() - self._last_reconciled >= self.reconcile_seconds:
+            self.reconcile()
+
+
+    def note_embedded(self, embeddings_id: str, embedding):
+        """
+        Updates a note's vector after it was (re-)embedded.
+
+        :param embeddings_id: The note's embeddings ID.
+        :param embedding: The new dense embedding.
+        """
+        if not self._built or embedding is None:
+            return
+        with self._lock:
+            self._set_note(embeddings_id, self._note_folders.get(embeddings_id), self._normalize(embedding))
+
+
+    def note_deleted(self, embeddings_id: str):
+        """
+        Removes a note whose embeddings were deleted.
+
+        :param embeddings_id: The note's embeddings ID.
+        """
+        if not self._built:
+            return
+        with self._lock:
+            self._remove_note(embeddings_id)
+
+
+    def note_moved(self, note_ID: str, folder_id: str):
+        """
+        Moves a note between centroids; registered as a move_note_to_folder listener.
+
+        :param note_ID: The note's ID in the notes database.
+        :param folder_id: ID of the folder the note now belongs to.
+        """
+        if not self._built:
+            return
+        embeddings_id = fetch_embeddings_id(note_ID)
+        if embeddings_id is None:
+            return
+        with self._lock:
+            if folder_id not in self._folder_names:
+                self._refresh_folder_names()
+            self._set_note(embeddings_id, folder_id, None)
+
+
+    def suggest(self, embeddings_id: str, top_k: int = 3) -> list:
+        """
+        Ranks folders by cosine similarity between their centroid and the note's embedding.
+
+        :param embeddings_id: The note's embeddings ID.
+        :param top_k: Number of folders to return.
+        :return: List of dictionaries with 'folder_id', 'folder_name' and 'score', best first.
+        """
+        self._reconcile_if_stale()
+
+        with self._lock:
+            vector = self._note_vectors.get(embeddings_id)
+
+        if vector is None:
+            vector = self._fetch_vectors([embeddings_id]).get(embeddings_id)
+            if vector is None:
+                raise ValueError(f"Document with ID '{embeddings_id}' not found.")
+
+        with self._lock:
+            if self._centroids is None or not len(self._folder_ids):
+                return []
+
+            scores = self._centroids @ vector
+            scores[self._counts == 0] = -np.inf
+
+            candidate_count = min(top_k, int(np.count_nonzero(self._counts)))
+            if candidate_count <= 0:
+                return []
+
+            # Partial sort: only the top_k rows need ordering
+            top_rows = np.argpartition(-scores, candidate_count - 1)[:candidate_count]
+            top_rows = top_rows[np.argsort(-scores[top_rows])]
+
+            return [
+                {
+                    'folder_id': self._folder_ids[row],
+                    'folder_name': self._folder_names.get(self._folder_ids[row]),
+                    'score': float(scores[row])
+                }
+                for row in top_rows
+            ]
+
+
+_folder_centroid_index = None
+_folder_centroid_index_lock = threading.Lock()
+
+
+def get_folder_centroid_index() -> FolderCentroidIndex:
+    """
+    Returns the process-wide folder centroid index, creating it on first use.
+    The index is built lazily on its first suggestion.
+
+    :return: The shared FolderCentroidIndex instance.
+    """
+    global _folder_centroid_index
+
+    with _folder_centroid_index_lock:
+        if _folder_centroid_index is None:
+            _folder_centroid_index = FolderCentroidIndex(get_document_store())
+            add_note_move_listener(_folder_centroid_index.note_moved)
+        return _folder_centroid_index
@@ -0,0 +1,306 @@
+"""
+Client-side hybrid search: the dense and sparse searches run separately and are fused here.
+
+With RETRIEVAL_FUSION_MODE = 'client', HybridRetrieverPipeline uses
+ClientHybridRetriever instead of Qdrant's built-in fusion. For each query it
+
+  1. runs the dense and sparse searches in parallel, each with its own
+     candidate limit (RETRIEVAL_DENSE_CANDIDATES, RETRIEVAL_SPARSE_CANDIDATES),
+  2. fuses the two rankings with weighted Reciprocal Rank Fusion or a
+     weighted sum of min-max normalized scores (RETRIEVAL_FUSION_METHOD),
+  3. optionally keeps only each note's best chunk, so the candidates are
+     distinct notes (RETRIEVAL_DEDUPLICATE_BY_PARENT),
+  4. optionally reranks the top RETRIEVAL_RERANK_TOP_N candidates of a text
+     query with a CPU cross-encoder (RETRIEVAL_RERANKER_MODEL).
+
+Every stage is timed as its own span ('retrieval_dense_search',
+'retrieval_sparse_search', 'retrieval_fusion', 'retrieval_rerank'), so it
+shows up in /metrics and the Server-Timing header. `run` also returns the
+stage timings of the call.
+"""
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import replace
+from haystack import Document, component
+from haystack.dataclasses import SparseEmbedding
+from haystack_integrations.document_stores.qdrant.converters import (
+    DENSE_VECTORS_NAME,
+    SPARSE_VECTORS_NAME,
+    convert_qdrant_point_to_haystack_document
+)
+from qdrant_client.http import models as rest
+from config import (
+    QDRANT_TOP_K_RESULTS,
+    CHUNK_CANDIDATE_MULTIPLIER,
+    RETRIEVAL_DENSE_CANDIDATES,
+    RETRIEVAL_SPARSE_CANDIDATES,
+    RETRIEVAL_FUSION_METHOD,
+    RETRIEVAL_RRF_K,
+    RETRIEVAL_DENSE_WEIGHT,
+    RETRIEVAL_SPARSE_WEIGHT,
+    RETRIEVAL_DEDUPLICATE_BY_PARENT,
+    RETRIEVAL_RERANK_TOP_N
+)
+from instrumentation import span
+from note_chunks import parent_id_of
+
+FUSION_METHODS = ('rrf', 'weighted')
+
+# Runs the dense search while the calling thread runs the sparse one
+SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='hybrid-search')
+
+
+def reciprocal_rank_fusion(rankings: list, weights: list, rrf_k: int = RETRIEVAL_RRF_K) -> list:
+    """
+    Scores each document with the sum of weight / (rrf_k + rank) over the rankings it appears in.
+
+    :param rankings: Lists of Documents, best first.
+    :param weights: Weight of each ranking.
+    :return: The fused Documents, carrying their fused score, best first.
+    """
+    documents = {}
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, document in enumerate(ranking, 1):
+            documents.setdefault(document.id, document)
+            scores[document.id] = scores.get(document.id, 0.0) + weight / (rrf_k + rank)
+    return _ranked(documents, scores)
+
+
+def weighted_score_fusion(rankings: list, weights: list) -> list:
+    """
+    Scores each document with the weighted sum of its scores, each ranking's scores
+    min-max normalized to [0, 1] first. A document missing from a ranking gets 0 there.
+
+    :param rankings: Lists of Documents, best first.
+    :param weights: Weight of each ranking.
+    :return: The fused Documents, carrying their fused score, best first.
+    """
+    documents = {}
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        if not ranking:
+            continue
+        ranking_scores = [document.score or 0.0 for document in ranking]
+        lowest, highest = min(ranking_scores), max(ranking_scores)
+        for document, score in zip(ranking, ranking_scores):
+            normalized = (score - lowest) / (highest - lowest) if highest > lowest else 1.0
+            documents.setdefault(document.id, document)
+            scores[document.id] = scores.get(document.id, 0.0) + weight * normalized
+    return _ranked(documents, scores)
+
+
+def _ranked(documents: dict, scores: dict) -> list:
+    fused = [replace(document, score=scores[document_id]) for document_id, document in documents.items()]
+    fused.sort(key=lambda document: document.score, reverse=True)
+    return fused
+
+
+def best_chunk_per_parent(documents: list) -> list:
+    """
+    :param documents: Chunk Documents, best first.
+    :return: The first (best) chunk of each note, in the same order.
+    """
+    seen_parents = set()
+    best_chunks = []
+    for document in documents:
+        parent_id = parent_id_of(document)
+        if parent_id not in seen_parents:
+            seen_parents.add(parent_id)
+            best_chunks.append(document)
+    return best_chunks
+
+
+@contextmanager
+def _stage(timings: dict, name: str):
+    """
+    Times a retrieval stage as the span 'retrieval_<name>' and stores its duration in `timings`.
+    """
+    start_time = time.perf_counter()
+    with span(f'retrieval_{name}'):
+        yield
+    timings[name] = time.perf_counter() - start_time
+
+
+@component
+class ClientHybridRetriever:
+    """
+    Hybrid retriever fusing separate dense and sparse searches on the client, see the module docstring.
+    Takes the same inputs as QdrantHybridRetriever, plus the query text for reranking.
+    """
+
+    def __init__(self, document_store, top_k: int = QDRANT_TOP_K_RESULTS * CHUNK_CANDIDATE_MULTIPLIER,
+                 dense_candidates: int = RETRIEVAL_DENSE_CANDIDATES,
+                 sparse_candidates: int = RETRIEVAL_SPARSE_CANDIDATES,
+                 fusion_method: str = RETRIEVAL_FUSION_METHOD, rrf_k: int = RETRIEVAL_RRF_K,
+                 dense_weight: float = RETRIEVAL_DENSE_WEIGHT, sparse_weight: float = RETRIEVAL_SPARSE_WEIGHT,
+                 deduplicate_by_parent: bool = RETRIEVAL_DEDUPLICATE_BY_PARENT, reranker=None,
+                 rerank_top_n: int = RETRIEVAL_RERANK_TOP_N, search_params=None):
+        """
+        :param document_store: The QdrantDocumentStore to search.
+        :param top_k: Maximum number of chunks returned per query.
+        :param dense_candidates: Chunks fetched by the dense search.
+        :param sparse_candidates: Chunks fetched by the sparse search.
+        :param fusion_method: 'rrf' or 'weighted'.
+        :param rrf_k: Ranking constant of Reciprocal Rank Fusion.
+        :param dense_weight: Weight of the dense ranking.
+        :param sparse_weight: Weight of the sparse ranking.
+        :param deduplicate_by_parent: Keep only each note's best chunk after fusion.
+        :param reranker: Optional FastembedRanker applied to text queries, see model_registry.get_reranker.
+        :param rerank_top_n: Fused candidates passed to the reranker; the rest are dropped.
+        :param search_params: Qdrant SearchParams for the dense search, e.g. from the storage profile.
+        :raises ValueError: If the fusion method is unknown.
+        """
+        if fusion_method not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method '{fusion_method}'. Choose one of: {', '.join(FUSION_METHODS)}.")
+
+        self.document_store = document_store
+        self.top_k = top_k
+        self.dense_candidates = dense_candidates
+        self.sparse_candidates = sparse_candidates
+        self.fusion_method = fusion_method
+        self.rrf_k = rrf_k
+        self.weights = [dense_weight, sparse_weight]
+        self.deduplicate_by_parent = deduplicate_by_parent
+        self.reranker = reranker
+        self.rerank_top_n = rerank_top_n
+        self.search_params = search_params
+
+
+    def _search_requests(self, queries: list, min_candidates: int) -> tuple:
+        """
+        :param queries: List of (dense embedding, haystack SparseEmbedding) tuples.
+        :param min_candidates: Lower bound on the candidates per search, e.g. to make room for excluded chunks.
+        :return: Tuple of (dense QueryRequests, sparse QueryRequests).
+        """
+        dense_requests = [
+            rest.QueryRequest(
+                query=dense_embedding,
+                using=DENSE_VECTORS_NAME,
+                limit=max(self.dense_candidates, min_candidates),
+                params=self.search_params,
+                with_payload=True,
+                with_vector=False
+            )
+            for dense_embedding, _ in queries
+        ]
+        sparse_requests = [
+            rest.QueryRequest(
+                query=rest.SparseVector(indices=sparse_embedding.indices, values=sparse_embedding.values),
+                using=SPARSE_VECTORS_NAME,
+                limit=max(self.sparse_candidates, min_candidates),
+                with_payload=True,
+                with_vector=False
+            )
+            for _, sparse_embedding in queries
+        ]
+        return dense_requests, sparse_requests
+
+
+    def _to_documents(self, responses: list) -> list:
+        return [
+            [
+                convert_qdrant_point_to_haystack_document(point, use_sparse_embeddings=self.document_store.use_sparse_embeddings)
+                for point in response.points
+            ]
+            for response in responses
+        ]
+
+
+    def _query_batch(self, client, requests: list, timings: dict, name: str) -> list:
+        with _stage(timings, name):
+            return client.query_batch_points(collection_name=self.document_store.index, requests=requests)
+
+
+    async def _query_batch_async(self, client, requests: list, timings: dict, name: str) -> list:
+        with _stage(timings, name):
+            return await client.query_batch_points(collection_name=self.document_store.index, requests=requests)
+
+
+    def search(self, queries: list, min_candidates: int = 0, timings: dict = None) -> tuple:
+        """
+        Runs the dense and sparse searches of many queries, the two batches in parallel.
+
+        :param queries: List of (dense embedding, haystack SparseEmbedding) tuples.
+        :param min_candidates: See `_search_requests`.
+        :param timings: Dictionary the stage timings are written to.
+        :return: Tuple of (dense results, sparse results), each a list of Document lists per query.
+        """
+        from model_registry import get_qdrant_client
+
+        timings = {} if timings is None else timings
+        client = get_qdrant_client()
+        dense_requests, sparse_requests = self._search_requests(queries, min_candidates)
+
+        # Run the dense search in a copy of this context, so its span counts towards the current request
+        context = contextvars.copy_context()
+        dense_future = SEARCH_EXECUTOR.submit(context.run, self._query_batch, client, dense_requests, timings, 'dense_search')
+        sparse_responses = self._query_batch(client, sparse_requests, timings, 'sparse_search')
+        return self._to_documents(dense_future.result()), self._to_documents(sparse_responses)
+
+
+    async def search_async(self, queries: list, min_candidates: int = 0, timings: dict = None) -> tuple:
+        """
+        Asynchronous version of `search`, using the asynchronous Qdrant client.
+        """
+        from model_registry import get_async_qdrant_client
+
+        timings = {} if timings is None else timings
+        client = await get_async_qdrant_client()
+        dense_requests, sparse_requests = self._search_requests(queries, min_candidates)
+        dense_responses, sparse_responses = await asyncio.gather(
+            self._query_batch_async(client, dense_requests, timings, 'dense_search'),
+            self._query_batch_async(client, sparse_requests, timings, 'sparse_search')
+        )
+        return self._to_documents(dense_responses), self._to_documents(sparse_responses)
+
+
+    def fuse(self, dense_documents: list, sparse_documents: list, timings: dict = None) -> list:
+        """
+        Fuses the dense and sparse results of one query.
+
+        :return: Fused chunk Documents, best first; one per note if deduplicating by parent.
+        """
+        with _stage({} if timings is None else timings, 'fusion'):
+            rankings = [dense_documents, sparse_documents]
+            if self.fusion_method == 'rrf':
+                fused = reciprocal_rank_fusion(rankings, self.weights, self.rrf_k)
+            else:
+                fused = weighted_score_fusion(rankings, self.weights)
+            return best_chunk_per_parent(fused) if self.deduplicate_by_parent else fused
+
+
+    def rerank(self, query_text: str, documents: list, timings: dict = None) -> list:
+        """
+        Reranks the top `rerank_top_n` candidates with the cross-encoder, scored by its
+        relevance logits. Returns the candidates unchanged without a reranker or query text.
+        """
+        if self.reranker is None or not query_text or not documents:
+            return documents
+
+        with _stage({} if timings is None else timings, 'rerank'):
+            candidates = documents[:self.rerank_top_n]
+            return self.reranker.run(query=query_text, documents=candidates, top_k=len(candidates))['documents']
+
+
+    @component.output_types(documents=list[Document], timings=dict)
+    def run(self, query_embedding: list[float], query_sparse_embedding: SparseEmbedding, top_k: int = None,
+            query_text: str = None):
+        """
+        Retrieves the chunks most similar to one query.
+
+        :param query_embedding: Dense embedding of the query.
+        :param query_sparse_embedding: Sparse embedding of the query.
+        :param top_k: Maximum number of chunks returned; defaults to the `top_k` given at creation.
+        :param query_text: The query text; the candidates are only reranked when it is given.
+        :return: Dictionary with the chunk Documents, best first, and the stage timings in seconds.
+        """
+        top_k = top_k or self.top_k
+        timings = {}
+        dense_results, sparse_results = self.search([(query_embedding, query_sparse_embedding)], top_k, timings)
+        documents = self.fuse(dense_results[0], sparse_results[0], timings)
+        documents = self.rerank(query_text, documents, timings)
+        return {'documents': documents[:top_k], 'timings': timings}
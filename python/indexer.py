@@ -1,22 +1,22 @@
 from haystack import Document, Pipeline
 from haystack.components.writers import DocumentWriter
-from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
 from haystack.document_stores.types import DuplicatePolicy
-from haystack_integrations.components.embedders.fastembed import (
-    FastembedDocumentEmbedder,
-    FastembedSparseDocumentEmbedder
-)
 from config import (
-    QDRANT_CONFIG,
-    FASTEMBED_DENSE_MODEL,
-    FASTEMBED_SPARSE_MODEL,
-    FASTEMBED_CACHE_DIRECTORY,
-    METADATA_FIELDS_TO_EMBED
+    METADATA_FIELDS_TO_EMBED,
+    INDEXING_BATCH_SIZE
+)
+from model_registry import (
+    get_document_store,
+    dense_document_embedder,
+    sparse_document_embedder
 )
-from markdown_to_plain import strip_markdown
+from note_chunks import NoteChunker
+from folder_centroid_index import get_folder_centroid_index
+from retrieval_cache import bump_collection_version
 
 # Define pipeline component names as constants
 PIPELINE_COMPONENTS = {
+    "CHUNKER": "note_chunker",
     "SPARSE_EMBEDDER": "sparse_document_embedder",
     "DENSE_EMBEDDER": "dense_document_embedder",
     "DOCUMENT_WRITER": "document_writer"
@@ -27,26 +27,28 @@ class Indexer:
     """
     Indexer class to handle document embedding and indexing using the Qdrant vector database.
 
-    This class sets up a pipeline that processes documents by embedding them with both sparse 
-    and dense embeddings before storing them in a Qdrant document store.
+    This class sets up a pipeline that splits notes into chunks (see note_chunks.py) and embeds
+    the chunks with both sparse and dense embeddings before storing them in a Qdrant document store.
     """
 
     def __init__(self):
         """
         Initializes the indexing pipeline with the Qdrant document store and embedding components.
         """
-        # Initialize the document store
-        self.document_store = QdrantDocumentStore(**QDRANT_CONFIG)
+        # Use the shared document store
+        self.document_store = get_document_store()
 
         # Create the document processing pipeline
         self.pipeline = Pipeline()
 
+        # Add the component splitting Markdown notes into chunks that fit the models
+        self.pipeline.add_component(PIPELINE_COMPONENTS['CHUNKER'], NoteChunker())
+
         # Add sparse embedding component
         self.pipeline.add_component(
             PIPELINE_COMPONENTS['SPARSE_EMBEDDER'],
-            FastembedSparseDocumentEmbedder(
-                model=FASTEMBED_SPARSE_MODEL,
-                cache_dir=FASTEMBED_CACHE_DIRECTORY,
+            sparse_document_embedder(
+                batch_size=INDEXING_BATCH_SIZE,
                 meta_fields_to_embed=METADATA_FIELDS_TO_EMBED
             )
         )
@@ -54,9 +56,8 @@ class Indexer:
         # Add dense embedding component
         self.pipeline.add_component(
             PIPELINE_COMPONENTS['DENSE_EMBEDDER'],
-            FastembedDocumentEmbedder(
-                model=FASTEMBED_DENSE_MODEL,
-                cache_dir=FASTEMBED_CACHE_DIRECTORY,
+            dense_document_embedder(
+                batch_size=INDEXING_BATCH_SIZE,
                 meta_fields_to_embed=METADATA_FIELDS_TO_EMBED
             )
         )
@@ -71,9 +72,14 @@ class Indexer:
         )
 
         # Define pipeline connections:
-        # 1. Sparse embeddings are processed first
-        # 2. Then, dense embeddings are applied
-        # 3. Finally, the document is stored
+        # 1. Notes are split into chunks
+        # 2. Sparse embeddings are processed
+        # 3. Then, dense embeddings are applied
+        # 4. Finally, the chunks are stored
+        self.pipeline.connect(
+            PIPELINE_COMPONENTS['CHUNKER'],
+            PIPELINE_COMPONENTS['SPARSE_EMBEDDER']
+        )
         self.pipeline.connect(
             PIPELINE_COMPONENTS['SPARSE_EMBEDDER'], 
             PIPELINE_COMPONENTS['DENSE_EMBEDDER']
@@ -86,15 +92,20 @@ class Indexer:
 
     def index_documents(self, documents: list) -> dict:
         """
-        Embeds and indexes a list of documents in the Qdrant document store.
+        Chunks, embeds and indexes a list of documents in the Qdrant document store.
 
-        :param documents: List of `Document` objects to be indexed.
+        :param documents: List of `Document` objects with Markdown content to be indexed. Each
+                          document's ID becomes the ID of its first chunk.
         :return: A dictionary containing the pipeline execution results.
         """
         results = self.pipeline.run(
-            {PIPELINE_COMPONENTS['SPARSE_EMBEDDER']: {'documents': documents}},
-            include_outputs_from={PIPELINE_COMPONENTS['SPARSE_EMBEDDER']}
+            {PIPELINE_COMPONENTS['CHUNKER']: {'documents': documents}},
+            include_outputs_from={
+                PIPELINE_COMPONENTS['SPARSE_EMBEDDER'],
+                PIPELINE_COMPONENTS['DENSE_EMBEDDER']
+            }
         )
+        bump_collection_version()
         return results
     
 
@@ -106,17 +117,47 @@ class Indexer:
 
         :return: The document ID of the embedded note.
         """
-        # Create a Haystack Document object with note metadata
-        note_to_embed = Document(
-            content=strip_markdown(note_contents)
-        )
+        return self.embed_notes([note_contents])[0]
+
 
-        # Embed and store the note
-        results = self.index_documents([note_to_embed])
+    def embed_notes(self, notes_contents: list, batch_size: int = INDEXING_BATCH_SIZE, existing_ids: list = None) -> list:
+        """
+        Embeds many notes and indexes them into the vector database, running the
+        pipeline once per group of `batch_size` notes instead of once per note.
 
-        # Retrieve and return the document ID after embedding
-        return results[PIPELINE_COMPONENTS['SPARSE_EMBEDDER']]['documents'][0].id
+        :param notes_contents: List of note contents (Markdown strings).
+        :param batch_size: Number of notes to send through the pipeline per run.
+        :param existing_ids: Optional existing document IDs to re-embed the notes under, in the
+                             same order as `notes_contents`. New IDs are derived from the content if None.
 
+        :return: The document IDs of the embedded notes, in the same order as the input.
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}.")
+
+        document_ids = []
+        folder_centroid_index = get_folder_centroid_index()
+
+        for start in range(0, len(notes_contents), batch_size):
+            # Create Haystack Document objects for the current group
+            notes_to_embed = [
+                Document(content=note_contents)
+                for note_contents in notes_contents[start:start + batch_size]
+            ]
+            if existing_ids is not None:
+                for document, document_id in zip(notes_to_embed, existing_ids[start:start + batch_size]):
+                    document.id = document_id
+
+            # Embed and store the group's chunks
+            results = self.index_documents(notes_to_embed)
+            document_ids.extend(document.id for document in notes_to_embed)
+
+            # Keep folder centroids in sync with re-embedded notes, represented by their first chunk
+            for document in results[PIPELINE_COMPONENTS['DENSE_EMBEDDER']]['documents']:
+                if document.meta['chunk_index'] == 0:
+                    folder_centroid_index.note_embedded(document.id, document.embedding)
+
+        return document_ids
 
 if __name__ == '__main__':
     indexer = Indexer()
@@ -0,0 +1,37 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from config import INFERENCE_WORKERS
+
+# Bounded pool for CPU-bound embedding work, kept apart from Starlette's
+# default threadpool so embedding bursts can't starve cheap requests. Threads
+# rather than processes, so every worker shares the models loaded once by
+# model_registry. The workers mostly wait on the embedding batchers, which
+# merge their requests and run the models with INFERENCE_ONNX_THREADS threads.
+INFERENCE_EXECUTOR = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix='inference')
+
+
+async def run_inference(function, *args, **kwargs):
+    """
+    Runs a blocking function that embeds text on the inference executor.
+
+    :param function: The function to call.
+    :return: The function's return value.
+    """
+    # Run in a copy of the caller's context, so timing spans count towards its request
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(INFERENCE_EXECUTOR, functools.partial(context.run, function, *args, **kwargs))
+
+
+def run_inference_blocking(function, *args, **kwargs):
+    """
+    Runs a function that embeds text on the inference executor from a regular
+    thread and waits for its result, so background work shares the same bound.
+
+    :param function: The function to call.
+    :return: The function's return value.
+    """
+    context = contextvars.copy_context()
+    return INFERENCE_EXECUTOR.submit(context.run, function, *args, **kwargs).result()
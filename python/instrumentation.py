@@ -0,0 +1,208 @@
+"""
+Timing spans for the hot paths of the AI service, exported as Prometheus histograms.
+
+Wrap an operation in `span(name)` (or decorate it with `timed(name)`) and
+its duration lands in the `note_a_log_span_seconds` histogram under that
+name. While a request is being served, its spans are also collected for the
+request's Server-Timing header; spans recorded on other threads count
+towards the request as long as the thread runs in a copy of the request's
+context (Starlette's threadpool, `asyncio.to_thread`, `run_inference`).
+Work done on behalf of several requests at once, such as a batched model
+call, is only recorded by the callers waiting on it.
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from config import (
+    METRICS_ENABLED,
+    METRICS_HISTOGRAM_BUCKETS
+)
+
+SPAN_METRIC = 'note_a_log_span_seconds'
+REQUEST_METRIC = 'note_a_log_http_request_seconds'
+METRIC_HELP = {
+    SPAN_METRIC: 'Time spent in instrumented operations.',
+    REQUEST_METRIC: 'Time spent serving HTTP requests.'
+}
+
+# Spans of the request being served in the current context, or None outside of requests
+_request_spans = contextvars.ContextVar('request_spans', default=None)
+
+
+class Histogram:
+    """
+    Cumulative histogram of durations in seconds, safe to update from many threads.
+    """
+
+    def __init__(self, buckets: list = METRICS_HISTOGRAM_BUCKETS):
+        self.buckets = sorted(buckets)
+        self._bucket_counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+
+    def observe(self, seconds: float):
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._bucket_counts[bucket] += 1
+            self._sum += seconds
+            self._count += 1
+
+
+    def snapshot(self) -> tuple:
+        """
+        :return: Tuple of (list of (upper bound, cumulative count), sum, count); the last bound is '+Inf'.
+        """
+        with self._lock:
+            bucket_counts = list(self._bucket_counts)
+            total, count = self._sum, self._count
+
+        cumulative = []
+        running = 0
+        for upper_bound, bucket_count in zip(self.buckets + ['+Inf'], bucket_counts):
+            running += bucket_count
+            cumulative.append((upper_bound, running))
+        return cumulative, total, count
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def get_histogram(metric: str, labels: tuple) -> Histogram:
+    """
+    :param metric: Metric name, e.g. SPAN_METRIC.
+    :param labels: Tuple of (label name, value) pairs.
+    :return: The histogram for this metric and label set, created on first use.
+    """
+    key = (metric, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    return histogram
+
+
+def record_span(name: str, seconds: float):
+    """
+    Records a finished span in the span histogram and in the current request's spans.
+    """
+    if not METRICS_ENABLED:
+        return
+    get_histogram(SPAN_METRIC, (('span', name),)).observe(seconds)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+@contextmanager
+def span(name: str):
+    """
+    Times the enclosed block as the span `name`. Works around `await` too, in which
+    case the span measures wall time including the wait.
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start_time)
+
+
+def timed(name: str):
+    """
+    Decorator timing every call of a function, or coroutine function, as the span `name`.
+    """
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(instance, method_names: list, prefix: str):
+    """
+    Replaces methods of one object with timed versions, recorded as '<prefix>_<method>'.
+    Methods the object doesn't have are skipped.
+    """
+    for method_name in method_names:
+        method = getattr(instance, method_name, None)
+        if method is not None:
+            setattr(instance, method_name, timed(f'{prefix}_{method_name}')(method))
+
+
+def start_request_spans() -> tuple:
+    """
+    Starts collecting the spans of a request in the current context.
+
+    :return: Tuple of (token for `finish_request_spans`, list the spans are appended to).
+    """
+    spans = []
+    return _request_spans.set(spans), spans
+
+
+def finish_request_spans(token):
+    _request_spans.reset(token)
+
+
+def record_request(method: str, route: str, status_code: int, seconds: float):
+    if METRICS_ENABLED:
+        get_histogram(REQUEST_METRIC, (('method', method), ('route', route), ('status', str(status_code)))).observe(seconds)
+
+
+def server_timing_header(spans: list, total_seconds: float) -> str:
+    """
+    Builds a Server-Timing header value, with one entry per span name holding the
+    summed duration and the number of calls, plus the request total.
+    """
+    durations = {}
+    counts = {}
+    for name, seconds in spans:
+        durations[name] = durations.get(name, 0.0) + seconds
+        counts[name] = counts.get(name, 0) + 1
+
+    entries = [f'{name};dur={seconds * 1000:.2f};desc="{counts[name]}x"' for name, seconds in durations.items()]
+    entries.append(f'total;dur={total_seconds * 1000:.2f}')
+    return ', '.join(entries)
+
+
+def _format_labels(labels: tuple) -> str:
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped))
+
+
+def render_prometheus() -> str:
+    """
+    :return: Every histogram in the Prometheus text exposition format.
+    """
+    with _histograms_lock:
+        histograms = sorted(_histograms.items())
+
+    lines = []
+    described = set()
+    for (metric, labels), histogram in histograms:
+        if metric not in described:
+            described.add(metric)
+            lines.append(f'# HELP {metric} {METRIC_HELP.get(metric, metric)}')
+            lines.append(f'# TYPE {metric} histogram')
+
+        buckets, total, count = histogram.snapshot()
+        label_text = _format_labels(labels)
+        for upper_bound, cumulative_count in buckets:
+            lines.append(f'{metric}_bucket{{{label_text},le="{upper_bound}"}} {cumulative_count}')
+        lines.append(f'{metric}_sum{{{label_text}}} {total}')
+        lines.append(f'{metric}_count{{{label_text}}} {count}')
+    return '\n'.join(lines) + '\n'
@@ -1,5 +1,55 @@
+import hashlib
+import threading
 from markdown_it import MarkdownIt
 from mdit_plain.renderer import RendererPlain
+from config import (
+    MARKDOWN_CACHE_MAX_ENTRIES,
+    MARKDOWN_CACHE_MAX_TOTAL_CHARS,
+    MARKDOWN_CACHE_TTL_SECONDS,
+    MARKDOWN_CACHE_MAX_TEXT_LENGTH
+)
+from retrieval_cache import TTLCache
+from instrumentation import span
+
+# Parsers are reused, one per thread: the renderer's HTML parser keeps state while rendering
+_thread_parsers = threading.local()
+
+# Plain text of recently converted notes, keyed by a hash of the Markdown
+_plain_text_cache = TTLCache(MARKDOWN_CACHE_MAX_ENTRIES, MARKDOWN_CACHE_TTL_SECONDS, MARKDOWN_CACHE_MAX_TOTAL_CHARS)
+
+
+class StreamingRendererPlain(RendererPlain):
+    """
+    RendererPlain that collects the rendered pieces in a list and joins them once,
+    instead of concatenating strings, so very large notes render in linear time.
+    The output is identical to RendererPlain's.
+    """
+
+    def render(self, tokens, options, env):
+        if options is None and self.parser is not None:
+            options = self.parser.options
+        pieces = []
+        for i, token in enumerate(tokens):
+            pieces.append(self.rules.get(token.type, self.render_default)(tokens, i, options, env))
+            if token.children is not None:
+                pieces.append(self.render(token.children, options, env))
+        return ''.join(pieces).strip()
+
+
+def _get_parser() -> MarkdownIt:
+    parser = getattr(_thread_parsers, 'parser', None)
+    if parser is None:
+        parser = _thread_parsers.parser = MarkdownIt(renderer_cls=StreamingRendererPlain)
+    return parser
+
+
+def _render(markdown_text: str) -> str:
+    with span('strip_markdown'):
+        return _get_parser().render(markdown_text)
+
+
+def _cache_key(markdown_text: str) -> bytes:
+    return hashlib.blake2b(markdown_text.encode('utf-8'), digest_size=16).digest()
 
 
 def strip_markdown(markdown_text: str) -> str:
@@ -9,6 +59,33 @@ def strip_markdown(markdown_text: str) -> str:
     :param markdown_text: The Markdown-formatted string.
     :return: A plain text string with Markdown formatting removed.
     """
-    parser = MarkdownIt(renderer_cls=RendererPlain)
-    plain_text = parser.render(markdown_text)
+    if len(markdown_text) > MARKDOWN_CACHE_MAX_TEXT_LENGTH:
+        return _render(markdown_text)
+
+    cache_key = _cache_key(markdown_text)
+    plain_text = _plain_text_cache.get(cache_key)
+    if plain_text is None:
+        plain_text = _render(markdown_text)
+        _plain_text_cache.put(cache_key, plain_text)
     return plain_text
+
+
+def strip_markdown_many(markdown_texts: list) -> list:
+    """
+    Convert many Markdown strings to plain text, converting each distinct text once.
+
+    :param markdown_texts: List of Markdown-formatted strings.
+    :return: List of plain text strings, in the same order as the input.
+    """
+    plain_texts_by_text = {}
+    for markdown_text in markdown_texts:
+        if markdown_text not in plain_texts_by_text:
+            plain_texts_by_text[markdown_text] = strip_markdown(markdown_text)
+    return [plain_texts_by_text[markdown_text] for markdown_text in markdown_texts]
+
+
+def markdown_cache_stats() -> dict:
+    """
+    :return: Dictionary with hit/miss counters, hit rate and size of the plain-text cache.
+    """
+    return _plain_text_cache.stats()
@@ -0,0 +1,334 @@
+import threading
+import time
+from haystack import Document
+from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
+from haystack_integrations.components.embedders.fastembed import (
+    FastembedTextEmbedder,
+    FastembedSparseTextEmbedder,
+    FastembedDocumentEmbedder,
+    FastembedSparseDocumentEmbedder
+)
+from haystack_integrations.components.rankers.fastembed import FastembedRanker
+from fastembed_backends import load_dense_backend, load_sparse_backend
+from embedding_batcher import EmbeddingBatcher
+from instrumentation import instrument_methods
+from qdrant_storage import get_storage_profile, document_store_arguments
+from config import (
+    VECTOR_STORE_BACKEND,
+    QDRANT_LOCAL_PATH,
+    EMBEDDED_VECTOR_STORE_PATH,
+    QDRANT_CONFIG,
+    FASTEMBED_DENSE_MODEL,
+    FASTEMBED_SPARSE_MODEL,
+    FASTEMBED_CACHE_DIRECTORY,
+    INFERENCE_ONNX_THREADS,
+    RETRIEVAL_RERANKER_MODEL
+)
+
+# Arguments shared by every FastEmbed component. Haystack components can only
+# belong to one pipeline, so the Indexer, EmbeddingsManager and retriever each
+# get their own component objects, but they all point at the same ONNX backend.
+DENSE_MODEL_ARGUMENTS = {
+    'model': FASTEMBED_DENSE_MODEL,
+    'cache_dir': FASTEMBED_CACHE_DIRECTORY,
+    'threads': INFERENCE_ONNX_THREADS
+}
+SPARSE_MODEL_ARGUMENTS = {
+    'model': FASTEMBED_SPARSE_MODEL,
+    'cache_dir': FASTEMBED_CACHE_DIRECTORY,
+    'threads': INFERENCE_ONNX_THREADS
+}
+
+# Qdrant client calls timed as 'qdrant_<method>' spans
+QDRANT_TIMED_METHODS = [
+    'query_points', 'query_batch_points', 'query_points_groups', 'retrieve',
+    'scroll', 'count', 'upsert', 'delete', 'create_payload_index'
+]
+
+_registry_lock = threading.Lock()
+_document_store = None
+_dense_backend = None
+_sparse_backend = None
+_reranker = None
+_load_times = {}
+_components_awaiting_backend = []
+
+
+class InstrumentedQdrantDocumentStore(QdrantDocumentStore):
+    """
+    QdrantDocumentStore whose clients time their reads and writes, see QDRANT_TIMED_METHODS.
+    """
+
+    def _initialize_client(self) -> None:
+        instrument = self._client is None
+        super()._initialize_client()
+        if instrument:
+            instrument_methods(self._client, QDRANT_TIMED_METHODS, 'qdrant')
+
+    async def _initialize_async_client(self) -> None:
+        instrument = self._async_client is None
+        await super()._initialize_async_client()
+        if instrument:
+            instrument_methods(self._async_client, QDRANT_TIMED_METHODS, 'qdrant')
+
+
+class EmbeddedQdrantDocumentStore(InstrumentedQdrantDocumentStore):
+    """
+    QdrantDocumentStore backed by the in-process EmbeddedVectorClient instead of a Qdrant server.
+    """
+
+    def __init__(self, path: str = EMBEDDED_VECTOR_STORE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        if self.sparse_idf:
+            raise ValueError('The embedded vector store does not support sparse_idf.')
+        self.embedded_path = path
+
+    def _initialize_client(self) -> None:
+        if self._client is None:
+            from embedded_vector_store import EmbeddedVectorClient
+
+            client = EmbeddedVectorClient(
+                self.embedded_path,
+                dimension=self.embedding_dim,
+                distance=self.similarity,
+                named_vectors=self.use_sparse_embeddings,
+                payload_fields_to_index=self.payload_fields_to_index
+            )
+            if self.recreate_index:
+                client.delete_collection(self.index)
+            instrument_methods(client, QDRANT_TIMED_METHODS, 'qdrant')
+            self._client = client
+
+    async def _initialize_async_client(self) -> None:
+        raise RuntimeError('The embedded vector store has no asynchronous client; set QDRANT_USE_ASYNC_CLIENT to False.')
+
+
+def get_document_store() -> QdrantDocumentStore:
+    """
+    Returns the process-wide document store for VECTOR_STORE_BACKEND, creating it on first use.
+    A new collection on a Qdrant server is created with the configured storage profile.
+
+    :return: The shared QdrantDocumentStore instance.
+    :raises ValueError: If VECTOR_STORE_BACKEND is unknown.
+    """
+    global _document_store
+
+    with _registry_lock:
+        if _document_store is None:
+            if VECTOR_STORE_BACKEND == 'qdrant':
+                _document_store = InstrumentedQdrantDocumentStore(
+                    **QDRANT_CONFIG,
+                    **document_store_arguments(get_storage_profile())
+                )
+            elif VECTOR_STORE_BACKEND == 'qdrant_local':
+                local_config = {key: value for key, value in QDRANT_CONFIG.items() if key != 'url'}
+                _document_store = InstrumentedQdrantDocumentStore(path=QDRANT_LOCAL_PATH, **local_config)
+            elif VECTOR_STORE_BACKEND == 'embedded':
+                local_config = {key: value for key, value in QDRANT_CONFIG.items() if key != 'url'}
+                _document_store = EmbeddedQdrantDocumentStore(path=EMBEDDED_VECTOR_STORE_PATH, **local_config)
+            else:
+                raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{VECTOR_STORE_BACKEND}'. Choose 'qdrant', 'qdrant_local' or 'embedded'.")
+        return _document_store
+
+
+def get_qdrant_client():
+    """
+    Returns the synchronous Qdrant client of the shared document store, for
+    requests the Haystack integration doesn't wrap (e.g. batch queries).
+
+    :return: The store's QdrantClient, or EmbeddedVectorClient for the embedded backend.
+    """
+    document_store = get_document_store()
+    document_store._initialize_client()
+    return document_store._client
+
+
+async def get_async_qdrant_client():
+    """
+    Returns the asynchronous Qdrant client of the shared document store.
+
+    :return: The store's AsyncQdrantClient.
+    """
+    document_store = get_document_store()
+    await document_store._initialize_async_client()
+    return document_store._async_client
+
+
+def get_dense_backend():
+    """
+    Loads the dense FastEmbed model once per process and returns its backend,
+    wrapped in a batcher that merges concurrent requests into one model call.
+
+    :return: The shared dense EmbeddingBatcher.
+    """
+    global _dense_backend
+
+    with _registry_lock:
+        if _dense_backend is None:
+            start_time = time.perf_counter()
+            _dense_backend = EmbeddingBatcher(
+                load_dense_backend(
+                    model_name=FASTEMBED_DENSE_MODEL,
+                    cache_dir=FASTEMBED_CACHE_DIRECTORY,
+                    threads=INFERENCE_ONNX_THREADS
+                ),
+                name='dense'
+            )
+            _load_times[FASTEMBED_DENSE_MODEL] = time.perf_counter() - start_time
+        return _dense_backend
+
+
+def get_sparse_backend():
+    """
+    Loads the sparse FastEmbed model once per process and returns its backend,
+    wrapped in a batcher that merges concurrent requests into one model call.
+
+    :return: The shared sparse EmbeddingBatcher.
+    """
+    global _sparse_backend
+
+    with _registry_lock:
+        if _sparse_backend is None:
+            start_time = time.perf_counter()
+            _sparse_backend = EmbeddingBatcher(
+                load_sparse_backend(
+                    model_name=FASTEMBED_SPARSE_MODEL,
+                    cache_dir=FASTEMBED_CACHE_DIRECTORY,
+                    threads=INFERENCE_ONNX_THREADS
+                ),
+                name='sparse'
+            )
+            _load_times[FASTEMBED_SPARSE_MODEL] = time.perf_counter() - start_time
+        return _sparse_backend
+
+
+def get_reranker():
+    """
+    Loads the cross-encoder RETRIEVAL_RERANKER_MODEL once per process.
+
+    :return: The shared, warmed-up FastembedRanker, or None if no reranker is configured.
+    """
+    global _reranker
+
+    if RETRIEVAL_RERANKER_MODEL is None:
+        return None
+
+    with _registry_lock:
+        if _reranker is None:
+            start_time = time.perf_counter()
+            reranker = FastembedRanker(
+                model_name=RETRIEVAL_RERANKER_MODEL,
+                cache_dir=FASTEMBED_CACHE_DIRECTORY,
+                threads=INFERENCE_ONNX_THREADS
+            )
+            reranker.warm_up()
+            _reranker = reranker
+            _load_times[RETRIEVAL_RERANKER_MODEL] = time.perf_counter() - start_time
+        return _reranker
+
+
+def _is_dense(component) -> bool:
+    return isinstance(component, (FastembedTextEmbedder, FastembedDocumentEmbedder))
+
+
+def _share_backend(component):
+    """
+    Points a FastEmbed component at the already loaded backend so that its own
+    warm_up() becomes a no-op. Components created before the models are loaded
+    are remembered and receive the backend from load_models().
+    """
+    with _registry_lock:
+        backend = _dense_backend if _is_dense(component) else _sparse_backend
+        if backend is not None:
+            component.embedding_backend = backend
+        else:
+            _components_awaiting_backend.append(component)
+    return component
+
+
+def dense_text_embedder(**kwargs) -> FastembedTextEmbedder:
+    """
+    Creates a dense text embedder backed by the shared dense model.
+
+    :param kwargs: Extra FastembedTextEmbedder arguments, such as `prefix`.
+    """
+    return _share_backend(FastembedTextEmbedder(**DENSE_MODEL_ARGUMENTS, **kwargs))
+
+
+def sparse_text_embedder(**kwargs) -> FastembedSparseTextEmbedder:
+    """
+    Creates a sparse text embedder backed by the shared sparse model.
+
+    :param kwargs: Extra FastembedSparseTextEmbedder arguments.
+    """
+    return _share_backend(FastembedSparseTextEmbedder(**SPARSE_MODEL_ARGUMENTS, **kwargs))
+
+
+def dense_document_embedder(**kwargs) -> FastembedDocumentEmbedder:
+    """
+    Creates a dense document embedder backed by the shared dense model.
+
+    :param kwargs: Extra FastembedDocumentEmbedder arguments, such as `batch_size`.
+    """
+    return _share_backend(FastembedDocumentEmbedder(**DENSE_MODEL_ARGUMENTS, **kwargs))
+
+
+def sparse_document_embedder(**kwargs) -> FastembedSparseDocumentEmbedder:
+    """
+    Creates a sparse document embedder backed by the shared sparse model.
+
+    :param kwargs: Extra FastembedSparseDocumentEmbedder arguments, such as `batch_size`.
+    """
+    return _share_backend(FastembedSparseDocumentEmbedder(**SPARSE_MODEL_ARGUMENTS, **kwargs))
+
+
+def load_models():
+    """
+    Eagerly loads both FastEmbed models (and the reranker, if configured), runs one
+    throwaway inference through each so ONNX Runtime finishes its lazy session setup,
+    and hands the loaded backends to every component created before this call.
+    """
+    dense_backend = get_dense_backend()
+    sparse_backend = get_sparse_backend()
+    reranker = get_reranker()
+
+    dense_backend.embed(['warm up'], progress_bar=False)
+    sparse_backend.embed(['warm up'], progress_bar=False)
+    if reranker is not None:
+        reranker.run(query='warm up', documents=[Document(content='warm up')])
+
+    with _registry_lock:
+        for component in _components_awaiting_backend:
+            component.embedding_backend = dense_backend if _is_dense(component) else sparse_backend
+        _components_awaiting_backend.clear()
+
+
+def models_loaded() -> bool:
+    """
+    Checks whether both FastEmbed models have been loaded in this process.
+
+    :return: True if the dense and sparse backends are ready.
+    """
+    return _dense_backend is not None and _sparse_backend is not None
+
+
+def embedding_batcher_stats() -> dict:
+    """
+    Reports queue depth, batch sizes and wait times of the embedding batchers.
+
+    :return: Dictionary mapping 'dense' and 'sparse' to their batcher's stats.
+    """
+    return {
+        batcher.name: batcher.stats()
+        for batcher in (_dense_backend, _sparse_backend)
+        if batcher is not None
+    }
+
+
+def model_load_times() -> dict:
+    """
+    Reports how long each model took to load in this process.
+
+    :return: Dictionary mapping model names to load time in seconds.
+    """
+    return dict(_load_times)
@@ -0,0 +1,299 @@
+"""
+Splits notes into chunks that fit the embedding models, and maps chunk hits back to their notes.
+
+A note is stored as one document per chunk. The first chunk's ID is the note's
+embeddings ID, so a note that fits into a single chunk is stored exactly as
+before chunking existed; further chunks get the ID '<embeddings ID>:<index>'.
+Every chunk's meta holds the note ID ('parent_id'), its position
+('chunk_index') and a hash of its text ('chunk_hash'), so updates only
+re-embed the chunks whose text changed. The first chunk also holds a hash of
+the whole note ('note_hash').
+"""
+import hashlib
+import re
+from dataclasses import replace
+from haystack import Document, component
+from haystack_integrations.document_stores.qdrant.converters import (
+    convert_id,
+    convert_qdrant_point_to_haystack_document
+)
+from qdrant_client.http import models as rest
+from config import (
+    CHUNK_MAX_WORDS,
+    CHUNK_OVERLAP_WORDS,
+    CHUNK_SCORE_AGGREGATION
+)
+from markdown_to_plain import strip_markdown, strip_markdown_many
+
+HEADING_PATTERN = re.compile(r'^\s{0,3}#{1,6}\s')
+FENCE_PATTERN = re.compile(r'^\s{0,3}(```|~~~)')
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def chunk_id(parent_id: str, chunk_index: int) -> str:
+    return parent_id if chunk_index == 0 else f'{parent_id}:{chunk_index}'
+
+
+def parent_id_of(document: Document) -> str:
+    """
+    :return: ID of the note a chunk belongs to. Documents embedded before chunking are their own parent.
+    """
+    return document.meta.get('parent_id', document.id)
+
+
+def chunk_hash_of(document: Document) -> str:
+    return document.meta.get('chunk_hash') or text_hash(document.content or '')
+
+
+def _markdown_blocks(markdown_text: str) -> list:
+    """
+    Splits Markdown into headings, paragraphs and fenced code blocks, never inside a fence.
+
+    :return: List of (heading of the enclosing section, block text) tuples.
+    """
+    blocks = []
+    heading = None
+    lines = []
+    in_fence = False
+
+    def end_block():
+        if lines:
+            blocks.append((heading, '\n'.join(lines)))
+            lines.clear()
+
+    for line in markdown_text.splitlines():
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        elif not in_fence and HEADING_PATTERN.match(line):
+            end_block()
+            heading = line.strip()
+            blocks.append((heading, heading))
+            continue
+        elif not in_fence and not line.strip():
+            end_block()
+            continue
+        lines.append(line)
+
+    end_block()
+    return blocks
+
+
+def fits_one_chunk(markdown_text: str, max_words: int = CHUNK_MAX_WORDS) -> bool:
+    return len(markdown_text.split()) <= max_words
+
+
+def split_markdown(markdown_text: str, max_words: int = CHUNK_MAX_WORDS, overlap_words: int = CHUNK_OVERLAP_WORDS) -> list:
+    """
+    Splits a Markdown note into plain-text chunks of about `max_words` words.
+
+    Chunks end at headings and paragraph breaks where possible; a continued
+    section repeats its heading, and each chunk starts with the last
+    `overlap_words` words of the previous one. A note that fits into one
+    chunk yields exactly `strip_markdown(markdown_text)`.
+
+    :return: List of plain-text chunks, at least one.
+    """
+    if fits_one_chunk(markdown_text, max_words):
+        return [strip_markdown(markdown_text)]
+
+    pieces = []
+    current = []
+    current_words = 0
+
+    def end_piece():
+        nonlocal current_words
+        if current:
+            pieces.append('\n\n'.join(current))
+            current.clear()
+            current_words = 0
+
+    for heading, block in _markdown_blocks(markdown_text):
+        block_words = block.split()
+
+        if current_words + len(block_words) > max_words:
+            # Don't leave a heading at the end of a chunk, it is repeated below
+            if heading and current and current[-1] == heading:
+                current.pop()
+                current_words -= len(heading.split())
+            end_piece()
+
+        # Give a section that continues in a new chunk its heading again
+        if not current and heading and block != heading:
+            current.append(heading)
+            current_words = len(heading.split())
+
+        if current_words + len(block_words) <= max_words:
+            current.append(block)
+            current_words += len(block_words)
+            continue
+
+        # A paragraph longer than a chunk is cut into word windows
+        while block_words:
+            room = max(max_words - current_words, 1)
+            current.append(' '.join(block_words[:room]))
+            current_words += len(block_words[:room])
+            block_words = block_words[room:]
+            if block_words:
+                end_piece()
+                if heading:
+                    current.append(heading)
+                    current_words = len(heading.split())
+
+    end_piece()
+
+    plain_pieces = [plain for plain in (piece.strip() for piece in strip_markdown_many(pieces)) if plain]
+    chunks = plain_pieces[:1]
+    for previous, plain in zip(plain_pieces, plain_pieces[1:]):
+        overlap = ' '.join(previous.split()[-overlap_words:]) if overlap_words > 0 else ''
+        chunks.append(f'{overlap}\n{plain}' if overlap else plain)
+    return chunks or [strip_markdown(markdown_text)]
+
+
+def chunk_note(parent_id: str, markdown_text: str, meta: dict = None, plain_text: str = None) -> list:
+    """
+    :param parent_id: The note's embeddings ID, used as the first chunk's ID.
+    :param markdown_text: The note's Markdown content.
+    :param meta: Metadata copied to every chunk.
+    :param plain_text: The note's content already converted to plain text, if it fits into one chunk.
+    :return: List of chunk Documents without embeddings, in note order.
+    """
+    chunks = []
+    texts = [plain_text] if plain_text is not None else split_markdown(markdown_text)
+    for chunk_index, text in enumerate(texts):
+        chunk_meta = {**(meta or {}), 'parent_id': parent_id, 'chunk_index': chunk_index, 'chunk_hash': text_hash(text)}
+        if chunk_index == 0:
+            chunk_meta['note_hash'] = text_hash(markdown_text)
+        chunks.append(Document(id=chunk_id(parent_id, chunk_index), content=text, meta=chunk_meta))
+    return chunks
+
+
+def chunk_notes(notes: list) -> list:
+    """
+    Chunks many notes, converting the notes that fit into one chunk to plain text in one batch.
+
+    :param notes: List of (parent ID, Markdown content, meta) tuples.
+    :return: List with the chunk Documents of each note, in the same order as the input.
+    """
+    short_notes = [index for index, (_, markdown_text, _) in enumerate(notes) if fits_one_chunk(markdown_text)]
+    plain_texts = dict(zip(short_notes, strip_markdown_many([notes[index][1] for index in short_notes])))
+    return [
+        chunk_note(parent_id, markdown_text, meta, plain_texts.get(index))
+        for index, (parent_id, markdown_text, meta) in enumerate(notes)
+    ]
+
+
+@component
+class NoteChunker:
+    """
+    Pipeline component turning note Documents (Markdown content) into chunk Documents.
+    The input Document's ID becomes the note's embeddings ID.
+    """
+
+    @component.output_types(documents=list[Document])
+    def run(self, documents: list[Document]):
+        chunks_by_note = chunk_notes([(document.id, document.content or '', document.meta) for document in documents])
+        return {'documents': [chunk for chunks in chunks_by_note for chunk in chunks]}
+
+
+def aggregate_by_parent(documents: list, top_k: int, exclude_parent_id: str = None) -> list:
+    """
+    Folds chunk hits into one result per note, scored with CHUNK_SCORE_AGGREGATION.
+
+    :param documents: Retrieved chunk Documents.
+    :param top_k: Maximum number of notes to return.
+    :param exclude_parent_id: Note whose chunks are left out, e.g. the reference note of a similarity search.
+    :return: The best-scoring chunk of each note, carrying the note's ID and aggregated score, best first.
+    """
+    best_chunks = {}
+    scores = {}
+    for document in documents:
+        parent_id = parent_id_of(document)
+        if parent_id == exclude_parent_id:
+            continue
+        scores.setdefault(parent_id, []).append(document.score or 0.0)
+        if parent_id not in best_chunks or (document.score or 0.0) > (best_chunks[parent_id].score or 0.0):
+            best_chunks[parent_id] = document
+
+    aggregate = sum if CHUNK_SCORE_AGGREGATION == 'sum' else max
+    results = [
+        replace(document, id=parent_id, score=aggregate(scores[parent_id]))
+        for parent_id, document in best_chunks.items()
+    ]
+    results.sort(key=lambda document: document.score, reverse=True)
+    return results[:top_k]
+
+
+def parent_filter(parent_ids: list) -> rest.Filter:
+    """
+    :return: Qdrant filter matching every chunk of the given notes.
+    """
+    return rest.Filter(should=[
+        rest.FieldCondition(key='meta.parent_id', match=rest.MatchAny(any=list(parent_ids))),
+        # Notes embedded before chunking have no parent_id
+        rest.HasIdCondition(has_id=[convert_id(parent_id) for parent_id in parent_ids])
+    ])
+
+
+def fetch_note_chunks(document_store, parent_ids: list) -> dict:
+    """
+    Reads the stored chunks of many notes, with their embeddings.
+
+    :return: Dictionary mapping each note ID found in the store to its chunk Documents, in note order.
+    """
+    if not parent_ids:
+        return {}
+
+    from model_registry import get_qdrant_client
+    client = get_qdrant_client()
+    chunks_by_parent = {}
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=document_store.index,
+            scroll_filter=parent_filter(parent_ids),
+            limit=document_store.scroll_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        for record in records:
+            document = convert_qdrant_point_to_haystack_document(record, use_sparse_embeddings=document_store.use_sparse_embeddings)
+            chunks_by_parent.setdefault(parent_id_of(document), []).append(document)
+        if offset is None:
+            break
+
+    for chunks in chunks_by_parent.values():
+        chunks.sort(key=lambda document: document.meta.get('chunk_index', 0))
+    return chunks_by_parent
+
+
+def delete_note_chunks(document_store, parent_ids: list):
+    """
+    Deletes every chunk of the given notes.
+    """
+    if not parent_ids:
+        return
+
+    from model_registry import get_qdrant_client
+    get_qdrant_client().delete(
+        collection_name=document_store.index,
+        points_selector=rest.FilterSelector(filter=parent_filter(parent_ids))
+    )
+
+
+async def delete_note_chunks_async(document_store, parent_ids: list):
+    """
+    Asynchronous version of `delete_note_chunks`.
+    """
+    if not parent_ids:
+        return
+
+    from model_registry import get_async_qdrant_client
+    async_client = await get_async_qdrant_client()
+    await async_client.delete(
+        collection_name=document_store.index,
+        points_selector=rest.FilterSelector(filter=parent_filter(parent_ids))
+    )
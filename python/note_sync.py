@@ -0,0 +1,390 @@
+"""
+Brings the Qdrant collection back in line with the notes table.
+
+The frontend embeds notes by calling the API on every save and delete; a
+crash, a lost request or a model change leaves the two out of step. The sync
+compares every note with a checkpoint table (NOTE_SYNC_STATE_TABLE) that
+records the hash of the content each note was last synced with, and the
+models that embedded it, and:
+
+  * embeds notes without an embeddings ID and stores the new ID on the note
+  * re-embeds the chunks of notes whose content changed (see note_chunks.py),
+    and every chunk after a change of the configured models, keeping the
+    notes' embeddings IDs
+  * deletes the embeddings of notes that were deleted since the last sync
+
+The notes table has no updated-at column, so the content hash is the change
+marker; unchanged notes cost one hash each. A note whose hash differs is
+first checked against its stored text, since the frontend has usually
+re-embedded it already, and only embedded if that text is stale. The
+checkpoint is written after every batch, so a re-run (or a run resumed after
+a crash) only does the remaining work. A full run (`--full`, and the first
+run against an empty checkpoint) also lists the collection's IDs to find
+missing and stray embeddings. Stray embeddings are only reported unless
+`--delete-strays` is given: the frontend embeds a new note before it saves the
+embeddings ID, so a stray may belong to a note that is being saved right now.
+Only pass it while the frontend is not running.
+
+A dry run only reads; the checkpoint table is created by the first applied sync.
+
+Usage (from the python/ directory):
+    python note_sync.py --dry-run
+    python note_sync.py
+    python note_sync.py --full
+    python note_sync.py --full --delete-strays
+"""
+import argparse
+import hashlib
+import json
+import time
+from config import (
+    DATABASE_TABLE_WITH_NOTES,
+    FASTEMBED_DENSE_MODEL,
+    FASTEMBED_SPARSE_MODEL,
+    NOTE_SYNC_STATE_TABLE,
+    NOTE_SYNC_BATCH_SIZE,
+    QDRANT_CONFIG
+)
+from database_utils import (
+    get_connection,
+    iter_rows,
+    transaction,
+    update_embeddings_ids
+)
+from markdown_to_plain import strip_markdown
+from model_registry import get_document_store, get_qdrant_client
+from note_chunks import delete_note_chunks
+from retrieval_cache import bump_collection_version
+
+
+# Recorded with every checkpoint row, so switching models re-embeds every note
+EMBEDDING_MODELS = f'{FASTEMBED_DENSE_MODEL}+{FASTEMBED_SPARSE_MODEL}'
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def sync_state_table_exists() -> bool:
+    return get_connection().execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (NOTE_SYNC_STATE_TABLE,)
+    ).fetchone() is not None
+
+
+def ensure_sync_state_table():
+    get_connection().execute(
+        f'CREATE TABLE IF NOT EXISTS {NOTE_SYNC_STATE_TABLE} ('
+        'note_id TEXT PRIMARY KEY, embeddings_id TEXT NOT NULL, content_hash TEXT NOT NULL, '
+        'models TEXT NOT NULL, synced_at REAL NOT NULL)'
+    )
+
+
+class SyncPlan:
+    """
+    The differences between the notes table and the collection found by `NoteSynchronizer.plan`.
+    """
+
+    def __init__(self):
+        self.new = []  # (note ID, content) of notes without embeddings
+        self.missing = []  # (note ID, embeddings ID, content) of notes whose embeddings are gone from the collection
+        self.outdated = []  # (note ID, embeddings ID, content) of notes embedded by other models
+        self.unverified = []  # (note ID, embeddings ID, content) whose stored text may already be current
+        self.orphans = set()  # Embeddings IDs of notes deleted since they were synced
+        self.strays = set()  # Embeddings IDs in the collection no note refers to (full sync only)
+        self.forgotten = []  # Note IDs in the checkpoint that no longer exist
+        self.unchanged = 0
+
+
+    def is_empty(self) -> bool:
+        return not (self.new or self.missing or self.outdated or self.unverified or self.orphans or self.forgotten)
+
+
+    def to_dict(self) -> dict:
+        return {
+            'new': len(self.new),
+            'missing_from_collection': len(self.missing),
+            'outdated_models': len(self.outdated),
+            'unverified': len(self.unverified),
+            'orphans': len(self.orphans),
+            'strays': len(self.strays),
+            'deleted_notes': len(self.forgotten),
+            'unchanged': self.unchanged
+        }
+
+
+class NoteSynchronizer:
+    """
+    Incrementally syncs note embeddings in Qdrant with the notes table, see the module docstring.
+    """
+
+    def __init__(self, batch_size: int = NOTE_SYNC_BATCH_SIZE):
+        """
+        :param batch_size: Notes embedded, verified or deleted per step; the checkpoint is written after each.
+        """
+        self.batch_size = batch_size
+        self.document_store = get_document_store()
+        self._indexer = None
+        self._embeddings_manager = None
+
+
+    @property
+    def indexer(self):
+        # Only build the embedding pipelines when something needs embedding
+        if self._indexer is None:
+            from indexer import Indexer
+            self._indexer = Indexer()
+        return self._indexer
+
+
+    @property
+    def embeddings_manager(self):
+        if self._embeddings_manager is None:
+            from embeddings_manager import EmbeddingsManager
+            self._embeddings_manager = EmbeddingsManager()
+        return self._embeddings_manager
+
+
+    def load_checkpoint(self) -> dict:
+        """
+        :return: Dictionary mapping note ID to the (embeddings ID, content hash, models) it was last synced with.
+                 Empty before the first applied sync.
+        """
+        if not sync_state_table_exists():
+            return {}
+        return {
+            row['note_id']: (row['embeddings_id'], row['content_hash'], row['models'])
+            for row in iter_rows(NOTE_SYNC_STATE_TABLE, ['note_id', 'embeddings_id', 'content_hash', 'models'])
+        }
+
+
+    def stored_note_ids(self) -> tuple:
+        """
+        Lists the notes in the collection, without reading vectors or content.
+
+        :return: Tuple of (set of note IDs whose first chunk is stored, set of note IDs with any chunk stored).
+        """
+        client = get_qdrant_client()
+        first_chunk_ids = set()
+        parent_ids = set()
+        offset = None
+        while True:
+            records, offset = client.scroll(
+                collection_name=QDRANT_CONFIG['index'],
+                limit=max(self.batch_size, 1000),
+                offset=offset,
+                with_payload=['id', 'meta.parent_id'],
+                with_vectors=False
+            )
+            for record in records:
+                document_id = record.payload['id']
+                parent_id = record.payload.get('meta', {}).get('parent_id', document_id)
+                parent_ids.add(parent_id)
+                if parent_id == document_id:
+                    first_chunk_ids.add(document_id)
+            if offset is None:
+                return first_chunk_ids, parent_ids
+
+
+    def plan(self, full: bool = False) -> SyncPlan:
+        """
+        Compares the notes table with the checkpoint (and, for a full sync, the collection).
+
+        :param full: Also check the collection for missing and stray embeddings. Implied when
+                     the checkpoint is empty.
+        :return: The SyncPlan describing what `apply` would do.
+        """
+        sync_plan = SyncPlan()
+        checkpoint = self.load_checkpoint()
+        stored_ids, stored_parent_ids = self.stored_note_ids() if full or not checkpoint else (None, None)
+        referenced_ids = set()
+
+        for note in iter_rows(DATABASE_TABLE_WITH_NOTES, ['id', 'content', 'embeddingsId']):
+            note_ID, content, embeddings_id = note['id'], note['content'] or '', note['embeddingsId'] or None
+            synced = checkpoint.pop(note_ID, None)
+
+            if embeddings_id is None:
+                sync_plan.new.append((note_ID, content))
+                continue
+
+            referenced_ids.add(embeddings_id)
+            if stored_ids is not None and embeddings_id not in stored_ids:
+                sync_plan.missing.append((note_ID, embeddings_id, content))
+            elif synced == (embeddings_id, content_hash(content), EMBEDDING_MODELS):
+                sync_plan.unchanged += 1
+            elif synced is not None and synced[2] != EMBEDDING_MODELS:
+                sync_plan.outdated.append((note_ID, embeddings_id, content))
+            else:
+                sync_plan.unverified.append((note_ID, embeddings_id, content))
+
+        # Whatever is left in the checkpoint belongs to notes that were deleted
+        sync_plan.forgotten = list(checkpoint)
+        sync_plan.orphans = {synced[0] for synced in checkpoint.values()} - referenced_ids
+        if stored_parent_ids is not None:
+            sync_plan.strays = stored_parent_ids - referenced_ids - sync_plan.orphans
+        return sync_plan
+
+
+    def _record(self, cursor, notes: list):
+        """
+        Writes checkpoint rows for (note ID, embeddings ID, content) tuples that were just synced.
+        """
+        synced_at = time.time()
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {NOTE_SYNC_STATE_TABLE} (note_id, embeddings_id, content_hash, models, synced_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [
+                (note_ID, embeddings_id, content_hash(content), EMBEDDING_MODELS, synced_at)
+                for note_ID, embeddings_id, content in notes
+            ]
+        )
+
+
+    def _verify(self, unverified: list) -> list:
+        """
+        Adopts embeddings whose stored text already matches the note (e.g. because
+        the frontend re-embedded it after an edit), without running the models.
+
+        :return: The (note ID, embeddings ID, content) tuples that need re-embedding.
+        """
+        stale = []
+        for start in range(0, len(unverified), self.batch_size):
+            batch = unverified[start:start + self.batch_size]
+            documents = {
+                document.id: document
+                for document in self.document_store.get_documents_by_id([embeddings_id for _, embeddings_id, _ in batch])
+            }
+
+            adopted = []
+            for note in batch:
+                document = documents.get(note[1])
+                if document is None or document.embedding is None:
+                    stale.append(note)
+                # Notes embedded before chunking existed carry no note hash
+                elif document.meta.get('note_hash') == content_hash(note[2]) or (
+                        'note_hash' not in document.meta and document.content == strip_markdown(note[2])):
+                    adopted.append(note)
+                else:
+                    stale.append(note)
+
+            with transaction() as cursor:
+                self._record(cursor, adopted)
+        return stale
+
+
+    def _embed_missing(self, notes: list):
+        """
+        Embeds (note ID, embeddings ID, content) tuples whose first chunk is gone from the
+        collection under their existing embeddings IDs, replacing any chunks that are left.
+        """
+        if not notes:
+            return
+        delete_note_chunks(self.document_store, [embeddings_id for _, embeddings_id, _ in notes])
+        self.indexer.embed_notes(
+            [content for _, _, content in notes],
+            self.batch_size,
+            existing_ids=[embeddings_id for _, embeddings_id, _ in notes]
+        )
+
+
+    def apply(self, sync_plan: SyncPlan, delete_strays: bool = False) -> dict:
+        """
+        Carries out a plan, checkpointing after every batch.
+
+        :param delete_strays: Also delete the plan's stray embeddings. Only safe while
+                              the frontend is not saving notes, see the module docstring.
+        :return: Dictionary with the number of notes embedded, re-embedded, adopted and embeddings deleted.
+        """
+        ensure_sync_state_table()
+        stale = self._verify(sync_plan.unverified)
+        report = {'embedded': 0, 're_embedded': 0, 'adopted': len(sync_plan.unverified) - len(stale), 'deleted': 0}
+        embedded_ids = set()
+
+        for start in range(0, len(sync_plan.new), self.batch_size):
+            batch = sync_plan.new[start:start + self.batch_size]
+            embeddings_ids = self.indexer.embed_notes([content for _, content in batch], self.batch_size)
+            synced = [(note_ID, embeddings_id, content) for (note_ID, content), embeddings_id in zip(batch, embeddings_ids)]
+
+            with transaction() as cursor:
+                update_embeddings_ids({note_ID: embeddings_id for note_ID, embeddings_id, _ in synced}, cursor)
+                self._record(cursor, synced)
+            report['embedded'] += len(batch)
+            embedded_ids.update(embeddings_ids)
+
+        # Changed notes only re-embed their changed chunks; other models need every chunk re-embedded
+        for notes, reuse_unchanged_chunks in ((stale, True), (sync_plan.outdated, False)):
+            for start in range(0, len(notes), self.batch_size):
+                batch = notes[start:start + self.batch_size]
+                updated_documents = self.embeddings_manager.update_embeddings(
+                    {embeddings_id: content for _, embeddings_id, content in batch},
+                    reuse_unchanged_chunks=reuse_unchanged_chunks
+                )
+                self._embed_missing([note for note in batch if note[1] not in updated_documents])
+                with transaction() as cursor:
+                    self._record(cursor, batch)
+                report['re_embedded'] += len(batch)
+
+        for start in range(0, len(sync_plan.missing), self.batch_size):
+            batch = sync_plan.missing[start:start + self.batch_size]
+            self._embed_missing(batch)
+            with transaction() as cursor:
+                self._record(cursor, batch)
+            report['re_embedded'] += len(batch)
+
+        # A new note may get the ID of a stray embedding of the same text (e.g. when the
+        # frontend crashed before saving the ID), which must then be kept
+        orphans = sorted((sync_plan.orphans | (sync_plan.strays if delete_strays else set())) - embedded_ids)
+        if orphans:
+            from folder_centroid_index import get_folder_centroid_index
+            folder_centroid_index = get_folder_centroid_index()
+            for start in range(0, len(orphans), self.batch_size):
+                batch = orphans[start:start + self.batch_size]
+                delete_note_chunks(self.document_store, batch)
+                for embeddings_id in batch:
+                    folder_centroid_index.note_deleted(embeddings_id)
+                report['deleted'] += len(batch)
+            bump_collection_version()
+
+        if sync_plan.forgotten:
+            with transaction() as cursor:
+                cursor.executemany(
+                    f'DELETE FROM {NOTE_SYNC_STATE_TABLE} WHERE note_id = ?',
+                    [(note_ID,) for note_ID in sync_plan.forgotten]
+                )
+
+        return report
+
+
+    def sync(self, full: bool = False, dry_run: bool = False, delete_strays: bool = False) -> dict:
+        """
+        Plans and (unless `dry_run`) applies a sync.
+
+        :param full: Also check the collection for missing and stray embeddings.
+        :param dry_run: Only report the differences.
+        :param delete_strays: Delete the stray embeddings a full sync finds, see `apply`.
+        :return: Dictionary with the plan and, if applied, what was done.
+        """
+        start_time = time.perf_counter()
+        sync_plan = self.plan(full)
+        result = {'plan': sync_plan.to_dict()}
+        has_work = not sync_plan.is_empty() or (delete_strays and sync_plan.strays)
+        if not dry_run and has_work:
+            result['applied'] = self.apply(sync_plan, delete_strays)
+        result['seconds'] = round(time.perf_counter() - start_time, 3)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would change.')
+    parser.add_argument('--full', action='store_true', help='Also check the collection for missing and stray embeddings.')
+    parser.add_argument('--delete-strays', action='store_true',
+                        help='Delete embeddings no note refers to. Only while the frontend is not running.')
+    parser.add_argument('--batch-size', type=int, default=NOTE_SYNC_BATCH_SIZE)
+    args = parser.parse_args()
+
+    result = NoteSynchronizer(args.batch_size).sync(full=args.full, dry_run=args.dry_run, delete_strays=args.delete_strays)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
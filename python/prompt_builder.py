@@ -1,9 +1,62 @@
-from jinja2 import Template
+import hashlib
+from jinja2 import Environment, FileSystemBytecodeCache, FunctionLoader
+from config import (
+    PROMPT_TEMPLATE_CACHE_DIRECTORY,
+    PROMPT_CHARS_PER_TOKEN
+)
+
+# Template sources by name; a template's name is a hash of its source
+_template_sources = {}
+
+# One environment for every prompt: templates are compiled once per process and
+# their bytecode is cached on disk, so later processes skip the compile step
+_environment = Environment(
+    loader=FunctionLoader(_template_sources.get),
+    bytecode_cache=FileSystemBytecodeCache(PROMPT_TEMPLATE_CACHE_DIRECTORY)
+)
+
+
+def get_template(template_str: str):
+    """
+    :return: The compiled template for `template_str`, compiled on first use only.
+    """
+    template_name = hashlib.blake2b(template_str.encode('utf-8'), digest_size=16).hexdigest()
+    _template_sources.setdefault(template_name, template_str)
+    return _environment.get_template(template_name)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimates the number of LLM tokens in a text, from PROMPT_CHARS_PER_TOKEN.
+
+    :return: Approximate token count.
+    """
+    return -(-len(text) // PROMPT_CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Shortens a text to about `max_tokens` tokens, cutting at a word boundary.
+
+    :param text: The text to shorten.
+    :param max_tokens: Token budget; None keeps the whole text.
+    :return: The text, with ' ...' appended if it was cut.
+    """
+    max_chars = max_tokens * PROMPT_CHARS_PER_TOKEN if max_tokens is not None else None
+    if max_chars is None or len(text) <= max_chars:
+        return text
+
+    truncated = text[:max_chars]
+    last_space = truncated.rfind(' ')
+    if last_space > max_chars // 2:
+        truncated = truncated[:last_space]
+    return truncated.rstrip() + ' ...'
+
 
 class PromptBuilder:
     def __init__(self, template_str):
-        # Initialize the Jinja2 template
-        self.template = Template(template_str)
+        # Look up the compiled Jinja2 template, compiling it if this is its first use
+        self.template = get_template(template_str)
 
     def render(self, **kwargs):
         # Render the template with dynamic arguments
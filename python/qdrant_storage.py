@@ -0,0 +1,166 @@
+"""
+Builds Qdrant collection and search settings from a storage profile in
+`config.QDRANT_STORAGE_PROFILES`, and migrates existing collections to a profile.
+
+Usage (from the python/ directory):
+    python qdrant_storage.py --profile scalar --dry-run
+    python qdrant_storage.py --profile scalar
+"""
+import argparse
+import json
+from qdrant_client.http import models as rest
+from haystack_integrations.document_stores.qdrant.converters import DENSE_VECTORS_NAME, SPARSE_VECTORS_NAME
+from config import (
+    QDRANT_CONFIG,
+    QDRANT_STORAGE_PROFILES,
+    QDRANT_STORAGE_PROFILE
+)
+
+
+def get_storage_profile(name: str = QDRANT_STORAGE_PROFILE) -> dict:
+    """
+    :param name: Name of a profile in QDRANT_STORAGE_PROFILES.
+    :return: The profile's settings.
+    :raises ValueError: If the profile doesn't exist.
+    """
+    if name not in QDRANT_STORAGE_PROFILES:
+        raise ValueError(f"Unknown Qdrant storage profile '{name}'. Choose one of: {', '.join(QDRANT_STORAGE_PROFILES)}.")
+    return QDRANT_STORAGE_PROFILES[name]
+
+
+def build_hnsw_config(profile: dict):
+    """
+    :return: HnswConfigDiff for the profile, or None to keep Qdrant's defaults.
+    """
+    hnsw = profile.get('hnsw')
+    return rest.HnswConfigDiff(**hnsw) if hnsw else None
+
+
+def build_quantization_config(profile: dict):
+    """
+    :return: Scalar or binary quantization config for the profile, or None for full-precision vectors.
+    """
+    quantization = profile.get('quantization')
+    if not quantization:
+        return None
+
+    if quantization['type'] == 'scalar':
+        return rest.ScalarQuantization(scalar=rest.ScalarQuantizationConfig(
+            type=rest.ScalarType.INT8,
+            quantile=quantization.get('quantile'),
+            always_ram=quantization.get('always_ram')
+        ))
+    if quantization['type'] == 'binary':
+        return rest.BinaryQuantization(binary=rest.BinaryQuantizationConfig(
+            always_ram=quantization.get('always_ram')
+        ))
+    raise ValueError(f"Unsupported quantization type '{quantization['type']}'.")
+
+
+def build_search_params(profile: dict):
+    """
+    :return: SearchParams applied to dense vector queries, or None for Qdrant's defaults.
+    """
+    search = profile.get('search')
+    if not search:
+        return None
+
+    quantization = None
+    if profile.get('quantization'):
+        quantization = rest.QuantizationSearchParams(
+            rescore=search.get('rescore', True),
+            oversampling=search.get('oversampling')
+        )
+    return rest.SearchParams(hnsw_ef=search.get('hnsw_ef'), quantization=quantization)
+
+
+def document_store_arguments(profile: dict) -> dict:
+    """
+    Translates a profile into QdrantDocumentStore arguments, used when the store creates the collection.
+
+    :return: Dictionary of keyword arguments for QdrantDocumentStore.
+    """
+    return {
+        'on_disk': profile.get('on_disk', False),
+        'on_disk_payload': profile.get('on_disk_payload'),
+        'hnsw_config': build_hnsw_config(profile),
+        'quantization_config': build_quantization_config(profile)
+    }
+
+
+def migrate_collection(client, collection_name: str, profile: dict, dry_run: bool = False) -> dict:
+    """
+    Applies a storage profile to an existing collection in place, and creates the payload
+    indexes in QDRANT_CONFIG that are missing. Qdrant rebuilds the affected indexes in
+    the background; no documents need to be re-embedded.
+
+    :param client: QdrantClient connected to the server holding the collection.
+    :param collection_name: Name of the collection to migrate.
+    :param profile: The target storage profile.
+    :param dry_run: If True, only report the current and target settings.
+    :return: Dictionary with the collection's 'current' and 'target' settings.
+    """
+    collection_info = client.get_collection(collection_name)
+    dense_params = collection_info.config.params.vectors
+    if isinstance(dense_params, dict):
+        dense_params = dense_params.get(DENSE_VECTORS_NAME)
+
+    quantization_config = build_quantization_config(profile)
+    hnsw_config = build_hnsw_config(profile)
+
+    report = {
+        'current': {
+            'on_disk': getattr(dense_params, 'on_disk', None),
+            'on_disk_payload': collection_info.config.params.on_disk_payload,
+            'hnsw': collection_info.config.hnsw_config.model_dump(exclude_none=True),
+            'quantization': (
+                collection_info.config.quantization_config.model_dump(exclude_none=True)
+                if collection_info.config.quantization_config else None
+            ),
+            'payload_indexes': sorted(collection_info.payload_schema)
+        },
+        'target': profile
+    }
+    if dry_run:
+        return report
+
+    has_sparse_vectors = bool(collection_info.config.params.sparse_vectors)
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={DENSE_VECTORS_NAME if has_sparse_vectors else '': rest.VectorParamsDiff(
+            on_disk=profile.get('on_disk', False)
+        )},
+        sparse_vectors_config={SPARSE_VECTORS_NAME: rest.SparseVectorParams(
+            index=rest.SparseIndexParams(on_disk=profile.get('on_disk', False))
+        )} if has_sparse_vectors else None,
+        collection_params=rest.CollectionParamsDiff(on_disk_payload=profile.get('on_disk_payload', False)),
+        hnsw_config=hnsw_config,
+        # Explicitly disable quantization when moving back to full precision
+        quantization_config=quantization_config or rest.Disabled.DISABLED
+    )
+    for payload_index in QDRANT_CONFIG.get('payload_fields_to_index') or []:
+        if payload_index['field_name'] not in collection_info.payload_schema:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=payload_index['field_name'],
+                field_schema=payload_index['field_schema']
+            )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', default=QDRANT_STORAGE_PROFILE, choices=list(QDRANT_STORAGE_PROFILES))
+    parser.add_argument('--collection', default=QDRANT_CONFIG['index'])
+    parser.add_argument('--dry-run', action='store_true', help='Only show the current and target settings.')
+    args = parser.parse_args()
+
+    from model_registry import get_qdrant_client
+    report = migrate_collection(get_qdrant_client(), args.collection, get_storage_profile(args.profile), args.dry_run)
+    print(json.dumps(report, indent=2, default=str))
+    if not args.dry_run:
+        print(f"Collection '{args.collection}' is being migrated to the '{args.profile}' profile.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+
+_collection_version = 0
+_collection_version_lock = threading.Lock()
+
+
+def collection_version() -> int:
+    """
+    Returns the current version of the Qdrant collection. It changes whenever
+    this process writes or deletes embeddings, see `bump_collection_version`.
+
+    :return: The collection version counter.
+    """
+    return _collection_version
+
+
+def bump_collection_version():
+    """
+    Marks the collection as changed, so cached retrieval results computed
+    against the previous version are no longer used.
+    """
+    global _collection_version
+
+    with _collection_version_lock:
+        _collection_version += 1
+
+
+def copy_documents(documents: list) -> list:
+    """
+    Copies Documents with their own `meta` dictionary, so callers that annotate
+    results (e.g. with a folder name) never modify a cached entry.
+    """
+    return [replace(document, meta=dict(document.meta)) for document in documents]
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory least-recently-used cache whose entries also expire
+    after a fixed time to live. Optionally also bounded by the total size of its values.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_total_size: int = None, size_of=len):
+        """
+        :param max_entries: Maximum number of entries to keep before evicting the least recently used.
+        :param ttl_seconds: Seconds after which an entry is no longer returned.
+        :param max_total_size: Maximum sum of `size_of(value)` over the entries, or None for no limit.
+        :param size_of: Callable returning the size of a value, used with `max_total_size`.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_total_size = max_total_size
+        self.size_of = size_of
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._total_size = 0
+        self._lock = threading.Lock()
+
+
+    def get(self, key):
+        """
+        :return: The cached value, or None if the key is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            size = self.size_of(value) if self.max_total_size is not None else 0
+            if self.max_total_size is not None and size > self.max_total_size:
+                return
+
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, size)
+            self._total_size += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_total_size is not None and self._total_size > self.max_total_size):
+                self._remove(next(iter(self._entries)))
+
+
+    def _remove(self, key):
+        """
+        Drops an entry. Must be called with the lock held.
+        """
+        self._total_size -= self._entries.pop(key)[2]
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_size = 0
+
+
+    def stats(self) -> dict:
+        """
+        :return: Dictionary with hit/miss counters, hit rate and size.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'total_size': self._total_size if self.max_total_size is not None else None,
+                'max_total_size': self.max_total_size,
+                'ttl_seconds': self.ttl_seconds
+            }
@@ -1,17 +1,32 @@
-from haystack import Pipeline
-from haystack_integrations.components.retrievers.qdrant import QdrantHybridRetriever
-from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
-from haystack_integrations.components.embedders.fastembed import (
-        FastembedTextEmbedder,
-        FastembedSparseTextEmbedder
+import asyncio
+from haystack_integrations.document_stores.qdrant.converters import (
+        DENSE_VECTORS_NAME,
+        SPARSE_VECTORS_NAME,
+        convert_qdrant_point_to_haystack_document
         )
+from qdrant_client.http import models as rest
 from config import (
-        QDRANT_CONFIG,
+        CHUNK_CANDIDATE_MULTIPLIER,
         QDRANT_TOP_K_RESULTS,
-        FASTEMBED_DENSE_MODEL,
-        FASTEMBED_SPARSE_MODEL,
-        FASTEMBED_CACHE_DIRECTORY
+        QDRANT_USE_ASYNC_CLIENT,
+        RETRIEVAL_FUSION_MODE,
+        QUERY_EMBEDDING_CACHE_MAX_ENTRIES,
+        QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+        RETRIEVAL_RESULT_CACHE_MAX_ENTRIES,
+        RETRIEVAL_RESULT_CACHE_TTL_SECONDS
         )
+from model_registry import (
+        get_document_store,
+        get_qdrant_client,
+        get_async_qdrant_client,
+        get_reranker,
+        dense_text_embedder,
+        sparse_text_embedder
+        )
+from retrieval_cache import TTLCache, collection_version, copy_documents
+from hybrid_fusion import ClientHybridRetriever
+from note_chunks import aggregate_by_parent
+from qdrant_storage import get_storage_profile, build_search_params
 
 
 CONTENT_PREVIEW_LIMIT = 100  # Character limit for content preview display
@@ -19,52 +34,65 @@ CONTENT_PREVIEW_LIMIT = 100  # Character limit for content preview display
 
 class HybridRetrieverPipeline:
     """
-    Encapsulates a Haystack pipeline that uses dense and sparse FastEmbed models
-    with a Qdrant backend for hybrid document retrieval.
-    """
-
-    def __init__(self):
-        """Initialize the document store, hybrid retriever, and pipeline."""
-        self.document_store = QdrantDocumentStore(**QDRANT_CONFIG)
+    Hybrid document retrieval with dense and sparse FastEmbed models and a Qdrant backend.
 
-        self.hybrid_retriever = QdrantHybridRetriever(
-                document_store=self.document_store,
-                top_k=QDRANT_TOP_K_RESULTS
-                )
+    Notes are stored as chunks (see note_chunks.py); every search retrieves
+    CHUNK_CANDIDATE_MULTIPLIER times as many chunks as notes requested and
+    aggregates them to one result per note, carrying the note's ID.
 
-        self.pipeline = self._initialize_pipeline()
+    With RETRIEVAL_FUSION_MODE = 'client', the dense and sparse searches are
+    fused here instead of in Qdrant, optionally with reranking (see hybrid_fusion.py).
 
-    def _initialize_pipeline(self) -> Pipeline:
-        """
-        Set up the Haystack pipeline with dense and sparse embedders and connect them to the hybrid retriever.
+    Query embeddings and retrieval results are cached in memory. Result entries
+    are keyed by the collection version, so they stop being used as soon as
+    embeddings are written or deleted (see `retrieval_cache.bump_collection_version`).
+    """
 
-        :return: Configured Pipeline instance.
-        """
-        pipeline = Pipeline()
+    def __init__(self):
+        """Initialize the document store, query embedders and hybrid retriever."""
+        self.document_store = get_document_store()
 
         # Dense embedder with prompt prefix
-        dense_embedder = FastembedTextEmbedder(
-                model=FASTEMBED_DENSE_MODEL,
-                cache_dir=FASTEMBED_CACHE_DIRECTORY,
+        self.dense_embedder = dense_text_embedder(
                 prefix="Identify the passage most semantically similar to: "
                 )
 
         # Sparse embedder
-        sparse_embedder = FastembedSparseTextEmbedder(
-                model=FASTEMBED_SPARSE_MODEL,
-                cache_dir=FASTEMBED_CACHE_DIRECTORY
-                )
+        self.sparse_embedder = sparse_text_embedder()
 
-        # Register components
-        pipeline.add_component("dense_text_embedder", dense_embedder)
-        pipeline.add_component("sparse_text_embedder", sparse_embedder)
-        pipeline.add_component("retriever", self.hybrid_retriever)
+        # HNSW ef and quantization rescoring of the configured storage profile
+        self.search_params = build_search_params(get_storage_profile())
 
-        # Connect embedders to the hybrid retriever
-        pipeline.connect("dense_text_embedder.embedding", "retriever.query_embedding")
-        pipeline.connect("sparse_text_embedder.sparse_embedding", "retriever.query_sparse_embedding")
+        self.client_fusion = RETRIEVAL_FUSION_MODE == 'client'
+        if self.client_fusion:
+            self.hybrid_retriever = ClientHybridRetriever(
+                    document_store=self.document_store,
+                    top_k=QDRANT_TOP_K_RESULTS * CHUNK_CANDIDATE_MULTIPLIER,
+                    reranker=get_reranker(),
+                    search_params=self.search_params
+                    )
+        else:
+            # Server-side fusion builds its Qdrant queries here (see `_hybrid_prefetch`)
+            self.hybrid_retriever = None
 
-        return pipeline
+        self.query_embedding_cache = TTLCache(QUERY_EMBEDDING_CACHE_MAX_ENTRIES, QUERY_EMBEDDING_CACHE_TTL_SECONDS)
+        self.result_cache = TTLCache(RETRIEVAL_RESULT_CACHE_MAX_ENTRIES, RETRIEVAL_RESULT_CACHE_TTL_SECONDS)
+
+    def embed_query(self, query_text: str) -> tuple:
+        """
+        Embed a query with the dense and sparse models, reusing cached embeddings of repeated queries.
+
+        :param query_text: Input query string.
+        :return: Tuple of (dense embedding, sparse embedding).
+        """
+        embeddings = self.query_embedding_cache.get(query_text)
+        if embeddings is None:
+            embeddings = (
+                self.dense_embedder.run(text=query_text)["embedding"],
+                self.sparse_embedder.run(text=query_text)["sparse_embedding"]
+                )
+            self.query_embedding_cache.put(query_text, embeddings)
+        return embeddings
 
     def retrieve_by_query(self, query_text: str):
         """
@@ -73,11 +101,35 @@ class HybridRetrieverPipeline:
         :param query_text: Input query string.
         :return: List of retrieved Document objects.
         """
-        result = self.pipeline.run({
-            "dense_text_embedder": {"text": query_text},
-            "sparse_text_embedder": {"text": query_text}
-            })
-        return result["retriever"]["documents"]
+        # Read the version before searching, so results that race with a write are filed under the old version
+        cache_key = ("query", query_text, collection_version())
+        cached_docs = self.result_cache.get(cache_key)
+        if cached_docs is not None:
+            return copy_documents(cached_docs)
+
+        query_embedding, query_sparse_embedding = self.embed_query(query_text)
+        if self.client_fusion:
+            # The client-side retriever reranks with the query text
+            retrieved_chunks = self.hybrid_retriever.run(
+                query_embedding=query_embedding,
+                query_sparse_embedding=query_sparse_embedding,
+                query_text=query_text
+                )["documents"]
+        else:
+            candidate_limit = QDRANT_TOP_K_RESULTS * CHUNK_CANDIDATE_MULTIPLIER
+            response = get_qdrant_client().query_points(
+                collection_name=self.document_store.index,
+                prefetch=self._hybrid_prefetch(query_embedding, query_sparse_embedding, candidate_limit),
+                query=rest.FusionQuery(fusion=rest.Fusion.RRF),
+                limit=candidate_limit,
+                with_payload=True,
+                with_vectors=False
+                )
+            retrieved_chunks = self._chunks_from_responses([response])[0]
+        retrieved_docs = aggregate_by_parent(retrieved_chunks, QDRANT_TOP_K_RESULTS)
+
+        self.result_cache.put(cache_key, retrieved_docs)
+        return copy_documents(retrieved_docs)
 
     def retrieve_similar_to_document(self, doc_id: str):
         """
@@ -86,33 +138,234 @@ class HybridRetrieverPipeline:
         :param doc_id: ID of the reference document.
         :return: List of dictionaries, each containing the ID and similarity score of a similar document (excluding the original).
         """
-        documents = self.document_store.get_documents_by_id([doc_id])
-        if not documents:
-            raise ValueError(f"Document with ID '{doc_id}' not found.")
+        similar_docs = self.retrieve_similar_documents(doc_id)
 
-        reference_doc = documents[0]
+        if not similar_docs:
+            raise ValueError(f"No similar documents found for document ID: {doc_id}")
 
-        # Ensure embeddings are loaded before retrieval
-        _ = reference_doc.embedding
-        _ = reference_doc.sparse_embedding
+        # Return list of dicts with ID and score
+        return [{'id': doc.id, 'score': doc.score} for doc in similar_docs]
 
-        retrieval_result = self.hybrid_retriever.run(
-            query_embedding=reference_doc.embedding,
-            query_sparse_embedding=reference_doc.sparse_embedding,
-            top_k=QDRANT_TOP_K_RESULTS + 1  # Retrieve extra to account for the reference doc
-        )
+    async def retrieve_similar_to_document_async(self, doc_id: str):
+        """
+        Asynchronous version of `retrieve_similar_to_document`.
 
-        retrieved_docs = retrieval_result.get("documents", [])
+        :param doc_id: ID of the reference document.
+        :return: List of dictionaries, each containing the ID and similarity score of a similar document (excluding the original).
+        """
+        similar_docs = await self.retrieve_similar_documents_async(doc_id)
 
-        if len(retrieved_docs) <= 1:
+        if not similar_docs:
             raise ValueError(f"No similar documents found for document ID: {doc_id}")
 
-        # Return list of dicts with ID and score, excluding the reference doc
+        return [{'id': doc.id, 'score': doc.score} for doc in similar_docs]
+
+    def retrieve_similar_documents(self, doc_id: str, top_k: int = QDRANT_TOP_K_RESULTS):
+        """
+        Retrieve the Document objects most similar to the given document ID, using its dense and sparse embeddings.
+
+        :param doc_id: ID of the reference document.
+        :param top_k: Maximum number of similar documents to return.
+        :return: List of retrieved Document objects (excluding the original), best match first.
+        """
+        # A batch of one, so the storage profile's search parameters apply here too
+        similar_docs_by_id = self.retrieve_similar_documents_batch([doc_id], top_k)
+        if doc_id not in similar_docs_by_id:
+            raise ValueError(f"Document with ID '{doc_id}' not found.")
+        return similar_docs_by_id[doc_id]
+
+    async def retrieve_similar_documents_async(self, doc_id: str, top_k: int = QDRANT_TOP_K_RESULTS):
+        """
+        Asynchronous version of `retrieve_similar_documents`, using the asynchronous
+        Qdrant client so the event loop never blocks on Qdrant.
+
+        :param doc_id: ID of the reference document.
+        :param top_k: Maximum number of similar documents to return.
+        :return: List of retrieved Document objects (excluding the original), best match first.
+        """
+        similar_docs_by_id = await self.retrieve_similar_documents_batch_async([doc_id], top_k)
+        if doc_id not in similar_docs_by_id:
+            raise ValueError(f"Document with ID '{doc_id}' not found.")
+        return similar_docs_by_id[doc_id]
+
+    def retrieve_similar_to_documents(self, doc_ids: list, top_k: int = QDRANT_TOP_K_RESULTS) -> dict:
+        """
+        Retrieve documents similar to each of many documents, with one read of the
+        reference vectors and one Qdrant batch query for every ID not already cached.
+
+        :param doc_ids: IDs of the reference documents.
+        :param top_k: Maximum number of similar documents per reference document.
+        :return: Dictionary mapping each ID to a list of dictionaries with the ID and similarity score
+                 of a similar document. IDs that are not in the store map to an empty list.
+        """
+        similar_docs_by_id = self.retrieve_similar_documents_batch(doc_ids, top_k)
+        return {
+            doc_id: [{'id': doc.id, 'score': doc.score} for doc in similar_docs_by_id.get(doc_id, [])]
+            for doc_id in doc_ids
+        }
+
+    async def retrieve_similar_to_documents_async(self, doc_ids: list, top_k: int = QDRANT_TOP_K_RESULTS) -> dict:
+        """
+        Asynchronous version of `retrieve_similar_to_documents`.
+        """
+        similar_docs_by_id = await self.retrieve_similar_documents_batch_async(doc_ids, top_k)
+        return {
+            doc_id: [{'id': doc.id, 'score': doc.score} for doc in similar_docs_by_id.get(doc_id, [])]
+            for doc_id in doc_ids
+        }
+
+    def _lookup_cached_batch(self, doc_ids: list, top_k: int, version: int) -> tuple:
+        """
+        :return: Tuple of (dictionary of cached results by ID, list of IDs that still need a search).
+        """
+        similar_docs_by_id = {}
+        missing_ids = []
+        for doc_id in dict.fromkeys(doc_ids):
+            cached_docs = self.result_cache.get(("similar", doc_id, top_k, version))
+            if cached_docs is not None:
+                similar_docs_by_id[doc_id] = copy_documents(cached_docs)
+            else:
+                missing_ids.append(doc_id)
+        return similar_docs_by_id, missing_ids
+
+    def _hybrid_prefetch(self, dense_embedding: list, sparse_embedding, limit: int) -> list:
+        """
+        Builds the sparse and dense prefetches of a hybrid query, to be fused with Reciprocal Rank Fusion.
+        Each prefetch needs the query's depth, or Qdrant caps it at its default of 10,
+        and the dense one searches with the storage profile's parameters.
+        """
+        return [
+            rest.Prefetch(
+                query=rest.SparseVector(
+                    indices=sparse_embedding.indices,
+                    values=sparse_embedding.values
+                    ),
+                using=SPARSE_VECTORS_NAME,
+                limit=limit
+                ),
+            rest.Prefetch(
+                query=dense_embedding,
+                using=DENSE_VECTORS_NAME,
+                params=self.search_params,
+                limit=limit
+                )
+            ]
+
+    def _batch_query_requests(self, reference_docs: list, top_k: int) -> list:
+        """
+        Builds one hybrid (sparse + dense, fused with Reciprocal Rank Fusion) query per reference document.
+        A note is represented by its first chunk, whose ID is the note's embeddings ID.
+        """
+        # Retrieve extra to account for the reference note's chunks and several chunks per note
+        candidate_limit = (top_k + 1) * CHUNK_CANDIDATE_MULTIPLIER
+        return [
+            rest.QueryRequest(
+                prefetch=self._hybrid_prefetch(doc.embedding, doc.sparse_embedding, candidate_limit),
+                query=rest.FusionQuery(fusion=rest.Fusion.RRF),
+                limit=candidate_limit,
+                with_payload=True,
+                with_vector=False
+                )
+            for doc in reference_docs
+            ]
+
+    def _chunks_from_responses(self, responses: list) -> list:
+        """
+        :return: List of the chunk Documents of each batch query response.
+        """
+        return [
+            [
+                convert_qdrant_point_to_haystack_document(point, use_sparse_embeddings=self.document_store.use_sparse_embeddings)
+                for point in response.points
+                ]
+            for response in responses
+            ]
+
+    def _fuse_client_results(self, dense_results: list, sparse_results: list) -> list:
+        """
+        :return: List of the fused chunk Documents of each reference document (client fusion only).
+        """
         return [
-            {'id': doc.id, 'score': doc.score}
-            for doc in retrieved_docs
-            if doc.id != doc_id
-        ]
+            self.hybrid_retriever.fuse(dense_chunks, sparse_chunks)
+            for dense_chunks, sparse_chunks in zip(dense_results, sparse_results)
+            ]
+
+    def _store_batch_results(self, reference_docs: list, chunk_lists: list, top_k: int, version: int,
+                             similar_docs_by_id: dict):
+        """
+        Folds the chunks found for each reference document into one Document per note, caching and collecting them by reference ID.
+        """
+        for reference_doc, similar_chunks in zip(reference_docs, chunk_lists):
+            # Exclude the reference note's own chunks
+            similar_docs = aggregate_by_parent(similar_chunks, top_k, exclude_parent_id=reference_doc.id)
+            self.result_cache.put(("similar", reference_doc.id, top_k, version), similar_docs)
+            similar_docs_by_id[reference_doc.id] = copy_documents(similar_docs)
+
+    def retrieve_similar_documents_batch(self, doc_ids: list, top_k: int = QDRANT_TOP_K_RESULTS) -> dict:
+        """
+        Retrieve the Document objects most similar to each of many documents.
+
+        :param doc_ids: IDs of the reference documents.
+        :param top_k: Maximum number of similar documents per reference document.
+        :return: Dictionary mapping each ID found in the store to its similar Documents, best match first.
+        """
+        version = collection_version()
+        similar_docs_by_id, missing_ids = self._lookup_cached_batch(doc_ids, top_k, version)
+        if not missing_ids:
+            return similar_docs_by_id
+
+        reference_docs = [
+            doc for doc in self.document_store.get_documents_by_id(missing_ids)
+            if doc.embedding is not None and doc.sparse_embedding is not None
+            ]
+        if reference_docs and self.client_fusion:
+            dense_results, sparse_results = self.hybrid_retriever.search(
+                [(doc.embedding, doc.sparse_embedding) for doc in reference_docs],
+                min_candidates=(top_k + 1) * CHUNK_CANDIDATE_MULTIPLIER
+                )
+            chunk_lists = self._fuse_client_results(dense_results, sparse_results)
+            self._store_batch_results(reference_docs, chunk_lists, top_k, version, similar_docs_by_id)
+        elif reference_docs:
+            responses = get_qdrant_client().query_batch_points(
+                collection_name=self.document_store.index,
+                requests=self._batch_query_requests(reference_docs, top_k)
+                )
+            self._store_batch_results(reference_docs, self._chunks_from_responses(responses), top_k, version, similar_docs_by_id)
+
+        return similar_docs_by_id
+
+    async def retrieve_similar_documents_batch_async(self, doc_ids: list, top_k: int = QDRANT_TOP_K_RESULTS) -> dict:
+        """
+        Asynchronous version of `retrieve_similar_documents_batch`.
+        """
+        if not QDRANT_USE_ASYNC_CLIENT:
+            return await asyncio.to_thread(self.retrieve_similar_documents_batch, doc_ids, top_k)
+
+        version = collection_version()
+        similar_docs_by_id, missing_ids = self._lookup_cached_batch(doc_ids, top_k, version)
+        if not missing_ids:
+            return similar_docs_by_id
+
+        reference_docs = [
+            doc for doc in await self.document_store.get_documents_by_id_async(missing_ids)
+            if doc.embedding is not None and doc.sparse_embedding is not None
+            ]
+        if reference_docs and self.client_fusion:
+            dense_results, sparse_results = await self.hybrid_retriever.search_async(
+                [(doc.embedding, doc.sparse_embedding) for doc in reference_docs],
+                min_candidates=(top_k + 1) * CHUNK_CANDIDATE_MULTIPLIER
+                )
+            chunk_lists = self._fuse_client_results(dense_results, sparse_results)
+            self._store_batch_results(reference_docs, chunk_lists, top_k, version, similar_docs_by_id)
+        elif reference_docs:
+            async_client = await get_async_qdrant_client()
+            responses = await async_client.query_batch_points(
+                collection_name=self.document_store.index,
+                requests=self._batch_query_requests(reference_docs, top_k)
+                )
+            self._store_batch_results(reference_docs, self._chunks_from_responses(responses), top_k, version, similar_docs_by_id)
+
+        return similar_docs_by_id
 
 if __name__ == "__main__":
     retriever = HybridRetrieverPipeline()
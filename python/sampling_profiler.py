@@ -0,0 +1,106 @@
+"""
+Opt-in sampling profiler that writes flame-graph data for slow requests.
+
+A background thread samples the stack of every thread each
+PROFILER_INTERVAL_MS and keeps the recent samples. When a request takes
+longer than PROFILER_SLOW_REQUEST_SECONDS, the samples taken while it ran
+are written to PROFILER_OUTPUT_DIRECTORY in the folded-stack format read by
+flamegraph.pl, speedscope and inferno. Every thread is sampled, so the file
+also shows concurrent requests and idle threads; each stack starts with its
+thread's name to tell them apart.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from config import (
+    PROFILER_INTERVAL_MS,
+    PROFILER_MAX_SAMPLES,
+    PROFILER_OUTPUT_DIRECTORY,
+    PROFILER_SLOW_REQUEST_SECONDS
+)
+
+
+def _folded_stack(frame) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread in the background, see the module docstring.
+    """
+
+    def __init__(self, interval_ms: float = PROFILER_INTERVAL_MS, max_samples: int = PROFILER_MAX_SAMPLES,
+                 output_directory: str = PROFILER_OUTPUT_DIRECTORY,
+                 slow_request_seconds: float = PROFILER_SLOW_REQUEST_SECONDS):
+        """
+        :param interval_ms: Time between two samples.
+        :param max_samples: Number of recent samples kept; older ones are dropped.
+        :param output_directory: Where the folded stacks of slow requests are written.
+        :param slow_request_seconds: Requests taking at least this long are dumped.
+        """
+        self.interval_seconds = interval_ms / 1000
+        self.output_directory = output_directory
+        self.slow_request_seconds = slow_request_seconds
+        self.dumps = 0
+        self._samples = deque(maxlen=max_samples)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+
+    def start(self):
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+
+    def _run(self):
+        own_thread_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval_seconds):
+            sampled_at = time.perf_counter()
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_thread_id:
+                    thread_name = thread_names.get(thread_id, str(thread_id))
+                    self._samples.append((sampled_at, f'{thread_name};{_folded_stack(frame)}'))
+
+
+    def dump_if_slow(self, label: str, started_at: float, finished_at: float) -> str:
+        """
+        Writes the samples taken between `started_at` and `finished_at` (perf_counter
+        times) if that span is at least `slow_request_seconds` long.
+
+        :param label: Describes the request, e.g. 'GET /suggest_folder'; used in the file name.
+        :return: Path of the written file, or None.
+        """
+        if self._thread is None or finished_at - started_at < self.slow_request_seconds:
+            return None
+
+        stacks = Counter(stack for sampled_at, stack in list(self._samples) if started_at <= sampled_at <= finished_at)
+        if not stacks:
+            return None
+
+        os.makedirs(self.output_directory, exist_ok=True)
+        safe_label = re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')
+        duration_ms = round((finished_at - started_at) * 1000)
+        path = os.path.join(self.output_directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{safe_label}-{duration_ms}ms.folded')
+        with open(path, 'w') as output_file:
+            for stack, count in stacks.most_common():
+                output_file.write(f'{stack} {count}\n')
+        self.dumps += 1
+        return path
@@ -0,0 +1,70 @@
+"""
+Checks the timing and index setup of the SQLite layer.
+"""
+import sqlite3
+import pytest
+import database_utils
+from database_utils import TimedConnection, get_connection, is_transaction_control
+from instrumentation import start_request_spans, finish_request_spans
+
+
+@pytest.fixture
+def query_spans():
+    token, spans = start_request_spans()
+    yield lambda: [name for name, _ in spans if name == 'sqlite_query']
+    finish_request_spans(token)
+
+
+def test_connection_shortcuts_are_timed(query_spans):
+    database_connection = sqlite3.connect(':memory:', isolation_level=None, factory=TimedConnection)
+    database_connection.execute('CREATE TABLE notes (id TEXT)')
+    database_connection.executemany('INSERT INTO notes VALUES (?)', [('a',), ('b',)])
+    assert database_connection.execute('SELECT count(*) FROM notes').fetchone() == (2,)
+    database_connection.cursor().execute('SELECT id FROM notes')
+    assert len(query_spans()) == 4
+
+
+def test_transaction_control_is_not_timed(query_spans):
+    database_connection = sqlite3.connect(':memory:', isolation_level=None, factory=TimedConnection)
+    cursor = database_connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    cursor.execute('CREATE TABLE notes (id TEXT)')
+    cursor.execute('commit;')
+    database_connection.execute('BEGIN')
+    database_connection.execute('ROLLBACK')
+    assert len(query_spans()) == 1
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ('BEGIN IMMEDIATE', True),
+    ('  commit', True),
+    ('ROLLBACK;', True),
+    ('SAVEPOINT sync', True),
+    ('RELEASE sync', True),
+    ('SELECT 1', False),
+    ('UPDATE notes SET folderId = ?', False),
+    ('', False),
+])
+def test_is_transaction_control(sql, expected):
+    assert is_transaction_control(sql) == expected
+
+
+def _index_names(database_connection) -> set:
+    return {row[0] for row in database_connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_indexes_are_retried_until_the_tables_exist(tmp_path, monkeypatch):
+    monkeypatch.setattr(database_utils, 'DATABASE_PATH', str(tmp_path / 'notes.db'))
+    monkeypatch.setattr(database_utils, 'INDEX_RETRY_SECONDS', 0)
+    monkeypatch.setattr(database_utils, '_indexed_database_paths', set())
+    monkeypatch.setattr(database_utils, '_index_attempted_at', {})
+
+    # The frontend hasn't created the notes table yet
+    database_connection = get_connection()
+    assert _index_names(database_connection) == set()
+
+    database_connection.execute('CREATE TABLE notes (id TEXT, folderId TEXT, embeddingsId TEXT)')
+    assert get_connection() is database_connection
+    assert _index_names(database_connection) == {index_name for index_name, _, _ in database_utils.DATABASE_INDEXES}
+    assert str(tmp_path / 'notes.db') in database_utils._indexed_database_paths
+    database_connection.close()
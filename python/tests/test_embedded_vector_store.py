@@ -0,0 +1,285 @@
+"""
+Checks EmbeddedVectorClient against qdrant-client's local mode, which implements
+Qdrant's search, fusion, filter and scroll semantics in Python.
+
+Usage (from the python/ directory):
+    python -m pytest tests
+"""
+import uuid
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+from haystack_integrations.document_stores.qdrant.converters import DENSE_VECTORS_NAME, SPARSE_VECTORS_NAME
+import embedded_vector_store
+from embedded_vector_store import EmbeddedVectorClient
+
+COLLECTION = 'Test'
+DIMENSION = 8
+VOCABULARY_SIZE = 50
+
+
+def _point_id(number: int) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, str(number)))
+
+
+def _points(count: int, seed: int = 0, first: int = 0) -> list:
+    """
+    :return: PointStructs with a dense and a sparse vector, a parent ID shared by
+             every three points and a folder out of four.
+    """
+    generator = np.random.default_rng(seed)
+    points = []
+    for number in range(first, first + count):
+        terms = np.sort(generator.choice(VOCABULARY_SIZE, size=5, replace=False))
+        points.append(rest.PointStruct(
+            id=_point_id(number),
+            vector={
+                DENSE_VECTORS_NAME: generator.normal(size=DIMENSION).tolist(),
+                SPARSE_VECTORS_NAME: rest.SparseVector(
+                    indices=terms.tolist(), values=generator.uniform(0.1, 1.0, size=len(terms)).tolist()
+                )
+            },
+            payload={'content': f'note {number}', 'meta': {'parent_id': f'parent-{number // 3}', 'folder': f'folder-{number % 4}'}}
+        ))
+    return points
+
+
+def _query_vectors(seed: int) -> tuple:
+    generator = np.random.default_rng(seed)
+    terms = np.sort(generator.choice(VOCABULARY_SIZE, size=6, replace=False))
+    return (
+        generator.normal(size=DIMENSION).tolist(),
+        rest.SparseVector(indices=terms.tolist(), values=generator.uniform(0.1, 1.0, size=len(terms)).tolist())
+    )
+
+
+def _hybrid_query(client, dense, sparse, limit: int, prefetch_limit: int, query_filter=None) -> list:
+    return client.query_points(
+        collection_name=COLLECTION,
+        prefetch=[
+            rest.Prefetch(query=sparse, using=SPARSE_VECTORS_NAME, limit=prefetch_limit),
+            rest.Prefetch(query=dense, using=DENSE_VECTORS_NAME, limit=prefetch_limit)
+        ],
+        query=rest.FusionQuery(fusion=rest.Fusion.RRF),
+        query_filter=query_filter,
+        limit=limit
+    ).points
+
+
+def _open_embedded(path) -> EmbeddedVectorClient:
+    return EmbeddedVectorClient(str(path), dimension=DIMENSION, distance='cosine', named_vectors=True,
+                                payload_fields_to_index=[{'field_name': 'meta.parent_id'}])
+
+
+@pytest.fixture
+def embedded(tmp_path):
+    client = _open_embedded(tmp_path)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def qdrant():
+    client = QdrantClient(':memory:')
+    client.create_collection(
+        COLLECTION,
+        vectors_config={DENSE_VECTORS_NAME: rest.VectorParams(size=DIMENSION, distance=rest.Distance.COSINE)},
+        sparse_vectors_config={SPARSE_VECTORS_NAME: rest.SparseVectorParams()}
+    )
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def small_compaction(monkeypatch):
+    """
+    Compacts as soon as a quarter of the rows are dead, and grows the matrix from 16 rows.
+    """
+    monkeypatch.setattr(embedded_vector_store, 'MIN_CAPACITY', 16)
+    monkeypatch.setattr(embedded_vector_store, 'COMPACT_MIN_DEAD_ROWS', 1)
+    monkeypatch.setattr(embedded_vector_store, 'COPY_BATCH_ROWS', 7)
+
+
+def _scored(points: list) -> list:
+    return [(point.id, round(point.score, 5)) for point in points]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_rrf_matches_qdrant(embedded, qdrant, seed):
+    points = _points(120)
+    embedded.upsert(COLLECTION, points)
+    qdrant.upsert(COLLECTION, points)
+
+    dense, sparse = _query_vectors(100 + seed)
+    for limit, prefetch_limit in ((5, 20), (18, 18), (10, None)):
+        assert _scored(_hybrid_query(embedded, dense, sparse, limit, prefetch_limit)) == \
+            _scored(_hybrid_query(qdrant, dense, sparse, limit, prefetch_limit))
+
+
+def test_single_vector_queries_match_qdrant(embedded, qdrant):
+    points = _points(60)
+    embedded.upsert(COLLECTION, points)
+    qdrant.upsert(COLLECTION, points)
+
+    dense, sparse = _query_vectors(7)
+    for using, query in ((DENSE_VECTORS_NAME, dense), (SPARSE_VECTORS_NAME, sparse)):
+        expected = qdrant.query_points(COLLECTION, query=query, using=using, limit=15).points
+        actual = embedded.query_points(COLLECTION, query=query, using=using, limit=15).points
+        assert _scored(actual) == _scored(expected)
+
+
+@pytest.mark.parametrize('query_filter', [
+    # Indexed field only, answered from the keyword index
+    rest.Filter(must=[rest.FieldCondition(key='meta.parent_id', match=rest.MatchValue(value='parent-4'))]),
+    rest.Filter(must=[rest.FieldCondition(key='meta.parent_id', match=rest.MatchAny(any=['parent-1', 'parent-7']))]),
+    rest.Filter(must_not=[rest.FieldCondition(key='meta.parent_id', match=rest.MatchValue(value='parent-2'))]),
+    rest.Filter(should=[
+        rest.HasIdCondition(has_id=[_point_id(0), _point_id(30)]),
+        rest.FieldCondition(key='meta.parent_id', match=rest.MatchValue(value='parent-9'))
+    ]),
+    # Unindexed field, checked against the stored payloads
+    rest.Filter(must=[rest.FieldCondition(key='meta.folder', match=rest.MatchValue(value='folder-1'))]),
+    rest.Filter(
+        must=[rest.FieldCondition(key='meta.folder', match=rest.MatchAny(any=['folder-0', 'folder-3']))],
+        must_not=[rest.FieldCondition(key='meta.parent_id', match=rest.MatchValue(value='parent-0'))]
+    )
+])
+def test_filters_match_qdrant(embedded, qdrant, query_filter):
+    points = _points(45)
+    embedded.upsert(COLLECTION, points)
+    qdrant.upsert(COLLECTION, points)
+    # Deleted points must never match
+    deleted = rest.PointIdsList(points=[_point_id(number) for number in (3, 12, 13)])
+    embedded.delete(COLLECTION, deleted)
+    qdrant.delete(COLLECTION, deleted)
+
+    assert embedded.count(COLLECTION, count_filter=query_filter).count == \
+        qdrant.count(COLLECTION, count_filter=query_filter).count
+
+    expected_ids = [record.id for record in qdrant.scroll(COLLECTION, scroll_filter=query_filter, limit=100)[0]]
+    actual_ids = [record.id for record in embedded.scroll(COLLECTION, scroll_filter=query_filter, limit=100)[0]]
+    assert actual_ids == expected_ids
+
+    dense, sparse = _query_vectors(3)
+    assert _scored(_hybrid_query(embedded, dense, sparse, 10, 30, query_filter)) == \
+        _scored(_hybrid_query(qdrant, dense, sparse, 10, 30, query_filter))
+
+
+def test_overwrite_replaces_vector_and_payload(embedded):
+    embedded.upsert(COLLECTION, _points(10))
+    replacement = _points(1, seed=42)[0]
+    replacement.id = _point_id(4)
+    replacement.payload = {'content': 'rewritten', 'meta': {'parent_id': 'parent-new', 'folder': 'folder-9'}}
+    embedded.upsert(COLLECTION, [replacement])
+
+    assert embedded.count(COLLECTION).count == 10
+    record = embedded.retrieve(COLLECTION, [_point_id(4)], with_vectors=True)[0]
+    assert record.payload['content'] == 'rewritten'
+    expected_vector = np.asarray(replacement.vector[DENSE_VECTORS_NAME])
+    np.testing.assert_allclose(record.vector[DENSE_VECTORS_NAME], expected_vector / np.linalg.norm(expected_vector), rtol=1e-6)
+
+    # The keyword index follows the new payload
+    old_parent = rest.Filter(must=[rest.FieldCondition(key='meta.parent_id', match=rest.MatchValue(value='parent-1'))])
+    new_parent = rest.Filter(must=[rest.FieldCondition(key='meta.parent_id', match=rest.MatchValue(value='parent-new'))])
+    assert embedded.count(COLLECTION, count_filter=old_parent).count == 2
+    assert embedded.count(COLLECTION, count_filter=new_parent).count == 1
+
+    best = embedded.query_points(COLLECTION, query=replacement.vector[DENSE_VECTORS_NAME], using=DENSE_VECTORS_NAME, limit=1)
+    assert best.points[0].id == _point_id(4)
+
+
+def test_delete_by_ids_and_filter(embedded):
+    embedded.upsert(COLLECTION, _points(12))
+    embedded.delete(COLLECTION, rest.PointIdsList(points=[_point_id(0), _point_id(1)]))
+    embedded.delete(COLLECTION, rest.FilterSelector(filter=rest.Filter(
+        must=[rest.FieldCondition(key='meta.parent_id', match=rest.MatchValue(value='parent-3'))]
+    )))
+
+    remaining_ids = {record.id for record in embedded.scroll(COLLECTION, limit=100)[0]}
+    assert remaining_ids == {_point_id(number) for number in range(12) if number not in (0, 1, 9, 10, 11)}
+    assert embedded.retrieve(COLLECTION, [_point_id(0), _point_id(10)]) == []
+
+    dense, sparse = _query_vectors(11)
+    found_ids = {point.id for point in _hybrid_query(embedded, dense, sparse, 20, 20)}
+    assert found_ids <= remaining_ids
+
+
+def test_compaction_then_reopen(tmp_path, small_compaction):
+    client = _open_embedded(tmp_path)
+    client.upsert(COLLECTION, _points(40))
+    client.upsert(COLLECTION, _points(10, seed=1, first=5))  # Overwrites points 5-14
+    client.delete(COLLECTION, rest.PointIdsList(points=[_point_id(number) for number in range(20, 35)]))
+    collection = client._collection(COLLECTION)
+    assert collection._generation > 0
+    assert collection._row_count == collection.count()
+
+    dense, sparse = _query_vectors(5)
+    expected = _scored(_hybrid_query(client, dense, sparse, 10, 25))
+    expected_records = client.retrieve(COLLECTION, [_point_id(number) for number in range(40)], with_vectors=True)
+    client.close()
+
+    reopened = _open_embedded(tmp_path)
+    assert reopened.count(COLLECTION).count == 25
+    assert _scored(_hybrid_query(reopened, dense, sparse, 10, 25)) == expected
+    records = reopened.retrieve(COLLECTION, [_point_id(number) for number in range(40)], with_vectors=True)
+    assert [(record.id, record.payload) for record in records] == [(record.id, record.payload) for record in expected_records]
+    for record, expected_record in zip(records, expected_records):
+        np.testing.assert_array_equal(record.vector[DENSE_VECTORS_NAME], expected_record.vector[DENSE_VECTORS_NAME])
+    # Only the committed generation is left on disk
+    assert list(embedded_vector_store._matrix_files(str(tmp_path), COLLECTION)) == [reopened._collection(COLLECTION)._generation]
+    reopened.close()
+
+
+def test_uncommitted_matrix_is_discarded_on_reopen(tmp_path, small_compaction):
+    client = _open_embedded(tmp_path)
+    client.upsert(COLLECTION, _points(12))
+    collection = client._collection(COLLECTION)
+    committed_generation = collection._generation
+    expected_records = client.retrieve(COLLECTION, [_point_id(number) for number in range(12)], with_vectors=True)
+
+    # A compaction interrupted after writing the next matrix, before its rows were committed
+    collection._write_matrix(16, np.arange(collection._row_count)[::-1])
+    client.close()
+
+    reopened = _open_embedded(tmp_path)
+    assert reopened._collection(COLLECTION)._generation == committed_generation
+    assert list(embedded_vector_store._matrix_files(str(tmp_path), COLLECTION)) == [committed_generation]
+    records = reopened.retrieve(COLLECTION, [_point_id(number) for number in range(12)], with_vectors=True)
+    for record, expected_record in zip(records, expected_records):
+        np.testing.assert_array_equal(record.vector[DENSE_VECTORS_NAME], expected_record.vector[DENSE_VECTORS_NAME])
+    reopened.close()
+
+
+def test_scroll_matches_qdrant_order(embedded, qdrant):
+    points = _points(30) + [rest.PointStruct(id=number, vector={}, payload={}) for number in (7, 2, 11)]
+    embedded.upsert(COLLECTION, points)
+    qdrant.upsert(COLLECTION, points)
+
+    def scroll_all(client):
+        point_ids, offset = [], None
+        while True:
+            records, offset = client.scroll(COLLECTION, limit=4, offset=offset)
+            point_ids.extend(record.id for record in records)
+            if offset is None:
+                return point_ids
+
+    assert scroll_all(embedded) == scroll_all(qdrant)
+
+
+def test_scroll_survives_writes_between_pages(embedded, small_compaction):
+    embedded.upsert(COLLECTION, _points(30))
+
+    seen_ids = []
+    records, offset = embedded.scroll(COLLECTION, limit=5)
+    seen_ids.extend(record.id for record in records)
+    while offset is not None:
+        # Delete the next page's first point, and overwrite and compact the rest
+        embedded.delete(COLLECTION, rest.PointIdsList(points=[offset]))
+        embedded.upsert(COLLECTION, [point for point in _points(30, seed=2) if point.id in set(seen_ids[-3:])])
+        records, offset = embedded.scroll(COLLECTION, limit=5, offset=offset)
+        seen_ids.extend(record.id for record in records)
+
+    assert len(seen_ids) == len(set(seen_ids))
+    assert set(seen_ids) == {record.id for record in embedded.scroll(COLLECTION, limit=100)[0]} | set(seen_ids)
+    assert seen_ids == sorted(seen_ids)
@@ -0,0 +1,36 @@
+"""
+Checks how the embedding update queue reports the outcome of its batches.
+"""
+from embedding_update_queue import EmbeddingUpdateQueue
+
+
+class StoreWithIds:
+    """
+    Stands in for EmbeddingsManager over a store holding the given embeddings IDs.
+    """
+
+    def __init__(self, stored_ids: set):
+        self.stored_ids = stored_ids
+        self.updated = {}
+
+    def update_embeddings(self, new_contents_by_id: dict) -> dict:
+        found = {document_id: content for document_id, content in new_contents_by_id.items()
+                 if document_id in self.stored_ids}
+        self.updated.update(found)
+        return found
+
+
+def test_updates_for_unknown_ids_are_counted_as_not_found():
+    store = StoreWithIds({'a', 'b'})
+    queue = EmbeddingUpdateQueue(store, debounce_seconds=60)
+    queue.submit('a', 'new a')
+    queue.submit('missing', 'gone')
+    queue.submit('b', 'new b')
+
+    assert queue.flush()
+    assert store.updated == {'a': 'new a', 'b': 'new b'}
+    status = queue.status()
+    assert status['processed'] == 2
+    assert status['not_found'] == 1
+    assert status['last_not_found_id'] == 'missing'
+    assert status['failed'] == 0
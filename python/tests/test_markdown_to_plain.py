@@ -0,0 +1,90 @@
+"""
+Checks that the streaming renderer and the plain-text cache give the same text
+as mdit_plain's RendererPlain.
+"""
+import json
+import os
+import pytest
+from markdown_it import MarkdownIt
+from mdit_plain.renderer import RendererPlain
+import markdown_to_plain
+from config import MARKDOWN_CACHE_MAX_TEXT_LENGTH
+from markdown_to_plain import StreamingRendererPlain, strip_markdown, strip_markdown_many, markdown_cache_stats
+from retrieval_cache import TTLCache
+
+PYTHON_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MARKDOWN_SAMPLES = [
+    '',
+    '   \n\n  ',
+    '# Heading\n\nParagraph with **bold**, *italic*, `code` and a [link](https://example.com).',
+    '- one\n- two\n  - nested **item**\n    1. numbered\n    2. list\n- three',
+    '> quoted\n> > nested quote with _emphasis_\n\nafter',
+    '```python\nprint("fenced")\n```\n\n    indented code\n\ntext',
+    '<div>raw <b>html</b></div>\n\nInline <span>html</span> &amp; entities &copy;',
+    'Line one  \nhard break\\\nbackslash break',
+    '![image](https://example.com/a.png "title") and <https://autolink.example.com>',
+    '| a | b |\n|---|---|\n| 1 | 2 |',
+    '***\n\nSetext heading\n===\n\n---\n\nUnicode: café, 日本語, emoji 🎉',
+    '1) first\n2) second\n\n[ref]: https://example.com\n\nSee [the reference][ref].',
+]
+
+# Longer than MARKDOWN_CACHE_MAX_TEXT_LENGTH, so it is converted without the cache
+LONG_NOTE = '\n\n'.join(MARKDOWN_SAMPLES * 40)
+
+
+def _sample_notes() -> list:
+    with open(os.path.join(PYTHON_DIRECTORY, 'test-notes.json'), encoding='utf-8') as notes_file:
+        notes = [note['content'] for note in json.load(notes_file)]
+    for file_name in ('notes.txt', 'prompts.txt'):
+        with open(os.path.join(PYTHON_DIRECTORY, file_name), encoding='utf-8') as text_file:
+            notes.append(text_file.read())
+    return notes + MARKDOWN_SAMPLES + [LONG_NOTE]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    markdown_to_plain._plain_text_cache.clear()
+    yield
+    markdown_to_plain._plain_text_cache.clear()
+
+
+@pytest.mark.parametrize('markdown_text', _sample_notes())
+def test_streaming_renderer_matches_renderer_plain(markdown_text):
+    expected = MarkdownIt(renderer_cls=RendererPlain).render(markdown_text)
+    assert MarkdownIt(renderer_cls=StreamingRendererPlain).render(markdown_text) == expected
+    # Cold and cached conversions, on the shared per-thread parser
+    assert strip_markdown(markdown_text) == expected
+    assert strip_markdown(markdown_text) == expected
+
+
+def test_strip_markdown_many_keeps_order():
+    notes = _sample_notes()
+    notes = notes + notes[::-1]
+    assert strip_markdown_many(notes) == [MarkdownIt(renderer_cls=RendererPlain).render(note) for note in notes]
+
+
+def test_repeated_conversions_hit_the_cache():
+    notes = [sample for sample in _sample_notes() if len(sample) <= MARKDOWN_CACHE_MAX_TEXT_LENGTH]
+    strip_markdown_many(notes)
+    hits_before = markdown_cache_stats()['hits']
+    strip_markdown_many(notes)
+    assert markdown_cache_stats()['hits'] - hits_before == len(set(notes))
+
+
+def test_cache_is_bounded_by_total_size():
+    cache = TTLCache(max_entries=100, ttl_seconds=60, max_total_size=10)
+    cache.put('a', 'xxxx')
+    cache.put('b', 'yyyy')
+    cache.put('a', 'xxx')  # Replacing an entry releases its old size
+    assert cache.stats()['total_size'] == 7
+
+    cache.put('c', 'zzzzz')  # Evicts the least recently used entry, 'b'
+    assert cache.get('b') is None
+    assert cache.get('a') == 'xxx'
+    assert cache.get('c') == 'zzzzz'
+    assert cache.stats()['total_size'] == 8
+
+    cache.put('d', 'w' * 11)  # Larger than the whole cache: never stored
+    assert cache.get('d') is None
+    assert cache.stats()['entries'] == 2